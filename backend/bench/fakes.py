@@ -0,0 +1,115 @@
+import asyncio
+import hashlib
+import math
+import re
+import threading
+import time
+from langchain_core.embeddings import Embeddings
+
+# --- MODEL PALSU UNTUK BENCHMARK ---
+# Pengganti Google embeddings & Groq yang deterministik dan tidak memakai kuota API.
+# Latency bisa diatur agar profil waktu mendekati layanan aslinya.
+
+EMBEDDING_DIM = 768
+FINISH_TOKEN = '<|reserved_special_token_0|>'
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _bucket(word: str, dim: int):
+    digest = hashlib.md5(word.encode("utf-8")).digest()
+    index = int.from_bytes(digest[:4], "little") % dim
+    sign = 1.0 if digest[4] & 1 else -1.0
+    return index, sign
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Embedding "bag of words" ber-hash: teks dengan kata yang mirip menghasilkan vektor
+    yang mirip, sehingga hasil retrieval tetap masuk akal dan stabil antar run.
+    Setiap panggilan tidur latency_seconds + per_text_seconds * jumlah teks.
+    """
+
+    def __init__(self, latency_seconds: float = 0.05, per_text_seconds: float = 0.0, dim: int = EMBEDDING_DIM):
+        self.latency_seconds = latency_seconds
+        self.per_text_seconds = per_text_seconds
+        self.dim = dim
+        self.model = "fake-embedding"
+        self.api_calls = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, text: str):
+        vector = [0.0] * self.dim
+        for word in _WORD_RE.findall(text.lower()):
+            index, sign = _bucket(word, self.dim)
+            vector[index] += sign
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def _sleep(self, count: int):
+        with self._lock:
+            self.api_calls += 1
+        delay = self.latency_seconds + self.per_text_seconds * count
+        if delay > 0:
+            time.sleep(delay)
+
+    def embed_documents(self, texts, **kwargs):
+        # task_type (dipakai embed_queries) tidak memengaruhi vektor palsu
+        self._sleep(len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        self._sleep(1)
+        return self._vector(text)
+
+
+class FakeMessage:
+    """Cukup mirip AIMessage/AIMessageChunk untuk kode serving (hanya .content yang dipakai)."""
+
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeChatModel:
+    """
+    LLM palsu dengan waktu tunggu token pertama dan kecepatan token yang bisa diatur.
+    Jawaban dibuat dari hash prompt (deterministik) dan diakhiri token selesai seperti
+    yang diminta prompt asli, agar jalur pembersihan respons ikut teruji.
+    """
+
+    def __init__(self, first_token_seconds: float = 0.3, tokens_per_second: float = 200.0,
+                 answer_tokens: int = 300, chunk_tokens: int = 4):
+        self.first_token_seconds = first_token_seconds
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.chunk_tokens = max(1, chunk_tokens)
+
+    def _tokens(self, prompt: str):
+        seed = hashlib.sha256(str(prompt).encode("utf-8")).hexdigest()
+        words = [seed[i:i + 6] for i in range(0, len(seed) - 6, 3)]
+        tokens = [f" {words[i % len(words)]}" for i in range(self.answer_tokens)]
+        tokens[0] = tokens[0].lstrip()
+        return tokens + [" [1]", f"\n\n### Referensi\n* [1] Synthetic paper{FINISH_TOKEN}"]
+
+    def _generation_seconds(self, token_count: int) -> float:
+        if self.tokens_per_second <= 0:
+            return 0.0
+        return token_count / self.tokens_per_second
+
+    def invoke(self, prompt):
+        tokens = self._tokens(prompt)
+        time.sleep(self.first_token_seconds + self._generation_seconds(len(tokens)))
+        return FakeMessage("".join(tokens))
+
+    async def ainvoke(self, prompt):
+        tokens = self._tokens(prompt)
+        await asyncio.sleep(self.first_token_seconds + self._generation_seconds(len(tokens)))
+        return FakeMessage("".join(tokens))
+
+    async def astream(self, prompt):
+        tokens = self._tokens(prompt)
+        await asyncio.sleep(self.first_token_seconds)
+        for start in range(0, len(tokens), self.chunk_tokens):
+            piece = tokens[start:start + self.chunk_tokens]
+            if start:
+                await asyncio.sleep(self._generation_seconds(len(piece)))
+            yield FakeMessage("".join(piece))
@@ -0,0 +1,321 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from synthetic_data import write_synthetic_csv, sample_queries, sample_context
+
+# --- BENCHMARK SERVING ---
+# 1. paper_metadata.csv sintetis -> index Chroma + BM25 memakai indexer.py dan embedding palsu
+# 2. server.py (app main.py + model palsu) dijalankan sebagai proses terpisah
+# 3. Endpoint dipanggil dengan konkurensi tetap; latency, TTFB, throughput & RSS ditulis ke JSON
+# 4. Opsional: dibandingkan dengan JSON baseline, exit code 1 jika ada regresi
+
+DEFAULT_WORKDIR = os.path.join(BACKEND_DIR, "..", "bench_data")
+ENDPOINTS = ("combined-query-chat", "related_documents", "chat")
+INDEX_MARKER = "bench_index.json"
+READY_TIMEOUT_SECONDS = 180
+
+# Metrik yang makin kecil makin baik; selain itu (throughput) makin besar makin baik
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "ttfb_p50_ms", "ttfb_p95_ms", "rss_peak_mb")
+
+
+def percentile(values, pct: float):
+    """Persentil dengan interpolasi linear (sama seperti numpy default)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def read_rss_mb(pid: int):
+    """(RSS saat ini, puncak RSS) proses dari /proc; None jika bukan Linux."""
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return None, None
+    to_mb = lambda key: int(fields[key].split()[0]) / 1024 if key in fields else None
+    return to_mb("VmRSS"), to_mb("VmHWM")
+
+
+# --- DATA & INDEX ---
+
+def build_index(workdir: str, rows: int, seed: int, rebuild: bool = False) -> str:
+    """Membangun (atau memakai ulang) index untuk kombinasi rows+seed yang sama."""
+    index_root = os.path.abspath(os.path.join(workdir, f"index-{rows}-{seed}"))
+    marker = os.path.join(index_root, INDEX_MARKER)
+    if os.path.exists(marker) and not rebuild:
+        print(f"Reusing index at {index_root}")
+        return index_root
+
+    csv_path = write_synthetic_csv(os.path.join(workdir, f"paper_metadata-{rows}-{seed}.csv"), rows, seed)
+    print(f"Synthetic data: {csv_path} ({rows} papers)")
+
+    # indexer.py membaca target saat import; embedding store di disk tidak dipakai
+    os.environ["VECTOR_STORE_TARGET"] = index_root
+    import indexer
+    from cache import EmbeddingCache, CachedEmbeddings
+    from concurrency import AdaptiveRateLimiter
+    from lexical import BM25Index
+    from fakes import FakeEmbeddings
+
+    start = time.time()
+    embeddings = CachedEmbeddings(FakeEmbeddings(latency_seconds=0), EmbeddingCache(max_entries=0, disk_path=""))
+    limiter = AdaptiveRateLimiter(indexer.INDEXER_EMBED_WORKERS)
+    collection = indexer.open_collection(embeddings, full_rebuild=True)
+
+    stats = {'papers': 0, 'chunks': 0, 'duplicates': 0}
+    lexical_index = BM25Index()
+    seen_ids = set()
+    chunks = indexer.iter_chunks(indexer.iter_source_frames(csv_path), lexical_index, stats)
+    if indexer.write_batches(collection, embeddings, indexer.iter_changed_batches(chunks, {}, seen_ids), limiter) is None:
+        raise RuntimeError("Building the benchmark index failed.")
+    indexer.finish_indexing(collection, embeddings, {}, seen_ids, lexical_index, stats)
+
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump({"rows": rows, "seed": seed, **stats, "build_seconds": round(time.time() - start, 2)}, f)
+    return index_root
+
+
+# --- SERVER ---
+
+def start_server(index_root: str, workdir: str, args) -> subprocess.Popen:
+    # cwd di workdir agar folder relatif (../temp_files) tidak menyentuh repo
+    run_dir = os.path.join(workdir, "run")
+    os.makedirs(run_dir, exist_ok=True)
+    env = {**os.environ, "ANSWER_CACHE_ENABLED": "true" if args.answer_cache else "false"}
+    command = [
+        sys.executable, os.path.join(BENCH_DIR, "server.py"),
+        "--index-root", index_root, "--port", str(args.port),
+        "--embed-latency-ms", str(args.embed_latency_ms),
+        "--llm-first-token-ms", str(args.llm_first_token_ms),
+        "--llm-tokens-per-second", str(args.llm_tokens_per_second),
+        "--llm-answer-tokens", str(args.llm_answer_tokens),
+    ]
+    return subprocess.Popen(command, cwd=run_dir, env=env)
+
+
+def wait_until_ready(base_url: str, server: subprocess.Popen) -> float:
+    start = time.time()
+    while time.time() - start < READY_TIMEOUT_SECONDS:
+        if server.poll() is not None:
+            raise RuntimeError(f"Benchmark server exited with code {server.returncode}.")
+        try:
+            response = requests.get(f"{base_url}/readyz", timeout=2)
+            if response.status_code == 200:
+                return time.time() - start
+            if response.json().get("status") == "failed":
+                raise RuntimeError(f"Benchmark server failed to start: {response.json().get('error')}")
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Benchmark server did not become ready in time.")
+
+
+class RssSampler:
+    """Mencatat RSS server secara berkala selama skenario berjalan."""
+
+    def __init__(self, pid: int, interval: float = 0.2):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss, _ = read_rss_mb(self.pid)
+            if rss is not None:
+                self.samples.append(rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+# --- SKENARIO ---
+
+def build_payload(endpoint: str, query: str, stream: bool, context: str) -> dict:
+    if endpoint == "combined-query-chat":
+        return {"query": query, "chat_history": [], "stream": stream, "use_cache": False}
+    if endpoint == "chat":
+        return {"query": query, "context": context, "chat_history": [], "stream": stream}
+    return {"title": query, "number": 5}
+
+
+_local = threading.local()
+
+
+def timed_request(url: str, payload: dict):
+    """(total detik, TTFB detik, status) untuk satu request; body dibaca sampai habis."""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    start = time.perf_counter()
+    try:
+        with session.post(url, json=payload, stream=True, timeout=120) as response:
+            chunks = response.iter_content(chunk_size=None)
+            next(chunks, b"")
+            ttfb = time.perf_counter() - start
+            for _ in chunks:
+                pass
+            status = response.status_code
+    except requests.RequestException:
+        return time.perf_counter() - start, None, None
+    return time.perf_counter() - start, ttfb, status
+
+
+def run_scenario(base_url: str, endpoint: str, queries, args, server_pid: int) -> dict:
+    url = f"{base_url}/{endpoint}/"
+    context = sample_context()
+
+    # Pemanasan (koneksi, cache Python, HNSW) tidak ikut diukur
+    for query in queries[:args.warmup]:
+        timed_request(url, build_payload(endpoint, f"warmup {query}", args.stream, context))
+
+    measured = queries[args.warmup:args.warmup + args.requests]
+    with RssSampler(server_pid) as sampler, ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        start = time.perf_counter()
+        results = list(pool.map(
+            lambda query: timed_request(url, build_payload(endpoint, query, args.stream, context)), measured
+        ))
+        wall_seconds = time.perf_counter() - start
+
+    ok = [(total, ttfb) for total, ttfb, status in results if status == 200]
+    latencies = [total * 1000 for total, _ in ok]
+    ttfbs = [ttfb * 1000 for _, ttfb in ok]
+    rounded = lambda value: round(value, 2) if value is not None else None
+    summary = {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(ok) / wall_seconds, 2) if wall_seconds > 0 else None,
+        "p50_ms": rounded(percentile(latencies, 50)),
+        "p95_ms": rounded(percentile(latencies, 95)),
+        "p99_ms": rounded(percentile(latencies, 99)),
+        "max_ms": rounded(max(latencies) if latencies else None),
+        "ttfb_p50_ms": rounded(percentile(ttfbs, 50)),
+        "ttfb_p95_ms": rounded(percentile(ttfbs, 95)),
+        "rss_peak_mb": rounded(max(sampler.samples) if sampler.samples else None),
+    }
+    print(f"{endpoint:>22}: {summary['throughput_rps']} req/s, p50 {summary['p50_ms']} ms, "
+          f"p95 {summary['p95_ms']} ms, p99 {summary['p99_ms']} ms, TTFB p50 {summary['ttfb_p50_ms']} ms, "
+          f"errors {summary['errors']}")
+    return summary
+
+
+# --- PERBANDINGAN BASELINE ---
+
+def compare_with_baseline(results: dict, baseline: dict, max_regression_pct: float) -> list:
+    """Mencetak perubahan per metrik; mengembalikan daftar regresi di atas ambang."""
+    regressions = []
+    print(f"\n--- Compared with baseline ({baseline.get('created_at', '?')}) ---")
+    for endpoint, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(endpoint)
+        if previous is None:
+            print(f"{endpoint}: not in baseline")
+            continue
+        for metric in LOWER_IS_BETTER + ("throughput_rps",):
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change_pct = (new - old) / old * 100
+            worse = change_pct > max_regression_pct if metric in LOWER_IS_BETTER else -change_pct > max_regression_pct
+            flag = "  REGRESSION" if worse else ""
+            print(f"{endpoint:>22} {metric:>15}: {old:>10} -> {new:>10} ({change_pct:+.1f}%){flag}")
+            if worse:
+                regressions.append(f"{endpoint}.{metric}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark endpoint serving dengan model palsu (tanpa kuota API)")
+    parser.add_argument("--rows", type=int, default=2000, help="Jumlah paper di CSV sintetis")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help=f"Dipisah koma: {', '.join(ENDPOINTS)}")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="Request terukur per endpoint")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--stream", action="store_true", help="Pakai mode SSE untuk endpoint chat")
+    parser.add_argument("--answer-cache", action="store_true", help="Aktifkan cache jawaban di server")
+    parser.add_argument("--embed-latency-ms", type=float, default=50)
+    parser.add_argument("--llm-first-token-ms", type=float, default=300)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=200)
+    parser.add_argument("--llm-answer-tokens", type=int, default=300)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workdir", default=DEFAULT_WORKDIR)
+    parser.add_argument("--rebuild-index", action="store_true")
+    parser.add_argument("--output", default=None, help="File JSON hasil (default: <workdir>/results-<waktu>.json)")
+    parser.add_argument("--baseline", default=None, help="File JSON hasil run sebelumnya untuk dibandingkan")
+    parser.add_argument("--max-regression", type=float, default=10.0, help="Ambang regresi dalam persen")
+    args = parser.parse_args()
+
+    endpoints = [name.strip().strip("/") for name in args.endpoints.split(",") if name.strip()]
+    unknown = [name for name in endpoints if name not in ENDPOINTS]
+    if unknown:
+        parser.error(f"Unknown endpoints: {', '.join(unknown)}")
+
+    workdir = os.path.abspath(args.workdir)
+    os.makedirs(workdir, exist_ok=True)
+    index_root = build_index(workdir, args.rows, args.seed, args.rebuild_index)
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = start_server(index_root, workdir, args)
+    try:
+        ready_seconds = wait_until_ready(base_url, server)
+        rss_idle, _ = read_rss_mb(server.pid)
+        print(f"Server ready in {ready_seconds:.2f}s (RSS {rss_idle} MB)")
+
+        queries = sample_queries(args.warmup + args.requests)
+        scenarios = {name: run_scenario(base_url, name, queries, args, server.pid) for name in endpoints}
+        _, rss_peak = read_rss_mb(server.pid)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    results = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "workdir")},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "server": {"ready_seconds": round(ready_seconds, 2), "rss_idle_mb": rss_idle, "rss_peak_mb": rss_peak},
+        "scenarios": scenarios,
+    }
+    output = args.output or os.path.join(workdir, f"results-{datetime.now().strftime('%Y%m%dT%H%M%S')}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.max_regression)
+        if regressions:
+            print(f"\n{len(regressions)} metrics regressed more than {args.max_regression}%.")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
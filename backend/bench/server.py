@@ -0,0 +1,51 @@
+import argparse
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+# --- SERVER BENCHMARK ---
+# Menjalankan app main.py apa adanya, hanya model Google/Groq yang diganti model palsu.
+# Dijalankan sebagai proses terpisah oleh run_bench.py agar RSS server bisa diukur sendiri.
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server main.py dengan embedding & LLM palsu")
+    parser.add_argument("--index-root", required=True, help="Folder vector_store hasil run_bench.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--embed-latency-ms", type=float, default=50)
+    parser.add_argument("--llm-first-token-ms", type=float, default=300)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=200)
+    parser.add_argument("--llm-answer-tokens", type=int, default=300)
+    args = parser.parse_args()
+
+    # Konfigurasi modul dibaca saat import, jadi env harus di-set sebelum import main
+    os.environ["VECTOR_STORE_ROOT"] = os.path.abspath(args.index_root)
+
+    import uvicorn
+    import main as app_module
+    from cache import CachedEmbeddings
+    from fakes import FakeEmbeddings, FakeChatModel
+
+    def initialize_fake_components():
+        app_module.embeddings = CachedEmbeddings(
+            FakeEmbeddings(latency_seconds=args.embed_latency_ms / 1000),
+            app_module.embedding_cache
+        )
+        app_module.llm = FakeChatModel(
+            first_token_seconds=args.llm_first_token_ms / 1000,
+            tokens_per_second=args.llm_tokens_per_second,
+            answer_tokens=args.llm_answer_tokens,
+        )
+        app_module.index_manager.load_initial()
+
+    # warmup_components() memanggil initialize_components lewat global modul main
+    app_module.initialize_components = initialize_fake_components
+    uvicorn.run(app_module.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
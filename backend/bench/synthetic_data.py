@@ -0,0 +1,97 @@
+import csv
+import os
+import random
+
+# --- DATA SINTETIS UNTUK BENCHMARK ---
+# paper_metadata.csv dengan kolom yang sama seperti hasil export_db.py.
+# Seed tetap -> file yang identik antar run, jadi hasil benchmark bisa dibandingkan.
+
+TOPICS = [
+    "padi", "jagung", "kedelai", "kelapa sawit", "sapi perah", "ikan nila", "udang vaname",
+    "hutan mangrove", "lahan gambut", "tanah masam", "pupuk organik", "irigasi", "kakao",
+    "kopi arabika", "ayam broiler", "rumput laut", "bawang merah", "cabai", "tebu", "karet",
+]
+METHODS = [
+    "analisis regresi", "machine learning", "citra satelit", "sistem informasi geografis",
+    "uji lapang", "survei rumah tangga", "analisis sensitivitas", "deep learning",
+    "rancangan acak lengkap", "analisis finansial", "pemodelan dinamis", "metabolomik",
+]
+ASPECTS = [
+    "produktivitas", "efisiensi pemasaran", "ketahanan pangan", "emisi karbon", "kualitas air",
+    "pendapatan petani", "serangan hama", "kandungan nutrisi", "adaptasi perubahan iklim",
+    "rantai pasok", "daya saing ekspor", "keanekaragaman hayati",
+]
+REGIONS = ["Bogor", "Cianjur", "Sukabumi", "Karawang", "Lampung", "Riau", "Kalimantan Barat", "Sulawesi Selatan"]
+FILLER = [
+    "Penelitian ini bertujuan untuk", "Data dikumpulkan dari", "Hasil penelitian menunjukkan bahwa",
+    "Metode yang digunakan adalah", "Implikasi kebijakan dari temuan ini adalah",
+    "Analisis dilakukan menggunakan", "Sampel penelitian terdiri atas", "Kesimpulan penelitian ini adalah",
+]
+FIRST_NAMES = ["Andi", "Budi", "Citra", "Dewi", "Eka", "Fajar", "Gita", "Hadi", "Indah", "Joko", "Kartika", "Lestari"]
+LAST_NAMES = ["Pratama", "Saputra", "Wijaya", "Santoso", "Nugroho", "Hidayat", "Kusuma", "Rahman", "Siregar", "Putri"]
+
+COLUMNS = ["id", "title", "authors", "keywords", "uri", "abstract"]
+
+
+def _title(rng: random.Random) -> str:
+    return (f"{rng.choice(ASPECTS).capitalize()} {rng.choice(TOPICS)} di {rng.choice(REGIONS)} "
+            f"menggunakan {rng.choice(METHODS)}")
+
+
+def _abstract(rng: random.Random, sentences: int) -> str:
+    parts = []
+    for _ in range(sentences):
+        parts.append(f"{rng.choice(FILLER)} {rng.choice(ASPECTS)} {rng.choice(TOPICS)} "
+                     f"dengan {rng.choice(METHODS)} di {rng.choice(REGIONS)}.")
+    return " ".join(parts)
+
+
+def write_synthetic_csv(path: str, rows: int, seed: int = 42, long_abstract_ratio: float = 0.2) -> str:
+    """
+    Menulis `rows` paper sintetis. Sebagian abstrak dibuat panjang (> CHUNK_SIZE)
+    agar jalur splitter di indexer ikut terpakai.
+    """
+    rng = random.Random(seed)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for i in range(rows):
+            sentences = rng.randint(18, 30) if rng.random() < long_abstract_ratio else rng.randint(4, 8)
+            authors = "; ".join(f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" for _ in range(rng.randint(1, 3)))
+            keywords = "; ".join(rng.sample(TOPICS + METHODS, 3))
+            writer.writerow([
+                i + 1, _title(rng), authors, keywords,
+                f"https://repository.ipb.ac.id/handle/123456789/{100000 + i}",
+                _abstract(rng, sentences),
+            ])
+    return path
+
+
+def sample_queries(count: int, seed: int = 7):
+    """Pertanyaan/judul acak yang berbeda-beda (cache jawaban & hasil tidak ikut mengukur)."""
+    rng = random.Random(seed)
+    templates = [
+        "Bagaimana pengaruh {method} terhadap {aspect} {topic}?",
+        "Apa faktor yang memengaruhi {aspect} {topic} di {region}?",
+        "Penelitian tentang {topic} dan {aspect} menggunakan {method}",
+        "{aspect} {topic} {region}",
+    ]
+    queries = []
+    for i in range(count):
+        query = rng.choice(templates).format(
+            method=rng.choice(METHODS), aspect=rng.choice(ASPECTS),
+            topic=rng.choice(TOPICS), region=rng.choice(REGIONS),
+        )
+        queries.append(f"{query} ({i})")
+    return queries
+
+
+def sample_context(seed: int = 11) -> str:
+    """Konteks dokumen untuk endpoint /chat/ (mirip isi yang dikirim frontend)."""
+    rng = random.Random(seed)
+    return "\n\n---\n\n".join(
+        f"JUDUL: {_title(rng)}\nURL: https://repository.ipb.ac.id/handle/123456789/{rng.randint(1, 99999)}\n"
+        f"ISI: {_abstract(rng, 6)}"
+        for _ in range(5)
+    )
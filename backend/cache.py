@@ -0,0 +1,392 @@
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from langchain_core.embeddings import Embeddings
+
+# --- KONFIGURASI CACHE JAWABAN ---
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+# Pertanyaan lanjutan (ada riwayat chat sebelumnya) dilewatkan dari cache secara default
+ANSWER_CACHE_BYPASS_FOLLOW_UPS = os.getenv("ANSWER_CACHE_BYPASS_FOLLOW_UPS", "true").lower() == "true"
+
+# --- KONFIGURASI CACHE HASIL PENCARIAN ---
+RELATED_CACHE_MAX_ENTRIES = int(os.getenv("RELATED_CACHE_MAX_ENTRIES", "1024"))
+RELATED_CACHE_TTL_SECONDS = float(os.getenv("RELATED_CACHE_TTL_SECONDS", "3600"))
+
+# --- KONFIGURASI CACHE EMBEDDING ---
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "10000"))
+# Kosongkan untuk menonaktifkan cache di disk (hanya cache memori)
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "")
+
+
+def _normalize(vector):
+    norm = math.sqrt(sum(x * x for x in vector))
+    if norm == 0:
+        return list(vector)
+    return [x / norm for x in vector]
+
+
+class SemanticAnswerCache:
+    """
+    Cache jawaban LLM untuk Chat Mode.
+    Sebuah entri dianggap cocok jika himpunan dokumen hasil retrieval identik (urutan
+    ranking diabaikan) DAN cosine similarity embedding query >= threshold. Karena dokumen harus identik,
+    entri dikelompokkan per doc set sehingga perbandingan vektor hanya dilakukan
+    pada sedikit kandidat.
+    """
+
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, max_entries=ANSWER_CACHE_MAX_ENTRIES,
+                 ttl_seconds=ANSWER_CACHE_TTL_SECONDS):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # entry_id -> (doc_key, vector, answer, created_at)
+        self._by_docs = {}              # doc_key -> set(entry_id)
+        self._next_id = 0
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.evictions = 0
+
+    def _remove(self, entry_id):
+        doc_key = self._entries.pop(entry_id)[0]
+        bucket = self._by_docs.get(doc_key)
+        if bucket is not None:
+            bucket.discard(entry_id)
+            if not bucket:
+                del self._by_docs[doc_key]
+
+    @staticmethod
+    def _doc_key(doc_ids):
+        return tuple(sorted(set(doc_ids)))
+
+    def lookup(self, query_vector, doc_ids):
+        """Mengembalikan jawaban yang tersimpan, atau None jika tidak ada yang cocok."""
+        doc_key = self._doc_key(doc_ids)
+        vector = _normalize(query_vector)
+        now = time.time()
+
+        with self._lock:
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self._by_docs.get(doc_key, ())):
+                _, cached_vector, _, created_at = self._entries[entry_id]
+                if now - created_at > self.ttl_seconds:
+                    self._remove(entry_id)
+                    self.evictions += 1
+                    continue
+                score = sum(a * b for a, b in zip(vector, cached_vector))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id][2]
+
+    def store(self, query_vector, doc_ids, answer, generation=None):
+        """Menyimpan jawaban. Diabaikan jika index sudah di-reload sejak request dimulai."""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            entry_id = self._next_id
+            self._next_id += 1
+            doc_key = self._doc_key(doc_ids)
+            self._entries[entry_id] = (doc_key, _normalize(query_vector), answer, time.time())
+            self._by_docs.setdefault(doc_key, set()).add(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self.evictions += 1
+
+    def record_bypass(self):
+        with self._lock:
+            self.bypasses += 1
+
+    def invalidate(self):
+        """Mengosongkan cache (dipanggil setiap kali index di-reload)."""
+        with self._lock:
+            self._entries.clear()
+            self._by_docs.clear()
+            self.generation += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds,
+                "generation": self.generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypasses": self.bypasses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# --- CACHE LRU/TTL UMUM ---
+
+class TTLCache:
+    """Cache LRU sederhana dengan TTL per entri dan invalidasi per generasi index."""
+
+    def __init__(self, max_entries=RELATED_CACHE_MAX_ENTRIES, ttl_seconds=RELATED_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (value, created_at)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[1] > self.ttl_seconds:
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, generation=None):
+        """Menyimpan nilai. Diabaikan jika index sudah di-reload sejak nilai dihitung."""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "generation": self.generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# --- CACHE EMBEDDING ---
+
+def normalize_text(text: str) -> str:
+    """Normalisasi teks sebelum dijadikan kunci cache (unicode NFC + spasi dirapikan)."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def embedding_key(text: str, model: str, task_type: str) -> str:
+    raw = f"{model}\x00{task_type}\x00{normalize_text(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """Penyimpanan vektor di SQLite (float32 ringkas) yang bertahan setelah restart."""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys) -> dict:
+        found = {}
+        keys = list(keys)
+        with self._lock:
+            # SQLite membatasi jumlah parameter per query
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+        return found
+
+    def put_many(self, items: dict):
+        if not items:
+            return
+        rows = [(key, array("f", vector).tobytes()) for key, vector in items.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows
+            )
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class EmbeddingCache:
+    """
+    Cache embedding dua tingkat: LRU di memori, lalu (opsional) EmbeddingStore di disk.
+    Objek ini sengaja dipisah dari client embedding agar isinya tetap ada saat
+    komponen di-reload.
+    """
+
+    def __init__(self, max_entries=EMBEDDING_CACHE_MAX_ENTRIES, disk_path=EMBEDDING_CACHE_PATH):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self.disk = EmbeddingStore(disk_path) if disk_path else None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys) -> dict:
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                    self.memory_hits += 1
+                else:
+                    missing.append(key)
+
+        if missing and self.disk is not None:
+            from_disk = self.disk.get_many(missing)
+            with self._lock:
+                for key, vector in from_disk.items():
+                    self._remember(key, vector)
+                self.disk_hits += len(from_disk)
+            found.update(from_disk)
+
+        with self._lock:
+            self.misses += len(set(keys) - set(found))
+        return found
+
+    def put_many(self, items: dict):
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, list(vector))
+        if self.disk is not None:
+            self.disk.put_many(items)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            stats = {
+                "memory_entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+        stats["disk_path"] = self.disk.path if self.disk is not None else None
+        stats["disk_entries"] = self.disk.count() if self.disk is not None else 0
+        return stats
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Pembungkus client embedding LangChain yang memakai EmbeddingCache.
+    Kunci cache = hash(model, task_type, teks yang dinormalisasi), sehingga vektor
+    query dan vektor dokumen tidak tertukar.
+    """
+
+    def __init__(self, underlying: Embeddings, cache: EmbeddingCache):
+        self.underlying = underlying
+        self.cache = cache
+        self.model = getattr(underlying, "model", type(underlying).__name__)
+
+    def _task_type(self, default: str) -> str:
+        return getattr(self.underlying, "task_type", None) or default
+
+    def _embed_with_cache(self, texts, task_type, compute):
+        keys = [embedding_key(text, self.model, task_type) for text in texts]
+        found = self.cache.get_many(keys)
+
+        # Teks yang sama dalam satu batch hanya di-embed sekali
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = compute(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(computed)
+            found.update(computed)
+
+        return [list(found[key]) for key in keys]
+
+    def embed_query(self, text: str):
+        task_type = self._task_type("retrieval_query")
+        return self._embed_with_cache(
+            [text], task_type, lambda texts: [self.underlying.embed_query(texts[0])]
+        )[0]
+
+    def embed_documents(self, texts):
+        task_type = self._task_type("retrieval_document")
+        return self._embed_with_cache(list(texts), task_type, self.underlying.embed_documents)
+
+    def embed_queries(self, texts):
+        """
+        Banyak query dalam satu panggilan batch (embed_documents dengan task_type query).
+        Kunci cache sama dengan embed_query, jadi hasilnya dipakai bersama.
+        """
+        task_type = self._task_type("retrieval_query")
+
+        def compute(batch):
+            try:
+                return self.underlying.embed_documents(batch, task_type=task_type)
+            except TypeError:
+                # Client tanpa parameter task_type: tetap benar walau tidak di-batch
+                return [self.underlying.embed_query(text) for text in batch]
+
+        return self._embed_with_cache(list(texts), task_type, compute)
@@ -0,0 +1,188 @@
+import asyncio
+import contextvars
+import functools
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tracing import traced_call
+
+# --- KONFIGURASI KONKURENSI ---
+# Batas jumlah panggilan paralel per tahap (stage). Bisa diatur lewat .env
+STAGE_LIMITS = {
+    "llm": int(os.getenv("LLM_CONCURRENCY", "8")),
+    "retriever": int(os.getenv("RETRIEVER_CONCURRENCY", "16")),
+    "embedding": int(os.getenv("EMBEDDING_CONCURRENCY", "16")),
+    "pdf": int(os.getenv("PDF_CONCURRENCY", "2")),
+}
+
+# Jumlah thread untuk pemanggilan sinkron (Chroma, PyPDF, dsb.)
+EXECUTOR_WORKERS = int(os.getenv("BLOCKING_EXECUTOR_WORKERS", "32"))
+
+# Gunakan ainvoke bawaan LangChain jika model mendukung async native (mis. ChatGroq)
+USE_NATIVE_ASYNC = os.getenv("USE_NATIVE_ASYNC", "true").lower() == "true"
+
+_executor = None
+_semaphores = {}
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Mengembalikan thread pool terbatas yang dipakai bersama oleh semua stage."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=EXECUTOR_WORKERS,
+            thread_name_prefix="ipbgpt-blocking"
+        )
+    return _executor
+
+
+def shutdown_executor():
+    """Menutup thread pool (dipanggil saat server shutdown)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def stage_semaphore(stage: str) -> asyncio.Semaphore:
+    """Semaphore per stage, dibuat lazy agar terikat ke event loop yang aktif."""
+    semaphore = _semaphores.get(stage)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(STAGE_LIMITS.get(stage, EXECUTOR_WORKERS))
+        _semaphores[stage] = semaphore
+    return semaphore
+
+
+async def _run_in_executor(func, *args, **kwargs):
+    # Contextvar request (endpoint metrics, trace aktif) ikut ke thread seperti asyncio.to_thread
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(func, *args, **kwargs)
+    return await loop.run_in_executor(get_executor(), context.run, traced_call, call)
+
+
+async def run_blocking(stage: str, func, *args, **kwargs):
+    """Menjalankan fungsi sinkron di thread pool dengan batas konkurensi per stage."""
+    async with stage_semaphore(stage):
+        return await _run_in_executor(func, *args, **kwargs)
+
+
+async def ainvoke_llm(llm, prompt):
+    """Memanggil LLM tanpa memblokir event loop."""
+    async with stage_semaphore("llm"):
+        if USE_NATIVE_ASYNC and hasattr(llm, "ainvoke"):
+            return await llm.ainvoke(prompt)
+        return await _run_in_executor(llm.invoke, prompt)
+
+
+async def astream_llm(llm, prompt):
+    """
+    Streaming token dari LLM. Slot semaphore "llm" ditahan sampai stream selesai,
+    karena koneksi ke Groq tetap terbuka selama token masih mengalir.
+    """
+    async with stage_semaphore("llm"):
+        if hasattr(llm, "astream"):
+            async for chunk in llm.astream(prompt):
+                yield chunk
+        else:
+            yield await _run_in_executor(llm.invoke, prompt)
+
+
+# --- RATE LIMIT ADAPTIF (AIMD) ---
+
+_RATE_LIMIT_MARKERS = ("429", "resource_exhausted", "resourceexhausted", "quota", "rate limit", "too many requests")
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Mendeteksi respons 429 / kuota habis dari pesan error client API."""
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in _RATE_LIMIT_MARKERS)
+
+
+class AdaptiveRateLimiter:
+    """
+    Pembatas konkurensi AIMD untuk thread sinkron (dipakai indexer).
+    Setiap sukses menaikkan batas sedikit demi sedikit (additive increase), setiap
+    respons 429 memotong batas menjadi setengah (multiplicative decrease) dan menahan
+    semua worker selama masa cooldown. Opsional: token bucket requests per detik.
+    """
+
+    def __init__(self, max_concurrency: int, min_concurrency: int = 1, max_rps: float = 0,
+                 cooldown_seconds: float = 2.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = float(self.max_concurrency)
+        self.max_rps = max_rps
+        self.cooldown_seconds = cooldown_seconds
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._tokens = float(max(1.0, max_rps))
+        self._last_refill = time.monotonic()
+        self.throttled = 0
+
+    def _take_token(self) -> float:
+        """Mengambil satu token; mengembalikan waktu tunggu jika bucket kosong."""
+        if self.max_rps <= 0:
+            return 0.0
+        now = time.monotonic()
+        self._tokens = min(max(1.0, self.max_rps), self._tokens + (now - self._last_refill) * self.max_rps)
+        self._last_refill = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.max_rps
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait <= 0 and self._in_flight < int(self.limit):
+                    wait = self._take_token()
+                    if wait <= 0:
+                        self._in_flight += 1
+                        return
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    def release(self, throttled: bool = False):
+        with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                self.limit = max(float(self.min_concurrency), self.limit / 2)
+                self._paused_until = time.monotonic() + self.cooldown_seconds
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def call(self, func, *args, max_attempts: int = 6, **kwargs):
+        """
+        Menjalankan func di bawah limiter. Error 429 dicoba ulang dengan backoff
+        eksponensial + jitter; error lain langsung diteruskan ke pemanggil.
+        """
+        for attempt in range(max_attempts):
+            self.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                throttled = is_rate_limit_error(e)
+                self.release(throttled=throttled)
+                if not throttled or attempt == max_attempts - 1:
+                    raise
+                delay = min(60.0, self.cooldown_seconds * (2 ** attempt))
+                print(f"Rate limited (limit now {int(self.limit)}), retrying in {delay:.1f}s...")
+                time.sleep(delay * (0.5 + random.random() / 2))
+                continue
+            self.release()
+            return result
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "limit": int(self.limit),
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "throttled": self.throttled,
+            }
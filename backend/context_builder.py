@@ -0,0 +1,243 @@
+import os
+from langchain_core.documents import Document
+from metrics import estimate_tokens, CHARS_PER_TOKEN
+
+# --- KONFIGURASI KONTEKS PROMPT ---
+# Ukuran prompt (system + riwayat + konteks + pertanyaan) dibatasi dalam token perkiraan.
+# Jumlah chunk yang masuk (k) ditentukan oleh budget dan skor relevansi, bukan angka tetap.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3500"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "400"))
+# Chunk dense dengan cosine similarity di bawah ambang ini dibuang (0 = nonaktif).
+# Default nonaktif karena sebaran skor berbeda per model embedding; kalibrasi dari
+# field "skor" /related_documents/ sebelum mengaktifkan.
+# Hasil leksikal (BM25) tidak punya skor yang sebanding sehingga tidak difilter.
+CONTEXT_MIN_SCORE = float(os.getenv("CONTEXT_MIN_SCORE", "0"))
+# Kandidat yang diambil dari retriever sebelum difilter & dipadatkan
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "12"))
+# Sisa budget minimal agar chunk terakhir masih layak dipotong dan dimasukkan
+MIN_TRUNCATED_TOKENS = 64
+# Pencarian overlap teks untuk chunk tanpa posisi karakter (overlap splitter indexer = 200)
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 400
+
+RELEVANCE_SCORE_KEY = "relevance_score"
+
+
+def _group_key(metadata: dict):
+    """Sumber sebuah chunk: paper (database) atau halaman (PDF)."""
+    source = metadata.get("paper_id") or metadata.get("uri") or metadata.get("source") or metadata.get("title")
+    return (source, metadata.get("page"))
+
+
+def _position(metadata: dict):
+    """(jenis, posisi) chunk di dalam sumbernya, atau None jika tidak diketahui."""
+    if metadata.get("start_index") is not None:
+        return ("offset", int(metadata["start_index"]))
+    if metadata.get("chunk_index") is not None:
+        return ("index", int(metadata["chunk_index"]))
+    return None
+
+
+def _join_overlapping(first: str, second: str, overlap: int = None) -> str:
+    """Menggabungkan dua chunk berurutan tanpa menduplikasi bagian overlap-nya."""
+    if overlap is None:
+        # Posisi tidak diketahui: cari suffix terpanjang 'first' yang juga prefix 'second'
+        overlap = 0
+        for size in range(min(len(first), len(second), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+            if first.endswith(second[:size]):
+                overlap = size
+                break
+    overlap = max(0, min(overlap, len(second)))
+    separator = "" if overlap else " "
+    return first + separator + second[overlap:]
+
+
+def merge_adjacent_chunks(documents):
+    """
+    Chunk yang bersebelahan/overlap dari sumber yang sama digabung menjadi satu dokumen,
+    sehingga overlap splitter (CHUNK_OVERLAP) dan header berulang tidak ikut memakan token.
+    Urutan hasil mengikuti chunk paling relevan di setiap gabungan.
+    """
+    groups = {}
+    order = []
+    for rank, doc in enumerate(documents):
+        key = _group_key(doc.metadata)
+        if key not in groups:
+            groups[key] = []
+            order.append(key)
+        groups[key].append((rank, doc))
+
+    merged = []
+    for key in order:
+        items = groups[key]
+        runs = [[item] for item in items if _position(item[1].metadata) is None]
+        positioned = sorted(
+            (item for item in items if _position(item[1].metadata) is not None),
+            key=lambda item: _position(item[1].metadata)
+        )
+        current, current_end = None, None
+        for item in positioned:
+            doc = item[1]
+            if current is not None and _is_adjacent(current[-1][1], doc, current_end):
+                current.append(item)
+            else:
+                current = [item]
+                runs.append(current)
+                current_end = None
+            if _position(doc.metadata)[0] == "offset":
+                current_end = max(current_end or 0, doc.metadata["start_index"] + len(doc.page_content))
+
+        for run in runs:
+            merged.append((min(rank for rank, _ in run), _merge_run([doc for _, doc in run])))
+
+    return [doc for _, doc in sorted(merged, key=lambda pair: pair[0])]
+
+
+def _is_adjacent(previous: Document, current: Document, run_end) -> bool:
+    kind, position = _position(current.metadata)
+    previous_kind, previous_position = _position(previous.metadata)
+    if kind != previous_kind:
+        return False
+    if kind == "index":
+        return position == previous_position + 1
+    # Offset karakter: overlap atau bersambung langsung dengan akhir gabungan sebelumnya
+    return position <= run_end
+
+
+def _merge_run(run):
+    if len(run) == 1:
+        return run[0]
+    text = run[0].page_content
+    end = None
+    if _position(run[0].metadata)[0] == "offset":
+        end = run[0].metadata["start_index"] + len(text)
+    for doc in run[1:]:
+        overlap = None
+        if end is not None:
+            overlap = end - doc.metadata["start_index"]
+            # Chunk yang seluruhnya sudah tercakup tidak menambah teks
+            if overlap >= len(doc.page_content):
+                continue
+            end = doc.metadata["start_index"] + len(doc.page_content)
+        text = _join_overlapping(text, doc.page_content, overlap)
+
+    scores = [doc.metadata.get(RELEVANCE_SCORE_KEY) for doc in run if doc.metadata.get(RELEVANCE_SCORE_KEY) is not None]
+    metadata = {**run[0].metadata, "merged_chunks": len(run)}
+    if scores:
+        metadata[RELEVANCE_SCORE_KEY] = max(scores)
+    return Document(page_content=text, metadata=metadata)
+
+
+def _truncate_to_tokens(text: str, tokens: int) -> str:
+    if estimate_tokens(text) <= tokens:
+        return text
+    # Sisakan ruang untuk penanda " ..."
+    limit = max(0, (tokens - 1) * CHARS_PER_TOKEN)
+    cut = text[:limit]
+    # Potong di batas kata terakhir agar tidak ada kata terpenggal
+    space = cut.rfind(" ")
+    return (cut[:space] if space > limit // 2 else cut) + " ..."
+
+
+def format_history(messages, budget: int = HISTORY_TOKEN_BUDGET):
+    """
+    Riwayat chat dari yang terbaru ke belakang sampai budget token habis
+    (bukan jumlah giliran tetap). Pesan yang terlalu panjang dipotong.
+    Mengembalikan (teks, jumlah_pesan_dipakai).
+    """
+    lines = []
+    remaining = budget
+    for msg in reversed(messages):
+        line = f"{msg.role}: {msg.content}"
+        tokens = estimate_tokens(line)
+        if tokens > remaining:
+            if remaining >= MIN_TRUNCATED_TOKENS:
+                lines.append(_truncate_to_tokens(line, remaining))
+            break
+        lines.append(line)
+        remaining -= tokens
+    return "\n".join(reversed(lines)), len(lines)
+
+
+class PromptContext:
+    """Hasil perakitan prompt: teks prompt, dokumen yang benar-benar dipakai, dan statistiknya."""
+
+    def __init__(self, prompt: str, documents, stats: dict):
+        self.prompt = prompt
+        self.documents = documents
+        self.stats = stats
+
+    def log(self, label: str):
+        s = self.stats
+        print(f"{label} prompt: {s['prompt_tokens']}/{s['budget']} tokens "
+              f"(system {s['system_tokens']}, history {s['history_tokens']} from {s['history_messages']} msgs, "
+              f"context {s['context_tokens']} from {s['chunks_used']}/{s['candidates']} chunks, "
+              f"{s['below_threshold']} below score, {s['merged_away']} merged, {s['over_budget']} over budget"
+              f"{', context truncated' if s['context_truncated'] else ''})")
+
+
+def build_prompt(query: str, chat_history, render_prompt, documents=None, format_document=None,
+                 separator: str = "\n\n", fixed_context: str = None,
+                 budget: int = PROMPT_TOKEN_BUDGET, min_score: float = CONTEXT_MIN_SCORE) -> PromptContext:
+    """
+    Merakit prompt dalam batas budget token:
+    1. riwayat chat dipotong per token (HISTORY_TOKEN_BUDGET),
+    2. chunk dengan skor relevansi < min_score dibuang,
+    3. chunk bersebelahan dari sumber yang sama digabung,
+    4. dokumen diisi berurutan dari yang paling relevan sampai sisa budget habis.
+    render_prompt(chat_history, context, query) menghasilkan teks prompt lengkap.
+    fixed_context (konteks dari client) dipakai tanpa seleksi dokumen, hanya dipotong ke budget;
+    stats["context_truncated"] menandai konteks (client maupun dokumen) yang terpotong.
+    """
+    system_tokens = estimate_tokens(render_prompt("", "", query))
+    history, history_messages = format_history(chat_history, min(HISTORY_TOKEN_BUDGET, max(0, budget - system_tokens)))
+    history_tokens = estimate_tokens(history)
+    available = max(0, budget - system_tokens - history_tokens)
+
+    stats = {
+        "budget": budget, "system_tokens": system_tokens, "history_tokens": history_tokens,
+        "history_messages": history_messages, "candidates": 0, "below_threshold": 0,
+        "merged_away": 0, "over_budget": 0, "chunks_used": 0, "context_truncated": False,
+    }
+    selected = []
+
+    if fixed_context is not None:
+        context = _truncate_to_tokens(fixed_context, available)
+        stats["context_truncated"] = context != fixed_context
+    else:
+        documents = list(documents or [])
+        stats["candidates"] = len(documents)
+        relevant = [
+            doc for doc in documents
+            if min_score <= 0 or doc.metadata.get(RELEVANCE_SCORE_KEY) is None
+            or doc.metadata[RELEVANCE_SCORE_KEY] >= min_score
+        ]
+        stats["below_threshold"] = len(documents) - len(relevant)
+        merged = merge_adjacent_chunks(relevant)
+        stats["merged_away"] = len(relevant) - len(merged)
+
+        parts = []
+        remaining = available
+        separator_tokens = estimate_tokens(separator)
+        for doc in merged:
+            text = format_document(doc)
+            tokens = estimate_tokens(text) + (separator_tokens if parts else 0)
+            if tokens <= remaining:
+                parts.append(text)
+                selected.append(doc)
+                remaining -= tokens
+            elif not parts and remaining >= MIN_TRUNCATED_TOKENS:
+                # Dokumen paling relevan tetap masuk walau harus dipotong
+                parts.append(_truncate_to_tokens(text, remaining))
+                selected.append(doc)
+                remaining = 0
+                stats["context_truncated"] = True
+            else:
+                stats["over_budget"] += 1
+        context = separator.join(parts)
+        stats["chunks_used"] = sum(doc.metadata.get("merged_chunks", 1) for doc in selected)
+
+    stats["context_tokens"] = estimate_tokens(context)
+    prompt = render_prompt(history, context, query)
+    stats["prompt_tokens"] = estimate_tokens(prompt)
+    return PromptContext(prompt, selected, stats)
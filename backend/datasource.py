@@ -0,0 +1,111 @@
+import json
+import os
+import shutil
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# --- LAYOUT DATA SOURCE PARQUET ---
+# data_source/paper_metadata/
+#   _state.json                 watermark & kolom kunci run terakhir
+#   _keys.parquet               semua kunci yang ada di DB pada run terakhir (deteksi delete)
+#   _watermark_keys.parquet     kunci baris yang sudah diekspor pada nilai watermark terakhir
+#   run=20240101T020000/
+#     _manifest.json            mode (full/incremental), jumlah baris, watermark
+#     part-00000.parquet        baris baru/berubah
+#     deleted.parquet           kunci yang hilang dari DB sejak run sebelumnya
+PARTITION_DIRNAME = "paper_metadata"
+STATE_FILENAME = "_state.json"
+KEYS_FILENAME = "_keys.parquet"
+WATERMARK_KEYS_FILENAME = "_watermark_keys.parquet"
+MANIFEST_FILENAME = "_manifest.json"
+DELETED_FILENAME = "deleted.parquet"
+RUN_PREFIX = "run="
+
+
+def read_json(path: str, default=None):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_json(path: str, data: dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+def list_runs(root: str):
+    """Run yang sudah selesai (punya manifest), terurut dari yang paling lama."""
+    if not os.path.isdir(root):
+        return []
+    runs = []
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name)
+        manifest = read_json(os.path.join(path, MANIFEST_FILENAME))
+        if name.startswith(RUN_PREFIX) and not name.endswith(".tmp") and manifest:
+            runs.append((path, manifest))
+    return runs
+
+
+def active_runs(root: str):
+    """Run full terakhir beserta semua run inkremental setelahnya."""
+    runs = list_runs(root)
+    for i in range(len(runs) - 1, -1, -1):
+        if runs[i][1].get("mode") == "full":
+            return runs[i:]
+    return runs
+
+
+def prune_runs(root: str) -> int:
+    """Menghapus run yang lebih lama dari run full terakhir (sudah tidak dibaca indexer)."""
+    active = {path for path, _ in active_runs(root)}
+    removed = 0
+    for path, _ in list_runs(root):
+        if path not in active:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+def has_partitions(root: str) -> bool:
+    return bool(list_runs(root))
+
+
+def _batch_to_frame(batch):
+    """Semua kolom dijadikan string dengan nilai kosong = '' (sama seperti pembacaan CSV)."""
+    columns = {
+        name: pc.cast(column, pa.string())
+        for name, column in zip(batch.schema.names, batch.columns)
+    }
+    return pa.table(columns).to_pandas().fillna('')
+
+
+def read_keys(path: str):
+    if not os.path.exists(path):
+        return set()
+    table = pq.read_table(path)
+    return set(table.column(0).cast(pa.string()).to_pylist())
+
+
+def iter_partition_frames(root: str, batch_rows: int = 2000):
+    """
+    Membaca run yang aktif dari yang terbaru ke yang terlama per row group, sehingga
+    versi terbaru sebuah paper muncul lebih dulu. Baris yang sudah digantikan run yang
+    lebih baru, atau dihapus setelahnya, dilewati.
+    """
+    seen = set()
+    for run_path, manifest in reversed(active_runs(root)):
+        key_column = manifest["key_column"]
+        for name in sorted(os.listdir(run_path)):
+            if not name.startswith("part-"):
+                continue
+            for batch in pq.ParquetFile(os.path.join(run_path, name)).iter_batches(batch_size=batch_rows):
+                frame = _batch_to_frame(batch)
+                frame = frame[~frame[key_column].isin(seen)]
+                seen.update(frame[key_column])
+                if len(frame):
+                    yield frame
+        seen.update(read_keys(os.path.join(run_path, DELETED_FILENAME)))
@@ -1,10 +1,25 @@
 import pandas as pd
 import psycopg2
 import paramiko 
+import argparse
+import csv
+import gzip
+import io
 import os
+import shutil
+import sqlite3
 import sys
+import time
+import pyarrow as pa
+import pyarrow.parquet as pq
+from contextlib import contextmanager
+from datetime import datetime
 from sshtunnel import SSHTunnelForwarder 
 from dotenv import load_dotenv
+from datasource import (
+    PARTITION_DIRNAME, STATE_FILENAME, KEYS_FILENAME, WATERMARK_KEYS_FILENAME, MANIFEST_FILENAME, DELETED_FILENAME,
+    RUN_PREFIX, read_json, write_json, read_keys, has_partitions, prune_runs
+)
 
 # Muat variabel lingkungan untuk kredensial DB
 load_dotenv()
@@ -33,75 +48,407 @@ DATA_SOURCE_DIR = os.path.join(BASE_DIR, "..", "data_source")
 
 CSV_FILENAME = "paper_metadata.csv"
 LOCAL_EXPORT_PATH = os.path.join(DATA_SOURCE_DIR, CSV_FILENAME)
+GZIP_EXPORT_PATH = LOCAL_EXPORT_PATH + ".gz"
 
-QUERY = "SELECT * FROM metadata_paper" 
+TABLE_NAME = "metadata_paper"
+QUERY = f"SELECT * FROM {TABLE_NAME}" 
 LOCAL_BIND_PORT = 6543 # Port lokal yang akan diteruskan (forwarded)
 
+# --- KONFIGURASI EKSPOR INKREMENTAL ---
+# parquet: run per partisi (data_source/paper_metadata/run=...), csv: dump penuh lama,
+# csv.gz: dump penuh lewat COPY ... TO STDOUT langsung ke file gzip (bulk)
+EXPORT_FORMAT = os.environ.get("EXPORT_FORMAT", "parquet").lower()
+PARTITION_DIR = os.path.join(DATA_SOURCE_DIR, PARTITION_DIRNAME)
+EXPORT_KEY_COLUMN = os.environ.get("EXPORT_KEY_COLUMN", "id")
+# Kolom "terakhir diubah" (mis. updated_at). Kosong = watermark memakai kunci terbesar,
+# artinya hanya baris baru yang terdeteksi (perubahan baris lama tidak).
+EXPORT_WATERMARK_COLUMN = os.environ.get("EXPORT_WATERMARK_COLUMN", "")
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", "5000"))
+# Level gzip rendah cukup: tujuannya agar kompresi tidak lebih lambat dari tunnel
+EXPORT_GZIP_LEVEL = int(os.environ.get("EXPORT_GZIP_LEVEL", "3"))
+EXPORT_PROGRESS_SECONDS = 5
+
 if not hasattr(paramiko, "DSSKey"):
     class DSSKey:
         pass
     paramiko.DSSKey = DSSKey
 
-def extract_and_save_locally():
+@contextmanager
+def open_connection(sqlite_path=None, use_tunnel=True):
+    """
+    Membuka koneksi DB dan mengembalikan (conn, placeholder parameter).
+    sqlite_path dipakai sebagai pengganti lokal DB kampus untuk pengujian;
+    use_tunnel=False terhubung langsung ke DB_HOST:DB_PORT (mis. PostgreSQL lokal).
+    """
+    if sqlite_path:
+        conn = sqlite3.connect(sqlite_path, check_same_thread=False)
+        try:
+            yield conn, "?"
+        finally:
+            conn.close()
+        return
+
+    if not use_tunnel:
+        conn = psycopg2.connect(host=DB_HOST, database=DB_NAME, user=DB_USER, password=DB_PASSWORD, port=DB_PORT)
+        try:
+            yield conn, "%s"
+        finally:
+            conn.close()
+        return
+
+    # Pengecekan Kunci SSH
+    ssh_pkey = None
+    if SSH_KEY_PATH and os.path.exists(SSH_KEY_PATH):
+        try:
+            ssh_pkey = paramiko.RSAKey.from_private_key_file(SSH_KEY_PATH)
+        except Exception as e:
+            print(f"WARNING: Failed to load SSH Key: {e}. Falling back to password.")
+            ssh_pkey = None
+    else:
+        # print("WARNING: SSH key path not found or empty. Using password auth.")
+        pass
+
+    with SSHTunnelForwarder(
+        (SSH_HOST, SSH_PORT),
+        ssh_username=SSH_USER,
+        ssh_password=SSH_PASSWORD,
+        remote_bind_address=('127.0.0.1', 5432)
+    ) as tunnel:
+
+        print(f"SSH Tunnel opened. Local port: {tunnel.local_bind_port}")
+
+        conn = psycopg2.connect(
+            host='127.0.0.1', # Koneksi ke port lokal
+            database=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            port=tunnel.local_bind_port # Gunakan port lokal yang diteruskan
+        )
+        try:
+            yield conn, "%s"
+        finally:
+            conn.close()
+
+def open_cursor(conn, name="export_cursor"):
+    """Cursor server-side (named) untuk PostgreSQL agar hasil query tidak ditarik sekaligus."""
+    if isinstance(conn, sqlite3.Connection):
+        return conn.cursor()
+    cursor = conn.cursor(name=name)
+    cursor.itersize = EXPORT_CHUNK_ROWS
+    return cursor
+
+def iter_row_chunks(cursor, chunk_rows=None):
+    while True:
+        rows = cursor.fetchmany(chunk_rows or EXPORT_CHUNK_ROWS)
+        if not rows:
+            break
+        yield rows
+
+# --- EKSPOR CSV (MODE LAMA) ---
+
+def export_csv(conn):
+    # Tentukan ukuran chunk (misal 5000 baris per tarikan)
+    total_rows = 0
+    first_chunk = True
+
+    # Gunakan iterator chunksize dari pandas
+    for chunk in pd.read_sql(QUERY, conn, chunksize=EXPORT_CHUNK_ROWS):
+
+        chunk.to_csv(
+            LOCAL_EXPORT_PATH,
+            index=False,
+            mode='w' if first_chunk else 'a',
+            header=first_chunk
+        )
+
+        total_rows += len(chunk)
+        print(f"Saved chunk ({len(chunk)} rows), Total: {total_rows}")
+
+        first_chunk = False
+
+    print(f"Successfully extracted {total_rows} rows.")
+    return True
+
+# --- EKSPOR BULK (COPY -> GZIP) ---
+
+class ProgressWriter:
+    """Membungkus file tujuan: menghitung byte yang lewat dan mencetak laju secara berkala."""
+
+    def __init__(self, target):
+        self.target = target
+        self.bytes_written = 0
+        self.start_time = time.time()
+        self._last_report = self.start_time
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        now = time.time()
+        if now - self._last_report >= EXPORT_PROGRESS_SECONDS:
+            self._last_report = now
+            print(f"  {self.bytes_written / 1e6:.1f} MB received ({self.bytes_written / 1e6 / (now - self.start_time):.2f} MB/s)")
+        return self.target.write(data)
+
+def copy_to_gzip(conn, tmp_path):
+    """
+    PostgreSQL: COPY ... TO STDOUT dialirkan langsung ke file gzip tanpa membangun
+    DataFrame. SQLite: cursor fetchmany + csv.writer. Mengembalikan (baris, byte mentah).
+    """
+    with gzip.open(tmp_path, "wb", compresslevel=EXPORT_GZIP_LEVEL) as gz:
+        writer = ProgressWriter(gz)
+
+        if not isinstance(conn, sqlite3.Connection):
+            cursor = conn.cursor()
+            cursor.copy_expert(f"COPY ({QUERY}) TO STDOUT WITH (FORMAT csv, HEADER true)", writer, size=1024 * 1024)
+            total_rows = cursor.rowcount
+            cursor.close()
+            return total_rows, writer.bytes_written
+
+        # Baris ditulis per chunk ke buffer teks lalu di-encode, agar memori tetap terbatas
+        buffer = io.StringIO()
+        csv_writer = csv.writer(buffer)
+        cursor = open_cursor(conn)
+        cursor.execute(QUERY)
+        csv_writer.writerow([d[0] for d in cursor.description])
+        total_rows = 0
+        for rows in iter_row_chunks(cursor):
+            csv_writer.writerows(rows)
+            writer.write(buffer.getvalue().encode("utf-8"))
+            buffer.seek(0)
+            buffer.truncate(0)
+            total_rows += len(rows)
+        writer.write(buffer.getvalue().encode("utf-8"))
+        cursor.close()
+        return total_rows, writer.bytes_written
+
+def export_csv_gzip(conn):
+    tmp_path = GZIP_EXPORT_PATH + ".tmp"
+    start_time = time.time()
+    total_rows, raw_bytes = copy_to_gzip(conn, tmp_path)
+    os.replace(tmp_path, GZIP_EXPORT_PATH)
+
+    elapsed = max(time.time() - start_time, 1e-6)
+    compressed = os.path.getsize(GZIP_EXPORT_PATH)
+    print(f"Successfully extracted {total_rows} rows in {elapsed:.1f}s "
+          f"({total_rows / elapsed:.0f} rows/s, {raw_bytes / 1e6 / elapsed:.2f} MB/s, "
+          f"{raw_bytes / 1e6:.1f} MB -> {compressed / 1e6:.1f} MB gzip).")
+    return True
+
+# --- EKSPOR PARQUET INKREMENTAL ---
+
+# Tipe kolom yang dideklarasikan DB -> tipe Arrow (dicocokkan per substring, urutan penting).
+# Tipe lain (teks, tanggal, numeric/decimal, tanpa tipe) disimpan sebagai string.
+ARROW_TYPE_RULES = [
+    ("interval", pa.string()),
+    ("point", pa.string()),
+    ("bool", pa.bool_()),
+    ("int", pa.int64()),
+    ("real", pa.float64()),
+    ("floa", pa.float64()),
+    ("doub", pa.float64()),
+    ("blob", pa.binary()),
+    ("bytea", pa.binary()),
+]
+
+def arrow_type(declared_type):
+    declared_type = (declared_type or "").lower()
+    for pattern, arrow in ARROW_TYPE_RULES:
+        if pattern in declared_type:
+            return arrow
+    return pa.string()
+
+def fetch_column_types(conn, placeholder):
+    """{kolom: tipe yang dideklarasikan} dari katalog DB (bukan dari isi data)."""
+    cursor = conn.cursor()
+    if isinstance(conn, sqlite3.Connection):
+        cursor.execute(f"PRAGMA table_info({TABLE_NAME})")
+        types = {row[1]: row[2] for row in cursor.fetchall()}
+    else:
+        cursor.execute(
+            "SELECT column_name, data_type FROM information_schema.columns "
+            f"WHERE table_name = {placeholder} ORDER BY ordinal_position",
+            (TABLE_NAME,)
+        )
+        types = {row[0]: row[1] for row in cursor.fetchall()}
+    cursor.close()
+    return types
+
+def parquet_schema(columns, column_types):
+    """Skema tetap per tabel sehingga setiap chunk dan setiap run punya tipe kolom yang sama."""
+    return pa.schema([pa.field(col, arrow_type(column_types.get(col))) for col in columns])
+
+def _column_values(values, arrow):
+    # SQLite bertipe dinamis dan tipe tanggal/decimal tidak punya padanan langsung:
+    # kolom string menerima nilai apa pun dalam bentuk teksnya
+    if arrow == pa.string():
+        return [value if value is None or isinstance(value, str) else str(value) for value in values]
+    return values
+
+def write_rows_parquet(cursor, path, order_column, column_types, watermark=None, exported_keys=()):
+    """
+    Menulis hasil cursor per chunk ke satu file Parquet (kompresi zstd).
+    Skema dibangun dari tipe kolom yang dideklarasikan tabel, bukan dari chunk pertama,
+    sehingga kolom yang kosong di awal tidak mengubah tipe kolom.
+    Baris dengan nilai order_column == watermark yang kuncinya ada di exported_keys
+    sudah diekspor run sebelumnya dan dilewati.
+    Mengembalikan (jumlah_baris, nilai order_column pada baris terakhir,
+    kunci semua baris yang bernilai sama dengan baris terakhir).
+    """
+    writer = None
+    schema = None
+    total_rows = 0
+    last_value = None
+    boundary_keys = set()
+
+    for rows in iter_row_chunks(cursor):
+        if writer is None:
+            # description cursor server-side PostgreSQL baru terisi setelah fetch pertama
+            columns = [d[0] for d in cursor.description]
+            schema = parquet_schema(columns, column_types)
+            writer = pq.ParquetWriter(path, schema, compression="zstd")
+            order_index = columns.index(order_column)
+            key_index = columns.index(EXPORT_KEY_COLUMN)
+
+        new_rows = []
+        for row in rows:
+            value, key = row[order_index], str(row[key_index])
+            if value != last_value:
+                boundary_keys = set()
+            last_value = value
+            boundary_keys.add(key)
+            if watermark is not None and str(value) == watermark and key in exported_keys:
+                continue
+            new_rows.append(row)
+        if not new_rows:
+            continue
+
+        data = {
+            field.name: _column_values([row[i] for row in new_rows], field.type)
+            for i, field in enumerate(schema)
+        }
+
+        writer.write_table(pa.table(data, schema=schema))
+        total_rows += len(new_rows)
+        print(f"Saved chunk ({len(new_rows)} rows), Total: {total_rows}")
+
+    if writer is not None:
+        writer.close()
+        if total_rows == 0:
+            os.remove(path)
+    return total_rows, last_value, boundary_keys
+
+def fetch_keys(conn):
+    """Semua kunci yang saat ini ada di tabel (untuk mendeteksi baris yang dihapus)."""
+    keys = set()
+    cursor = open_cursor(conn, name="export_keys_cursor")
+    cursor.execute(f"SELECT {EXPORT_KEY_COLUMN} FROM {TABLE_NAME}")
+    for rows in iter_row_chunks(cursor, 50000):
+        keys.update(str(row[0]) for row in rows)
+    cursor.close()
+    return keys
+
+def write_keys(path, keys):
+    pq.write_table(pa.table({EXPORT_KEY_COLUMN: sorted(keys)}), path, compression="zstd")
+
+def export_parquet(conn, placeholder, full=False):
+    os.makedirs(PARTITION_DIR, exist_ok=True)
+    state_path = os.path.join(PARTITION_DIR, STATE_FILENAME)
+    keys_path = os.path.join(PARTITION_DIR, KEYS_FILENAME)
+    watermark_keys_path = os.path.join(PARTITION_DIR, WATERMARK_KEYS_FILENAME)
+    state = read_json(state_path, {})
+
+    # Inkremental hanya jika konfigurasi kunci/watermark sama dengan run sebelumnya
+    incremental = (
+        not full
+        and has_partitions(PARTITION_DIR)
+        and state.get("key_column") == EXPORT_KEY_COLUMN
+        and state.get("watermark_column") == EXPORT_WATERMARK_COLUMN
+    )
+    order_column = EXPORT_WATERMARK_COLUMN or EXPORT_KEY_COLUMN
+    watermark = state.get("watermark") if incremental else None
+    exported_keys = read_keys(watermark_keys_path) if watermark is not None else set()
+
+    # '>=' karena baris yang di-commit belakangan bisa punya nilai watermark yang sama
+    # dengan baris terakhir run sebelumnya; baris di watermark yang sudah diekspor
+    # (exported_keys) dilewati. Perubahan yang tidak mengubah kolom watermark tidak terdeteksi.
+    query = QUERY
+    params = ()
+    if watermark is not None:
+        query += f" WHERE {order_column} >= {placeholder}"
+        params = (watermark,)
+    query += f" ORDER BY {order_column}"
+
+    mode = "incremental" if incremental else "full"
+    print(f"Export mode: {mode} (watermark {order_column} >= {watermark})")
+
+    run_name = RUN_PREFIX + datetime.now().strftime("%Y%m%dT%H%M%S")
+    run_dir = os.path.join(PARTITION_DIR, run_name)
+    tmp_dir = run_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    column_types = fetch_column_types(conn, placeholder)
+    cursor = open_cursor(conn)
+    cursor.execute(query, params)
+    total_rows, last_value, boundary_keys = write_rows_parquet(
+        cursor, os.path.join(tmp_dir, "part-00000.parquet"), order_column, column_types,
+        watermark, exported_keys
+    )
+    cursor.close()
+
+    current_keys = fetch_keys(conn)
+    deleted = (read_keys(keys_path) - current_keys) if incremental else set()
+    if deleted:
+        write_keys(os.path.join(tmp_dir, DELETED_FILENAME), deleted)
+
+    if incremental and total_rows == 0 and not deleted:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        print("No new, changed or deleted rows since the last run.")
+        return True
+
+    if last_value is None:
+        new_watermark, boundary_keys = watermark, exported_keys
+    else:
+        new_watermark = str(last_value)
+    write_json(os.path.join(tmp_dir, MANIFEST_FILENAME), {
+        "run": run_name,
+        "mode": mode,
+        "rows": total_rows,
+        "deleted": len(deleted),
+        "key_column": EXPORT_KEY_COLUMN,
+        "watermark_column": order_column,
+        "watermark": new_watermark,
+    })
+    # Run baru baru terlihat oleh indexer setelah semua file lengkap
+    os.replace(tmp_dir, run_dir)
+
+    write_keys(keys_path, current_keys)
+    write_keys(watermark_keys_path, boundary_keys)
+    write_json(state_path, {
+        "key_column": EXPORT_KEY_COLUMN,
+        "watermark_column": EXPORT_WATERMARK_COLUMN,
+        "watermark": new_watermark,
+        "last_run": run_name,
+    })
+
+    if not incremental:
+        removed = prune_runs(PARTITION_DIR)
+        if removed:
+            print(f"Removed {removed} superseded runs.")
+
+    print(f"Successfully extracted {total_rows} rows, {len(deleted)} deletions ({run_name}).")
+    return True
+
+def extract_and_save_locally(full=False, sqlite_path=None, use_tunnel=True, export_format=EXPORT_FORMAT):
     print("--- Starting Database Extraction with SSH Tunnel ---")
-    
-    # 1. Mulai SSH Tunnel
+
     try:
-        # Pengecekan Kunci SSH
-        ssh_pkey = None
-        if SSH_KEY_PATH and os.path.exists(SSH_KEY_PATH):
-            try:
-                ssh_pkey = paramiko.RSAKey.from_private_key_file(SSH_KEY_PATH)
-            except Exception as e:
-                print(f"WARNING: Failed to load SSH Key: {e}. Falling back to password.")
-                ssh_pkey = None
-        else:
-            # print("WARNING: SSH key path not found or empty. Using password auth.")
-            pass
-
-        with SSHTunnelForwarder(
-            (SSH_HOST, SSH_PORT),
-            ssh_username=SSH_USER,
-            ssh_password=SSH_PASSWORD,
-            remote_bind_address=('127.0.0.1', 5432)
-        ) as tunnel:
-            
-            print(f"SSH Tunnel opened. Local port: {tunnel.local_bind_port}")
-            
-            # 2. Ekstraksi Data dari Database melalui Tunnel
-            conn = psycopg2.connect(
-                host='127.0.0.1', # Koneksi ke port lokal
-                database=DB_NAME,
-                user=DB_USER,
-                password=DB_PASSWORD,
-                port=tunnel.local_bind_port # Gunakan port lokal yang diteruskan
-            )
-            
+        with open_connection(sqlite_path, use_tunnel) as (conn, placeholder):
             print("Connected. Starting data extraction in chunks...")
-            
-            # Tentukan ukuran chunk (misal 5000 baris per tarikan)
-            chunk_size = 5000
-            total_rows = 0
-            first_chunk = True
-            
-            # Gunakan iterator chunksize dari pandas
-            for chunk in pd.read_sql(QUERY, conn, chunksize=chunk_size):
-
-                chunk.to_csv(
-                    LOCAL_EXPORT_PATH,
-                    index=False,
-                    mode='w' if first_chunk else 'a',
-                    header=first_chunk
-                )
-
-                total_rows += len(chunk)
-                print(f"Saved chunk ({len(chunk)} rows), Total: {total_rows}")
-
-                first_chunk = False
-
-            conn.close()
-            print(f"Successfully extracted {total_rows} rows.")
-            return True
+            if export_format == "csv":
+                return export_csv(conn)
+            if export_format == "csv.gz":
+                return export_csv_gzip(conn)
+            return export_parquet(conn, placeholder, full=full)
 
     except paramiko.ssh_exception.AuthenticationException:
         print("FATAL ERROR: SSH Authentication failed. Check SSH key and user.")
@@ -114,6 +461,15 @@ def extract_and_save_locally():
         return False
 
 if __name__ == "__main__":
-    success = extract_and_save_locally()
+    parser = argparse.ArgumentParser(description="Export metadata_paper ke data_source/")
+    parser.add_argument("--full", action="store_true", help="Abaikan watermark dan ekspor ulang semua baris")
+    parser.add_argument("--sqlite", metavar="PATH", help="Gunakan file SQLite lokal sebagai pengganti DB kampus")
+    parser.add_argument("--no-tunnel", action="store_true", help="Terhubung langsung ke DB_HOST tanpa SSH tunnel")
+    parser.add_argument("--format", choices=["parquet", "csv", "csv.gz"], default=EXPORT_FORMAT,
+                        help="Format output (default dari EXPORT_FORMAT)")
+    args = parser.parse_args()
+
+    success = extract_and_save_locally(full=args.full, sqlite_path=args.sqlite, use_tunnel=not args.no_tunnel,
+                                       export_format=args.format)
     if not success:
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
@@ -0,0 +1,321 @@
+import asyncio
+import json
+import os
+import shutil
+import sys
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from concurrency import run_blocking
+
+# --- KONFIGURASI VERSI INDEX ---
+# vector_store/
+#   CURRENT                  nama versi yang aktif
+#   versions/<timestamp>/    satu index lengkap (Chroma + lexical_index.pkl) per refresh
+# Tanpa file CURRENT, isi folder vector_store itu sendiri dianggap versi "legacy".
+VECTOR_STORE_ROOT = os.getenv("VECTOR_STORE_ROOT", "../vector_store")
+VERSIONS_DIRNAME = "versions"
+CURRENT_FILENAME = "CURRENT"
+LEGACY_VERSION = "legacy"
+# Ditulis pipeline.py di folder versi; status "running" berarti refresh belum selesai
+REFRESH_CHECKPOINT_FILENAME = "pipeline_checkpoint.json"
+REFRESH_COMPLETE_STATUS = "complete"
+# Jumlah versi terbaru yang disimpan di disk (versi aktif & sebelumnya selalu disimpan)
+INDEX_KEEP_VERSIONS = int(os.getenv("INDEX_KEEP_VERSIONS", "3"))
+# Setelah batas waktu ini versi lama yang masih dipakai request hanya dilaporkan;
+# versi itu tetap dimuat (dan tidak di-prune) sampai request terakhirnya selesai
+INDEX_DRAIN_TIMEOUT_SECONDS = float(os.getenv("INDEX_DRAIN_TIMEOUT_SECONDS", "120"))
+
+
+def version_path(version: str, root: str = VECTOR_STORE_ROOT) -> str:
+    if version == LEGACY_VERSION:
+        return root
+    return os.path.join(root, VERSIONS_DIRNAME, version)
+
+
+def list_versions(root: str = VECTOR_STORE_ROOT):
+    """Nama versi yang ada di disk, terurut dari yang paling lama."""
+    directory = os.path.join(root, VERSIONS_DIRNAME)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        name for name in os.listdir(directory)
+        if os.path.isdir(os.path.join(directory, name)) and not name.endswith(".tmp")
+    )
+
+
+def read_current(root: str = VECTOR_STORE_ROOT) -> str:
+    path = os.path.join(root, CURRENT_FILENAME)
+    if not os.path.exists(path):
+        return LEGACY_VERSION
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip() or LEGACY_VERSION
+
+
+def write_current(version: str, root: str = VECTOR_STORE_ROOT):
+    """Mengganti pointer versi aktif secara atomik (tulis file sementara lalu rename)."""
+    path = os.path.join(root, CURRENT_FILENAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(tmp_path, path)
+
+
+def new_version_name() -> str:
+    return datetime.now().strftime("%Y%m%dT%H%M%S")
+
+
+class IncompleteVersionError(ValueError):
+    """Versi yang refresh-nya belum selesai sehingga tidak boleh diaktifkan."""
+
+
+def refresh_status(version: str, root: str = VECTOR_STORE_ROOT):
+    """Status checkpoint pipeline di folder versi, atau None jika tidak ada checkpoint."""
+    checkpoint = os.path.join(version_path(version, root), REFRESH_CHECKPOINT_FILENAME)
+    if not os.path.exists(checkpoint):
+        return None
+    with open(checkpoint, "r", encoding="utf-8") as f:
+        return json.load(f).get("status")
+
+
+def unfinished_version(root: str = VECTOR_STORE_ROOT):
+    """Versi terbaru yang refresh-nya terputus (belum pernah diaktifkan), jika ada."""
+    current = read_current(root)
+    for version in reversed(list_versions(root)):
+        if current != LEGACY_VERSION and version <= current:
+            break
+        if refresh_status(version, root) == "running":
+            return version
+    return None
+
+
+def prepare_version(version: str = None, root: str = VECTOR_STORE_ROOT) -> str:
+    """
+    Membuat folder versi baru berisi salinan versi aktif, sebagai titik awal refresh
+    inkremental. Versi aktif tidak pernah ditulis oleh indexer. Jika refresh
+    sebelumnya terputus, folder versinya dipakai lagi agar bisa dilanjutkan.
+    """
+    if version is None:
+        unfinished = unfinished_version(root)
+        if unfinished is not None:
+            return version_path(unfinished, root)
+        version = new_version_name()
+
+    target = version_path(version, root)
+    if os.path.exists(target):
+        raise ValueError(f"Index version '{version}' already exists.")
+
+    source = version_path(read_current(root), root)
+    if os.path.isdir(source):
+        shutil.copytree(source, target, ignore=shutil.ignore_patterns(VERSIONS_DIRNAME, CURRENT_FILENAME + "*"))
+    else:
+        os.makedirs(target)
+    return target
+
+
+def prune_versions(keep_versions, root: str = VECTOR_STORE_ROOT, keep_latest: int = INDEX_KEEP_VERSIONS) -> int:
+    """Menghapus versi lama di luar keep_latest terbaru, kecuali yang masih dipakai."""
+    versions = list_versions(root)
+    removed = 0
+    for version in versions[:max(0, len(versions) - keep_latest)]:
+        if version in keep_versions:
+            continue
+        shutil.rmtree(version_path(version, root), ignore_errors=True)
+        removed += 1
+    return removed
+
+
+def close_chroma_client(client):
+    """
+    Menutup PersistentClient Chroma. Chroma menyimpan satu System (koneksi SQLite,
+    segment HNSW) per path di cache kelas SharedSystemClient, sehingga System itu
+    tetap hidup walaupun semua objek client/vector store sudah tidak direferensikan.
+    """
+    if client is None:
+        return
+    if hasattr(client, "close"):
+        # chromadb >= 1.x: refcount per path, System dihentikan oleh client terakhir
+        client.close()
+        return
+    from chromadb.api.shared_system_client import SharedSystemClient
+    system = SharedSystemClient._identifier_to_system.pop(getattr(client, "_identifier", None), None)
+    if system is not None:
+        system.stop()
+
+
+class IndexHandle:
+    """
+    Satu versi index yang sudah dimuat (vector store, retriever, index leksikal).
+    in_flight menghitung request yang sedang memakai versi ini. client adalah
+    PersistentClient Chroma milik versi ini, ditutup saat versinya dilepas.
+    """
+
+    def __init__(self, version: str, path: str, vector_store, retriever, lexical_index, client=None):
+        self.version = version
+        self.path = path
+        self.vector_store = vector_store
+        self.retriever = retriever
+        self.lexical_index = lexical_index
+        self.client = client
+        self.in_flight = 0
+        self.loaded_at = time.time()
+
+    def release(self):
+        """Menutup client Chroma dan melepas referensi index (blocking)."""
+        close_chroma_client(self.client)
+        self.client = self.vector_store = self.retriever = self.lexical_index = None
+
+    def warm(self):
+        """
+        Memuat index HNSW ke memori dengan satu query memakai vektor yang sudah
+        tersimpan, sehingga request pertama setelah swap tidak lambat dan tidak
+        memanggil API embedding.
+        """
+        if self.vector_store is None:
+            return
+        collection = self.vector_store._collection
+        if collection.count() == 0:
+            return
+        sample = collection.get(limit=1, include=["embeddings"])
+        vectors = sample.get("embeddings")
+        if vectors is not None and len(vectors) > 0:
+            self.vector_store.similarity_search_by_vector(list(vectors[0]), k=1)
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "path": self.path,
+            "in_flight": self.in_flight,
+            "loaded_at": datetime.fromtimestamp(self.loaded_at).isoformat(timespec="seconds"),
+            "lexical_index": self.lexical_index is not None,
+        }
+
+
+class IndexManager:
+    """
+    Double buffering index: versi baru dimuat dan di-warm di background sementara
+    request tetap dilayani versi lama, lalu referensi `current` ditukar sekaligus.
+    Versi sebelumnya disimpan untuk rollback instan; versi yang tersingkir baru
+    dilepas setelah semua request yang memakainya selesai.
+    """
+
+    def __init__(self, loader, root: str = VECTOR_STORE_ROOT, on_swap=None):
+        self.loader = loader            # loader(version, path) -> IndexHandle (blocking)
+        self.root = root
+        self.on_swap = on_swap
+        self.current = None
+        self.previous = None
+        self._retiring = set()
+        self._tasks = set()
+        self._lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def use(self):
+        """Mengunci versi aktif selama satu request (None jika belum ada index)."""
+        handle = self.current
+        if handle is None:
+            yield None
+            return
+        handle.in_flight += 1
+        try:
+            yield handle
+        finally:
+            handle.in_flight -= 1
+
+    def _build(self, version: str) -> IndexHandle:
+        path = version_path(version, self.root)
+        if not os.path.isdir(path):
+            raise ValueError(f"Index version '{version}' not found.")
+        handle = self.loader(version, path)
+        handle.warm()
+        return handle
+
+    def load_initial(self):
+        """Memuat versi aktif saat startup (blocking)."""
+        self.current = self._build(read_current(self.root))
+        print(f"Index version '{self.current.version}' loaded.")
+        return self.current
+
+    def _swap(self, handle: IndexHandle):
+        retired, self.previous, self.current = self.previous, self.current, handle
+        if retired is not None and retired is not self.current and retired is not self.previous:
+            self._retiring.add(retired)
+            task = asyncio.create_task(self._retire(retired))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        if self.on_swap is not None:
+            self.on_swap(handle)
+
+    async def activate(self, version: str = None) -> IndexHandle:
+        """
+        Memuat + warm versi (default: isi file CURRENT) lalu menjadikannya aktif.
+        Versi dengan checkpoint pipeline yang belum 'complete' (refresh masih berjalan
+        atau terputus) ditolak dengan IncompleteVersionError.
+        """
+        async with self._lock:
+            version = version or read_current(self.root)
+            status = await run_blocking("admin", refresh_status, version, self.root)
+            if status is not None and status != REFRESH_COMPLETE_STATUS:
+                raise IncompleteVersionError(f"Index version '{version}' is not complete (refresh status '{status}').")
+            handle = await run_blocking("admin", self._build, version)
+            self._swap(handle)
+            await run_blocking("admin", write_current, version, self.root)
+            await run_blocking("admin", self._prune)
+            print(f"Index version '{version}' is now active.")
+            return handle
+
+    async def rollback(self) -> IndexHandle:
+        """Kembali ke versi sebelumnya yang masih dimuat di memori."""
+        async with self._lock:
+            if self.previous is None:
+                raise ValueError("No previous index version to roll back to.")
+            self.current, self.previous = self.previous, self.current
+            await run_blocking("admin", write_current, self.current.version, self.root)
+            if self.on_swap is not None:
+                self.on_swap(self.current)
+            print(f"Rolled back to index version '{self.current.version}'.")
+            return self.current
+
+    async def _retire(self, handle: IndexHandle):
+        # Versi baru dilepas setelah request terakhirnya selesai; selama itu versi
+        # tetap ada di _retiring sehingga _prune tidak menghapus foldernya
+        deadline = time.time() + INDEX_DRAIN_TIMEOUT_SECONDS
+        reported = False
+        while handle.in_flight > 0:
+            if not reported and time.time() >= deadline:
+                print(f"Index version '{handle.version}' still has {handle.in_flight} requests after drain timeout; waiting.")
+                reported = True
+            await asyncio.sleep(0.5)
+        # Client Chroma ditutup dulu, baru versi boleh di-prune
+        await run_blocking("admin", handle.release)
+        self._retiring.discard(handle)
+
+    def _prune(self):
+        in_use = {h.version for h in (self.current, self.previous, *self._retiring) if h is not None}
+        removed = prune_versions(in_use, self.root)
+        if removed:
+            print(f"Removed {removed} old index versions.")
+
+    def stats(self) -> dict:
+        return {
+            "current": self.current.info() if self.current else None,
+            "previous": self.previous.info() if self.previous else None,
+            "retiring": [h.info() for h in self._retiring],
+            "versions_on_disk": list_versions(self.root),
+        }
+
+
+if __name__ == "__main__":
+    # Dipakai startup.sh: `prepare <versi>` mencetak path folder versi baru
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if command == "prepare":
+        print(prepare_version(sys.argv[2] if len(sys.argv) > 2 else None))
+    elif command == "current":
+        print(read_current())
+    elif command == "list":
+        current = read_current()
+        for name in list_versions():
+            print(f"{name}{'  (current)' if name == current else ''}")
+    else:
+        print(f"Unknown command '{command}'. Use: prepare [version] | current | list")
+        sys.exit(1)
@@ -1,12 +1,22 @@
 import pandas as pd
 import chromadb
+import hashlib
+import json
 import time
 import os
 import sys
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_chroma import Chroma
+from langchain_core.embeddings import Embeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import DataFrameLoader
+from lexical import BM25Index, LEXICAL_INDEX_FILENAME
+from search_filters import filter_metadata
+from datasource import PARTITION_DIRNAME, has_partitions, iter_partition_frames
+from concurrency import AdaptiveRateLimiter
+from cache import EmbeddingCache, CachedEmbeddings
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -22,142 +32,385 @@ VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_TARGET", DEFAULT_STORE_PATH)
 # Mengarah ke folder sejajar backend: ../data_source
 SOURCE_DATA_PATH = os.path.join(BASE_DIR, "..", "data_source", "paper_metadata.csv")
 SOURCE_DATA_PATH = os.path.normpath(SOURCE_DATA_PATH)
+# Hasil export_db.py format Parquet (run per partisi); dipakai jika ada, jika tidak CSV
+SOURCE_PARTITION_DIR = os.path.normpath(os.path.join(BASE_DIR, "..", "data_source", PARTITION_DIRNAME))
 
 COLLECTION_NAME = "LMITD"
-CHECKPOINT_FILE = os.path.join(BASE_DIR, "logs", "indexer_checkpoint.txt")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+EMBEDDING_MODEL = "models/text-embedding-004"
+EMBEDDING_TASK_TYPE = "retrieval_document"
 
-if not GOOGLE_API_KEY:
-    raise ValueError("GOOGLE_API_KEY tidak ditemukan!")
+# --- STORE EMBEDDING PERSISTEN ---
+# Vektor disimpan per hash(model, task_type, teks) di SQLite, di luar folder vector store,
+# sehingga rebuild dari nol hanya meng-embed teks yang benar-benar baru. Kosong = nonaktif.
+DEFAULT_EMBEDDING_STORE_PATH = os.path.normpath(os.path.join(BASE_DIR, "..", "data_source", "indexer_embeddings.sqlite"))
+INDEXER_EMBEDDING_STORE_PATH = os.getenv("INDEXER_EMBEDDING_STORE_PATH", DEFAULT_EMBEDDING_STORE_PATH)
 
-def run_indexing():
+# Kolom kunci utama paper. Kosong = otomatis ('id' jika ada, lalu 'uri')
+PAPER_ID_COLUMN = os.getenv("PAPER_ID_COLUMN", "")
+METADATA_COLS = ['title', 'authors', 'keywords', 'uri', 'abstract']
+# Kolom sumber untuk filter tahun & fakultas (lihat search_filters). Kosong = otomatis,
+# kolom pertama yang ada dari daftar kandidat; tanpa kolom tersebut field filter tidak dibuat.
+YEAR_COLUMN = os.getenv("YEAR_COLUMN", "")
+FACULTY_COLUMN = os.getenv("FACULTY_COLUMN", "")
+YEAR_COLUMN_CANDIDATES = [YEAR_COLUMN] if YEAR_COLUMN else ['year', 'tahun', 'date_issued', 'issued', 'date']
+FACULTY_COLUMN_CANDIDATES = [FACULTY_COLUMN] if FACULTY_COLUMN else ['faculty', 'fakultas']
+
+# --- KONFIGURASI EMBEDDING PARALEL ---
+# Jumlah request embedding yang boleh berjalan bersamaan (batas atas AIMD)
+INDEXER_EMBED_WORKERS = int(os.getenv("INDEXER_EMBED_WORKERS", "4"))
+INDEXER_BATCH_SIZE = int(os.getenv("INDEXER_BATCH_SIZE", "100"))
+# Batas request per detik ke API embedding (0 = hanya dibatasi AIMD)
+INDEXER_MAX_RPS = float(os.getenv("INDEXER_MAX_RPS", "0"))
+
+# --- KONFIGURASI STREAMING ---
+# CSV dibaca per blok baris agar memori tetap datar berapa pun ukuran korpus
+INDEXER_CSV_CHUNK_ROWS = int(os.getenv("INDEXER_CSV_CHUNK_ROWS", "2000"))
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+class LazyGoogleEmbeddings(Embeddings):
+    """
+    Client Google yang baru dibuat saat ada cache miss, sehingga indexing yang seluruh
+    teksnya sudah ada di store bisa berjalan offline tanpa GOOGLE_API_KEY.
+    Semua panggilan API melewati rate limiter AIMD.
+    """
+
+    def __init__(self, limiter, model=EMBEDDING_MODEL, task_type=EMBEDDING_TASK_TYPE):
+        self.limiter = limiter
+        self.model = model
+        self.task_type = task_type
+        self._client = None
+        self._lock = threading.Lock()
+        self.api_calls = 0
+
+    def _get_client(self):
+        with self._lock:
+            if self._client is None:
+                if not GOOGLE_API_KEY:
+                    raise ValueError("GOOGLE_API_KEY tidak ditemukan!")
+                self._client = GoogleGenerativeAIEmbeddings(
+                    model=self.model,
+                    google_api_key=GOOGLE_API_KEY,
+                    task_type=self.task_type
+                )
+                print("Embeddings client initialized.")
+            self.api_calls += 1
+            return self._client
+
+    def embed_documents(self, texts):
+        return self.limiter.call(self._get_client().embed_documents, texts)
+
+    def embed_query(self, text):
+        return self.limiter.call(self._get_client().embed_query, text)
+
+def save_lexical_index(lexical_index):
+    """Menyimpan index BM25 (per paper) di samping vector store."""
+    lexical_index.finalize()
+    os.makedirs(VECTOR_STORE_PATH, exist_ok=True)
+    lexical_index.save(os.path.join(VECTOR_STORE_PATH, LEXICAL_INDEX_FILENAME))
+    print(f"Lexical index built ({len(lexical_index)} papers).")
+
+# --- ID STABIL ---
+
+def resolve_paper_ids(df):
+    """
+    ID paper yang stabil walaupun urutan baris berubah: kolom kunci utama jika terisi,
+    jika kosong maka hash dari judul + penulis. Dihitung per kolom (vektorisasi).
+    """
+    candidates = [PAPER_ID_COLUMN] if PAPER_ID_COLUMN else ['id', 'uri']
+    fallback = df['title'] + "\x00" + df['authors']
+    paper_ids = fallback.map(lambda text: hashlib.sha1(text.encode("utf-8")).hexdigest())
+    for col in reversed(candidates):
+        if col in df.columns:
+            values = df[col].astype(str).str.strip()
+            paper_ids = values.where(values.ne(''), paper_ids)
+    return paper_ids
+
+def chunk_id(paper_id: str, chunk_index: int) -> str:
+    return f"{paper_id}#{chunk_index}"
+
+def content_hash(page_content: str, metadata: dict) -> str:
+    """Hash isi + metadata chunk; berubah jika teks ATAU metadata paper berubah."""
+    payload = json.dumps({"text": page_content, "meta": metadata}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def load_existing_hashes(collection, page_size=5000):
+    """Membaca {chunk_id: content_hash} yang sudah ada di collection (per halaman)."""
+    existing = {}
+    offset = 0
+    while True:
+        result = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        ids = result.get("ids") or []
+        if not ids:
+            break
+        for doc_id, metadata in zip(ids, result.get("metadatas") or []):
+            existing[doc_id] = (metadata or {}).get("content_hash", "")
+        offset += len(ids)
+    return existing
+
+# --- TAHAP STREAMING ---
+
+def resolve_source_path():
+    """
+    Partisi Parquet hasil export_db.py diutamakan; jika tidak ada, dipakai dump CSV
+    terbaru (paper_metadata.csv.gz hasil ekspor bulk atau paper_metadata.csv).
+    """
+    if has_partitions(SOURCE_PARTITION_DIR):
+        return SOURCE_PARTITION_DIR
+    dumps = [path for path in (SOURCE_DATA_PATH + ".gz", SOURCE_DATA_PATH) if os.path.exists(path)]
+    if not dumps:
+        return SOURCE_DATA_PATH
+    return max(dumps, key=os.path.getmtime)
+
+def iter_source_frames(path):
+    """Membaca sumber per blok; semua kolom berupa string dengan nilai kosong = ''."""
+    if os.path.isdir(path):
+        yield from iter_partition_frames(path, batch_rows=INDEXER_CSV_CHUNK_ROWS)
+    else:
+        # Kompresi (.csv.gz) dideteksi pandas dari ekstensi file
+        yield from pd.read_csv(path, chunksize=INDEXER_CSV_CHUNK_ROWS, dtype=str, keep_default_na=False)
+
+def _first_column(frame, candidates):
+    for col in candidates:
+        if col in frame.columns:
+            return frame[col]
+    return ''
+
+def prepare_frame(frame):
+    """Metadata dan page_content dibangun per kolom, bukan per baris."""
+    for col in METADATA_COLS:
+        if col not in frame.columns:
+            frame[col] = ''
+    frame['paper_id'] = resolve_paper_ids(frame)
+    frame['page_content'] = "Judul: " + frame['title'] + "\nAbstrak: " + frame['abstract']
+    # Nilai mentah untuk field filter; dinormalisasi per paper di iter_chunks
+    frame['filter_year'] = _first_column(frame, YEAR_COLUMN_CANDIDATES)
+    frame['filter_faculty'] = _first_column(frame, FACULTY_COLUMN_CANDIDATES)
+    return frame[['paper_id'] + METADATA_COLS + ['filter_year', 'filter_faculty', 'page_content']]
+
+def iter_chunks(frames, lexical_index, stats):
+    """
+    Menghasilkan (chunk_id, teks, metadata) satu per satu. Setiap paper juga
+    ditambahkan ke index leksikal. Paper dengan ID yang sudah pernah muncul dilewati.
+    """
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, length_function=len)
+    seen_papers = set()
+
+    for frame in frames:
+        frame = prepare_frame(frame)
+        duplicated = frame['paper_id'].duplicated() | frame['paper_id'].isin(seen_papers)
+        stats['duplicates'] += int(duplicated.sum())
+        frame = frame[~duplicated]
+        seen_papers.update(frame['paper_id'])
+
+        for row in frame.to_dict('records'):
+            text = row.pop('page_content').strip()
+            year, faculty = row.pop('filter_year'), row.pop('filter_faculty')
+            # Field filter (year, faculty, author:<slug>, kw:<slug>) ikut disimpan agar bisa dipakai di 'where' Chroma
+            row.update(filter_metadata(row['authors'], row['keywords'], year, faculty))
+            lexical_index.add(row)
+            stats['papers'] += 1
+
+            # Sebagian besar judul+abstrak muat dalam satu chunk: splitter tidak perlu dijalankan
+            pieces = [text] if len(text) <= CHUNK_SIZE else text_splitter.split_text(text)
+            for chunk_index, piece in enumerate(pieces):
+                metadata = {**row, 'chunk_index': chunk_index}
+                metadata['content_hash'] = content_hash(piece, metadata)
+                stats['chunks'] += 1
+                yield chunk_id(row['paper_id'], chunk_index), piece, metadata
+
+def iter_changed_batches(chunks, existing, seen_ids):
+    """Mengelompokkan chunk baru/berubah menjadi batch; chunk dengan hash sama dilewati."""
+    batch = []
+    for cid, text, metadata in chunks:
+        seen_ids.add(cid)
+        if existing.get(cid) == metadata['content_hash']:
+            continue
+        batch.append((cid, text, metadata))
+        if len(batch) >= INDEXER_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def embed_batch(embeddings, texts, max_retries=3):
+    """Worker embedding: 429 ditangani limiter, error lain dicoba ulang beberapa kali."""
+    for attempt in range(max_retries):
+        try:
+            return embeddings.embed_documents(texts)
+        except Exception as e:
+            if attempt == max_retries - 1:
+                raise
+            print(f"Embedding error (Attempt {attempt+1}): {e}")
+            time.sleep(2 ** attempt)
+
+def write_batches(collection, embeddings, batches, limiter, timings=None, on_batch_written=None):
+    """
+    Pipeline dua tahap: beberapa thread meng-embed batch secara paralel, sedangkan
+    thread utama (writer) menulis hasilnya ke Chroma sesuai urutan batch. Karena
+    penulisan berurutan, semua batch sebelum batch yang sedang ditulis sudah pasti
+    tersimpan sehingga run yang terputus bisa dilanjutkan dari diff hash.
+    Batch diambil dari iterator secara lazy, jadi hanya jendela kecil yang ada di memori.
+    timings (opsional) diisi waktu tunggu embedding dan waktu tulis ke Chroma;
+    on_batch_written(batch_ids) dipanggil setelah setiap batch tersimpan.
+    Mengembalikan None jika dihentikan user atau ada batch yang gagal (run belum lengkap).
+    """
+    if timings is None:
+        timings = {}
+    timings.setdefault("embed_wait_seconds", 0.0)
+    timings.setdefault("write_seconds", 0.0)
+    # Batasi batch yang menunggu di memori agar writer tidak tertinggal jauh
+    max_pending = INDEXER_EMBED_WORKERS * 2
+    batches = iter(batches)
+
+    print(f"Indexing to {VECTOR_STORE_PATH} ({INDEXER_EMBED_WORKERS} workers)...")
+
+    upserted = 0
+    start_time = time.time()
+    pending = deque()
+    exhausted = False
+    executor = ThreadPoolExecutor(max_workers=INDEXER_EMBED_WORKERS, thread_name_prefix="indexer-embed")
+    try:
+        while True:
+            while not exhausted and len(pending) < max_pending:
+                batch = next(batches, None)
+                if batch is None:
+                    exhausted = True
+                    break
+                texts = [text for _, text, _ in batch]
+                pending.append((batch, executor.submit(embed_batch, embeddings, texts)))
+
+            if not pending:
+                break
+
+            batch, future = pending.popleft()
+            batch_ids = [cid for cid, _, _ in batch]
+            try:
+                wait_start = time.perf_counter()
+                vectors = future.result()
+                write_start = time.perf_counter()
+                timings["embed_wait_seconds"] += write_start - wait_start
+                collection.upsert(
+                    ids=batch_ids,
+                    embeddings=vectors,
+                    documents=[text for _, text, _ in batch],
+                    metadatas=[metadata for _, _, metadata in batch]
+                )
+                timings["write_seconds"] += time.perf_counter() - write_start
+            except Exception as e:
+                # Berhenti di batch gagal pertama: yang tersimpan tetap prefiks utuh dari
+                # urutan batch, dan run berikutnya melanjutkan dari batch ini lewat diff hash
+                print(f"Batch {batch_ids[0]} failed, stopping: {e}")
+                os.makedirs("./logs", exist_ok=True)
+                with open("./logs/failed_batches.log", "a") as f:
+                    f.write(f"Batch {batch_ids[0]}..{batch_ids[-1]} ({len(batch_ids)} chunks): {e}\n")
+                executor.shutdown(wait=False, cancel_futures=True)
+                return None
+
+            upserted += len(batch_ids)
+            if on_batch_written is not None:
+                on_batch_written(batch_ids)
+            rate = upserted / max(time.time() - start_time, 1e-6)
+            print(f"{upserted} chunks upserted ({rate:.1f} chunks/s, concurrency {limiter.stats()['limit']}).")
+
+    except KeyboardInterrupt:
+        print("\nSTOPPED BY USER.")
+        executor.shutdown(wait=False, cancel_futures=True)
+        return None
+
+    executor.shutdown(wait=True)
+    stats = limiter.stats()
+    print(f"Upserted {upserted} chunks in {time.time() - start_time:.1f}s (rate-limited {stats['throttled']}x).")
+    return upserted
+
+def build_embeddings():
+    """Store embedding lokal dulu, API Google (lewat limiter AIMD) hanya untuk cache miss."""
+    limiter = AdaptiveRateLimiter(INDEXER_EMBED_WORKERS, max_rps=INDEXER_MAX_RPS)
+    # LRU memori dimatikan (0) agar memori indexer tetap datar; semua lookup ke SQLite
+    embedding_cache = EmbeddingCache(max_entries=0, disk_path=INDEXER_EMBEDDING_STORE_PATH)
+    embeddings = CachedEmbeddings(LazyGoogleEmbeddings(limiter), embedding_cache)
+    if embedding_cache.disk is not None:
+        print(f"Embedding store: {INDEXER_EMBEDDING_STORE_PATH} ({embedding_cache.disk.count()} vectors)")
+    return embeddings, limiter
+
+def open_collection(embeddings, full_rebuild=False):
+    # Pastikan folder target dibuat
+    os.makedirs(VECTOR_STORE_PATH, exist_ok=True)
+
+    db_client = chromadb.PersistentClient(path=VECTOR_STORE_PATH)
+
+    if full_rebuild:
+        try:
+            db_client.delete_collection(name=COLLECTION_NAME)
+            print(f"Deleted existing collection: {COLLECTION_NAME} (Full Rebuild)")
+        except:
+            pass
+
+    vector_store = Chroma(client=db_client, collection_name=COLLECTION_NAME, embedding_function=embeddings)
+    return vector_store._collection
+
+def finish_indexing(collection, embeddings, existing, seen_ids, lexical_index, stats):
+    """Langkah setelah sumber terbaca penuh: ringkasan, index leksikal, hapus chunk basi."""
+    cache_stats = embeddings.cache.stats()
+    print(f"Embedding store hits: {cache_stats['disk_hits']}, misses: {cache_stats['misses']} "
+          f"({embeddings.underlying.api_calls} API calls).")
+
+    print(f"Processed {stats['papers']} papers, {stats['chunks']} chunks.")
+    if stats['duplicates']:
+        print(f"WARNING: {stats['duplicates']} duplicate paper IDs, keeping the first row.")
+
+    # Index Leksikal (BM25) untuk pencarian kata kunci tanpa jaringan
+    save_lexical_index(lexical_index)
+
+    # Hapus chunk yang sudah tidak ada di sumber data (hanya setelah sumber terbaca penuh)
+    to_delete = [cid for cid in existing if cid not in seen_ids]
+    for i in range(0, len(to_delete), 1000):
+        collection.delete(ids=to_delete[i : i + 1000])
+    if to_delete:
+        print(f"Deleted {len(to_delete)} stale chunks.")
+
+def run_indexing(full_rebuild=False):
     print("--- Starting Indexer ---")
-    print(f"Reading from: {SOURCE_DATA_PATH}")
-    
-    if not os.path.exists(SOURCE_DATA_PATH):
-        print(f"FATAL: Data source not found at {SOURCE_DATA_PATH}.")
+    source_path = resolve_source_path()
+    print(f"Reading from: {source_path}")
+
+    if not os.path.exists(source_path):
+        print(f"FATAL: Data source not found at {source_path}.")
         return False
-        
+
     try:
         # 1. Initialize Embeddings
-        embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/text-embedding-004",
-            google_api_key=GOOGLE_API_KEY,
-            task_type="retrieval_document"
-        )
-        print("Embeddings initialized.")
-        
-        # 2. Muat Data
-        df = pd.read_csv(SOURCE_DATA_PATH)
-        print(f"Loaded {len(df)} rows.")
-        
-        # 3. Buat Konten Utama
-        df['page_content'] = (
-            "Judul: " + df['title'].fillna('') + 
-            "\nAbstrak: " + df['abstract'].fillna('')
-        )
-        
-        loader = DataFrameLoader(df, page_content_column="page_content")
-        documents = loader.load()
-
-        # Update Metadata
-        metadata_cols = ['title', 'authors', 'keywords', 'uri', 'abstract'] 
-        for i, doc in enumerate(documents):
-            row_data = df.iloc[i]
-            doc_metadata = {}
-            for col in metadata_cols:
-                val = row_data.get(col, '')
-                doc_metadata[col] = str(val) if pd.notna(val) else ''
-            doc.metadata = doc_metadata
-        
-        print(f"Metadata attached to {len(documents)} docs.")
-        
-        # --- LOGIKA CHECKPOINT ---
-        start_index = 0
-        if os.path.exists(CHECKPOINT_FILE):
-            with open(CHECKPOINT_FILE, "r") as f:
-                try:
-                    content = f.read().strip()
-                    if content:
-                        start_index = int(content)
-                        print(f"Resuming from chunk index: {start_index}")
-                except:
-                    start_index = 0
-
-        # 5. Split Dokumen
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, length_function=len)
-        texts = text_splitter.split_documents(documents)
-        print(f"Total chunks: {len(texts)}")
-        
-        if start_index >= len(texts):
-            print("All documents indexed!")
-            return True
-        
-        # 6. Inisialisasi Chroma
-        # Pastikan folder target dibuat
-        os.makedirs(VECTOR_STORE_PATH, exist_ok=True)
-        
-        db_client = chromadb.PersistentClient(path=VECTOR_STORE_PATH)
-        
-        if start_index == 0:
-            try:
-                db_client.delete_collection(name=COLLECTION_NAME)
-                print(f"Deleted existing collection: {COLLECTION_NAME} (Fresh Start)")
-            except:
-                pass 
-        else:
-            print(f"Appending to existing collection (starting from {start_index}).")
-        
-        vector_store = Chroma(client=db_client, collection_name=COLLECTION_NAME, embedding_function=embeddings)
-        
-        # 7. Batch Processing
-        batch_size = 100
-        total_chunks = len(texts)
-        max_retries = 3 
-        
-        print(f"Indexing to {VECTOR_STORE_PATH}...")
-        
-        try:
-            for i in range(start_index, total_chunks, batch_size):
-                batch = texts[i : i + batch_size]
-                
-                for attempt in range(max_retries):
-                    try:
-                        ids = [f"doc-{i+j}" for j in range(len(batch))]
-                        vector_store._collection.add(
-                            documents=[d.page_content for d in batch],
-                            metadatas=[d.metadata for d in batch],
-                            ids=ids
-                        )
-                        
-                        next_index = min(i + batch_size, total_chunks)
-                        with open(CHECKPOINT_FILE, "w") as f:
-                            f.write(str(next_index))
-                        
-                        print(f"Batch {i} - {next_index} saved.")
-                        time.sleep(0.1)
-                        break 
-                    except Exception as e:
-                        print(f"Error batch {i} (Attempt {attempt+1}): {e}")
-                        if attempt < max_retries - 1:
-                            time.sleep(5 * (attempt + 1))
-                        else:
-                            print(f"SKIP batch {i}.")
-                            with open("./logs/failed_batches.log", "a") as f:
-                                f.write(f"Batch {i}: {e}\n")
-
-        except KeyboardInterrupt:
-            print("\nSTOPPED BY USER.")
+        embeddings, limiter = build_embeddings()
+
+        # 2. Inisialisasi Chroma
+        collection = open_collection(embeddings, full_rebuild)
+
+        # --- DIFF INKREMENTAL ---
+        # Collection itu sendiri adalah checkpoint: chunk yang sudah tersimpan dengan
+        # hash yang sama dilewati, sehingga run yang terputus bisa diulang dengan aman.
+        existing = load_existing_hashes(collection)
+        print(f"Existing chunks: {len(existing)}")
+
+        # 3. Streaming: CSV per blok -> chunk -> batch berubah -> embed paralel -> upsert
+        stats = {'papers': 0, 'chunks': 0, 'duplicates': 0}
+        lexical_index = BM25Index()
+        seen_ids = set()
+        batches = iter_changed_batches(iter_chunks(iter_source_frames(source_path), lexical_index, stats), existing, seen_ids)
+        if write_batches(collection, embeddings, batches, limiter) is None:
             return False
 
+        # 4. Index leksikal + hapus chunk basi
+        finish_indexing(collection, embeddings, existing, seen_ids, lexical_index, stats)
+
         print("\nIndexing Complete.")
         return True
-        
+
     except Exception as e:
         print(f"FATAL ERROR: {e}")
         return False
 
 if __name__ == "__main__":
-    success = run_indexing()
+    success = run_indexing(full_rebuild="--full" in sys.argv)
     if not success:
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
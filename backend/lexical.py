@@ -0,0 +1,129 @@
+import math
+import os
+import pickle
+import re
+import unicodedata
+from collections import Counter
+from search_filters import is_filter_field
+
+# --- KONFIGURASI INDEX LEKSIKAL (BM25) ---
+LEXICAL_INDEX_FILENAME = "lexical_index.pkl"
+
+# Bobot field: kecocokan di judul/keyword/penulis lebih bernilai daripada di abstrak
+FIELD_WEIGHTS = {"title": 3, "keywords": 2, "authors": 2, "abstract": 1}
+
+# Metadata paper yang disimpan di index agar hasil leksikal tidak perlu membuka Chroma
+# (ditambah field filter ternormalisasi dari search_filters)
+STORED_FIELDS = ["paper_id", "title", "authors", "keywords", "uri", "abstract"]
+
+STOPWORDS = {
+    # Indonesia
+    "yang", "dan", "di", "ke", "dari", "untuk", "pada", "dengan", "dalam", "ini", "itu",
+    "atau", "sebagai", "oleh", "adalah", "akan", "tidak", "juga", "lebih", "serta",
+    "terhadap", "secara", "karena", "dapat", "bagi", "tersebut", "antara", "hasil",
+    # Inggris
+    "the", "of", "and", "in", "to", "a", "an", "for", "on", "with", "by", "is", "are",
+    "as", "at", "from", "this", "that", "be", "or",
+}
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str):
+    """Lowercase, buang aksen, pecah per kata, dan buang stopword."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return [token for token in _TOKEN_RE.findall(text) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Inverted index BM25 sederhana di memori (tanpa dependensi eksternal).
+    Setiap entri adalah satu paper; term frequency dihitung per field dengan bobot
+    FIELD_WEIGHTS sehingga kecocokan di judul lebih kuat daripada di abstrak.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.papers = []
+        self.postings = {}      # term -> list of (paper_idx, weighted_tf)
+        self.doc_lengths = []
+        self.idf = {}
+        self.avg_doc_length = 0.0
+
+    def __len__(self) -> int:
+        return len(self.papers)
+
+    def add(self, metadata: dict):
+        paper_idx = len(self.papers)
+        paper = {field: str(metadata.get(field, "") or "") for field in STORED_FIELDS}
+        paper.update((field, value) for field, value in metadata.items() if is_filter_field(field))
+        self.papers.append(paper)
+
+        term_freqs = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(metadata.get(field, "")):
+                term_freqs[token] += weight
+
+        for term, tf in term_freqs.items():
+            self.postings.setdefault(term, []).append((paper_idx, tf))
+        self.doc_lengths.append(sum(term_freqs.values()))
+
+    def finalize(self):
+        """Menghitung IDF dan panjang rata-rata dokumen setelah semua paper ditambahkan."""
+        total = len(self.papers)
+        self.avg_doc_length = (sum(self.doc_lengths) / total) if total else 0.0
+        self.idf = {
+            term: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def search(self, query: str, k: int = 10, accept=None):
+        """
+        Mengembalikan list (metadata_paper, skor) terurut dari skor tertinggi.
+        accept(metadata_paper) -> bool (opsional) menyaring paper sebelum diberi skor.
+        """
+        scores = {}
+        rejected = set()
+        avg = self.avg_doc_length or 1.0
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf.get(term, 0.0)
+            for paper_idx, tf in postings:
+                if accept is not None and paper_idx not in scores:
+                    if paper_idx in rejected:
+                        continue
+                    if not accept(self.papers[paper_idx]):
+                        rejected.add(paper_idx)
+                        continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[paper_idx] / avg)
+                scores[paper_idx] = scores.get(paper_idx, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.papers[paper_idx], score) for paper_idx, score in ranked]
+
+    def save(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path: str):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+def reciprocal_rank_fusion(rankings, k: int = 60):
+    """
+    Menggabungkan beberapa ranking (list of key) dengan Reciprocal Rank Fusion.
+    Mengembalikan list (key, skor) terurut.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -1,12 +1,20 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File, Request
 from fastapi.middleware.cors import CORSMiddleware
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_chroma import Chroma
-from langchain_groq import ChatGroq 
+from fastapi.responses import JSONResponse, PlainTextResponse
 from services import chat_with_document, get_related_documents, process_pdf_for_chat, chat_with_pdf_context, chat_general_query, clear_temp_folder
-from models import ThesisTitle, ChatQuery
-import chromadb
+from services import get_related_documents_batch, stream_related_documents_batch, validate_related_batch
+from models import ThesisTitle, ChatQuery, RelatedBatchRequest
+from concurrency import run_blocking, shutdown_executor
+from cache import SemanticAnswerCache, EmbeddingCache, CachedEmbeddings, TTLCache, ANSWER_CACHE_ENABLED
+from sessions import PDFSessionStore, wait_until_ready, PDF_JANITOR_INTERVAL_SECONDS, PDF_CHAT_WAIT_SECONDS, TEMP_DIR
+from lexical import BM25Index, LEXICAL_INDEX_FILENAME
+from pdf_ingest import shutdown_pool, PDF_CONTENT_CACHE_MAX_ENTRIES, PDF_CONTENT_CACHE_TTL_SECONDS
+from index_versions import IndexManager, IndexHandle, IncompleteVersionError
+from metrics import MetricsMiddleware, render_metrics
+from tracing import TracingMiddleware, TRACE_STORE
+import asyncio
 import os
+import time
 import uuid
 from typing import Dict, Any
 
@@ -22,65 +30,79 @@ app.add_middleware(
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["POST", "GET"],
-    allow_headers=["Authorization", "Content-Type"],
+    allow_headers=["Authorization", "Content-Type", "X-Trace"],
+    expose_headers=["X-Trace-Id", "X-Context-Truncated"],
 )
 
+# Latency per endpoint & per stage untuk GET /metrics (format Prometheus)
+app.add_middleware(MetricsMiddleware)
+
+# Trace per request (header X-Trace atau TRACE_SAMPLE_RATE), dibaca lewat /admin/traces
+app.add_middleware(TracingMiddleware)
+
 # --- GLOBAL VARIABLES ---
 # Kita buat variabel global agar bisa di-update
 embeddings = None
 llm = None
-vector_store = None
-retriever = None
 
-# Global dictionary untuk menyimpan retriever PDF sementara berdasarkan session_id
-if 'PDF_SESSIONS' not in globals():
-    PDF_SESSIONS = {}
+# Cache embedding query (memori + disk opsional), dipakai bersama oleh search & chat
+embedding_cache = EmbeddingCache()
+
+# Cache jawaban Chat Mode (dikosongkan otomatis setiap index di-reload)
+answer_cache = SemanticAnswerCache() if ANSWER_CACHE_ENABLED else None
+
+# Cache daftar dokumen terkait per judul (over-fetch sampai RELATED_MAX_K)
+related_cache = TTLCache()
+
+# Teks & embedding PDF per hash isi file, agar upload file yang sama tidak diproses ulang
+pdf_content_cache = TTLCache(max_entries=PDF_CONTENT_CACHE_MAX_ENTRIES, ttl_seconds=PDF_CONTENT_CACHE_TTL_SECONDS)
+
+# Penyimpanan retriever PDF sementara berdasarkan session_id (TTL + batas memori)
+PDF_SESSIONS = PDFSessionStore()
+janitor_task = None
+pdf_jobs = set()
 
 # --- KONFIGURASI KUNCI DAN MODEL ---
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-# --- KONFIGURASI KUNCI ---
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY") 
-
-# --- KONFIGURASI EMBEDDING (GOOGLE AI STUDIO) ---
-# Menggunakan model 'models/text-embedding-004' yang gratis & kuat
-try:
-    if not GOOGLE_API_KEY:
-        raise ValueError("GOOGLE_API_KEY environment variable is not set.")
-        
-    embeddings = GoogleGenerativeAIEmbeddings(
-        model="models/text-embedding-004",
-        google_api_key=GOOGLE_API_KEY
-    )
-    # print("Success: Google AI Studio Embeddings initialized.")
-except Exception as e:
-    print(f"FATAL ERROR: Failed to initialize Google Embeddings: {e}")
-    embeddings = None
+# --- STATUS KESIAPAN (COLD START) ---
+# Server langsung menerima koneksi; model & index dimuat di background lalu /readyz berubah 200.
+# Probe embedding memastikan API key/kuota bermasalah ketahuan saat startup, bukan di request pertama.
+WARMUP_EMBEDDING_PROBE = os.getenv("WARMUP_EMBEDDING_PROBE", "true").lower() == "true"
+startup_state = {"status": "starting", "started_at": time.time(), "ready_seconds": None, "error": None, "checks": {}}
+warmup_task = None
 
 # --- FUNGSI INISIALISASI (LOADER) ---
 def initialize_components():
-    """Fungsi untuk memuat/memuat ulang model dan vector store."""
-    global embeddings, llm, vector_store, retriever
+    """Memuat model (sekali saat startup) dan versi index yang aktif."""
+    global embeddings, llm
+
+    # Import berat (gRPC Google, Groq, Chroma) ditunda sampai sini agar proses cepat hidup
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    from langchain_groq import ChatGroq
     
-    print("Initializing/Reloading AI Components...")
+    print("Initializing AI Components...")
 
-    # 1. Init Embeddings
+    # 1. Init Embeddings (Google AI Studio, 'models/text-embedding-004')
     try:
-        # (Gunakan logika embeddings Anda yang lama di sini)
-        embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/text-embedding-004",
-            google_api_key=os.getenv("GOOGLE_API_KEY")
+        if not GOOGLE_API_KEY:
+            raise ValueError("GOOGLE_API_KEY environment variable is not set.")
+
+        embeddings = CachedEmbeddings(
+            GoogleGenerativeAIEmbeddings(
+                model="models/text-embedding-004",
+                google_api_key=GOOGLE_API_KEY
+            ),
+            embedding_cache
         )
     except Exception as e:
         print(f"Error init embeddings: {e}")
 
     # 2. Init LLM
     try:
-        # (Gunakan logika LLM Anda yang lama di sini)
         llm = ChatGroq(
-            groq_api_key=os.getenv("GROQ_API_KEY"),
+            groq_api_key=GROQ_API_KEY,
             model_name="llama-3.3-70b-versatile",
             temperature=0.3,
             max_tokens=2048 
@@ -88,28 +110,115 @@ def initialize_components():
     except Exception as e:
         print(f"Error init LLM: {e}")
 
-    # 3. Init Vector Store & Retriever (INI YANG PENTING DI-RELOAD)
+    # 3. Init Vector Store & Retriever (versi aktif dari vector_store/CURRENT), termasuk warm
     try:
-        if embeddings:
-            db_client = chromadb.PersistentClient(path="../vector_store")
-            
-            # Paksa client untuk membaca ulang dari disk
-            # Kadang perlu reset settings, tapi PersistentClient biasanya cukup
-            
-            vector_store = Chroma(
-                client=db_client,
-                collection_name="LMITD",
-                embedding_function=embeddings
-            )
-            
-            retriever = vector_store.as_retriever(search_kwargs={"k": 7})
-            print("Vector Store & Retriever reloaded successfully.")
-        else:
-            print("Cannot load vector store: Embeddings not ready.")
-
+        index_manager.load_initial()
     except Exception as e:
         print(f"Error init Vector Store: {e}")
+
+def run_warmup_probes() -> dict:
+    """Pengecekan setelah komponen dibuat; hasilnya ditampilkan di /readyz."""
+    checks = {
+        "llm": "ok" if llm is not None else "not initialized",
+        "embeddings": "ok" if embeddings is not None else "not initialized",
+        "index": index_manager.current.version if index_manager.current is not None else "not loaded",
+    }
+    if embeddings is not None and WARMUP_EMBEDDING_PROBE:
+        try:
+            embeddings.embed_query("warmup")
+        except Exception as e:
+            checks["embeddings"] = f"probe failed: {e}"
+    return checks
+
+async def warmup_components():
+    """Build komponen satu kali di thread pool, lalu tandai server siap."""
+    try:
+        await run_blocking("admin", initialize_components)
+        startup_state["checks"] = await run_blocking("admin", run_warmup_probes)
+        if llm is None or index_manager.current is None:
+            startup_state["status"] = "failed"
+            startup_state["error"] = "LLM or index could not be loaded."
+        else:
+            startup_state["status"] = "ready"
+    except Exception as e:
+        startup_state["status"] = "failed"
+        startup_state["error"] = str(e)
+    startup_state["ready_seconds"] = round(time.time() - startup_state["started_at"], 2)
+    print(f"Warmup {startup_state['status']} in {startup_state['ready_seconds']}s.")
+
+def load_index(version: str, path: str) -> IndexHandle:
+    """Memuat satu versi index (dipanggil IndexManager di thread pool, bukan di event loop)."""
+    import chromadb
+    from langchain_chroma import Chroma
+
+    db_client = None
+    vector_store = None
+    retriever = None
+    if embeddings:
+        db_client = chromadb.PersistentClient(path=path)
+        vector_store = Chroma(
+            client=db_client,
+            collection_name="LMITD",
+            embedding_function=embeddings
+        )
+        retriever = vector_store.as_retriever(search_kwargs={"k": 7})
+    else:
+        print("Cannot load vector store: Embeddings not ready.")
+
+    # Index Leksikal (BM25), dibuat oleh indexer.py di folder versi yang sama
+    lexical_index = None
+    lexical_path = os.path.join(path, LEXICAL_INDEX_FILENAME)
+    if os.path.exists(lexical_path):
+        lexical_index = BM25Index.load(lexical_path)
+        print(f"Lexical index loaded ({len(lexical_index)} papers).")
+    else:
+        print("Lexical index not found; lexical/hybrid search disabled.")
+
+    if vector_store is None and lexical_index is None:
+        raise RuntimeError(f"Index version '{version}' has no usable vector store or lexical index.")
+    return IndexHandle(version, path, vector_store, retriever, lexical_index, client=db_client)
+
+def on_index_swap(handle: IndexHandle):
+    # Jawaban lama mungkin merujuk dokumen yang sudah berubah
+    if answer_cache is not None:
+        answer_cache.invalidate()
+    related_cache.invalidate()
+
+# Versi index aktif + versi sebelumnya (rollback); ditukar atomik saat reload
+index_manager = IndexManager(load_index, on_swap=on_index_swap)
         
+# --- WORKER PEMROSESAN PDF ---
+async def run_pdf_job(session):
+    """Memproses satu upload PDF di background. Kegagalan dicatat di status sesi."""
+    try:
+        await process_pdf_for_chat(session, embeddings, content_cache=pdf_content_cache)
+        await run_blocking("admin", PDF_SESSIONS.mark_ready, session.session_id)
+    except Exception as e:
+        print(f"Error processing PDF: {e}")
+        session.error = str(e)
+        session.status = "failed"
+    finally:
+        # File PDF tidak dibutuhkan lagi setelah teksnya masuk ke index
+        file_path, session.file_path = session.file_path, None
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+
+# --- JANITOR SESI PDF ---
+def run_pdf_janitor_once():
+    """Menghapus sesi PDF yang kedaluwarsa dan file sementara yang yatim."""
+    expired = PDF_SESSIONS.evict_expired()
+    orphans = PDF_SESSIONS.cleanup_orphan_files(TEMP_DIR)
+    if expired or orphans:
+        print(f"PDF janitor: {expired} expired sessions, {orphans} orphaned temp files removed.")
+
+async def pdf_janitor_loop():
+    while True:
+        await asyncio.sleep(PDF_JANITOR_INTERVAL_SECONDS)
+        try:
+            await run_blocking("admin", run_pdf_janitor_once)
+        except Exception as e:
+            print(f"Error in PDF janitor: {e}")
+
 # --- ENDPOINTS ---
 
 # --- EVENT STARTUP ---
@@ -117,49 +226,131 @@ def initialize_components():
 async def startup_event():
     # Jalankan saat server pertama kali nyala
     print("--- Server Starting Up ---")
-    initialize_components()
     clear_temp_folder()
     
-    # Reset variabel global jika perlu
-    global PDF_SESSIONS
-    PDF_SESSIONS = {}
+    # Reset sesi PDF dan jalankan janitor di background
+    global janitor_task, warmup_task
+    PDF_SESSIONS.clear()
+    janitor_task = asyncio.create_task(pdf_janitor_loop())
+
+    # Model & index dimuat di background; pantau lewat /readyz
+    warmup_task = asyncio.create_task(warmup_components())
 
 # --- EVENT HANDLER: SHUTDOWN (Jalan saat server dimatikan/Ctrl+C) ---
 @app.on_event("shutdown")
 async def shutdown_event():
     print("--- Server Shutting Down ---")
+    for task in (janitor_task, warmup_task):
+        if task is not None:
+            task.cancel()
+    for task in list(pdf_jobs):
+        task.cancel()
+
+    # Bersihkan sesi PDF sebelum folder sementara dihapus
+    PDF_SESSIONS.clear()
     clear_temp_folder()
-    
-    # Bersihkan global dictionary
-    if 'PDF_SESSIONS' in globals():
-        PDF_SESSIONS.clear()
+    shutdown_executor()
+    shutdown_pool()
+
+# --- HEALTH & READINESS ---
+@app.get("/healthz")
+async def healthz():
+    """Liveness: proses hidup dan event loop merespons."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 setelah model & index selesai dimuat dan di-warm, 503 sebelumnya."""
+    body = {
+        **startup_state,
+        "uptime_seconds": round(time.time() - startup_state["started_at"], 2),
+        "index_version": index_manager.current.version if index_manager.current is not None else None,
+    }
+    status_code = 200 if startup_state["status"] == "ready" else 503
+    return JSONResponse(status_code=status_code, content=body)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Metrics latency, error, dan in-flight per endpoint dalam format teks Prometheus."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 # --- ENDPOINT BARU: HOT RELOAD ---
 @app.post("/admin/reload-index")
-async def reload_index_endpoint(request: Request):
+async def reload_index_endpoint(version: str = None):
     """
     Endpoint rahasia untuk memicu reload vector store tanpa restart server.
-    Bisa diamankan dengan mengecek header atau token sederhana.
+    Versi baru (default: isi vector_store/CURRENT) dimuat dan di-warm di background
+    sementara request tetap dilayani versi lama, lalu ditukar secara atomik.
     """
 
     try:
-        initialize_components()
-        return {"status": "success", "message": "Vector store reloaded from disk."}
+        handle = await index_manager.activate(version)
+        return {"status": "success", "message": f"Index version '{handle.version}' is now active."}
+    except IncompleteVersionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/admin/rollback-index")
+async def rollback_index_endpoint():
+    """Kembali ke versi index sebelumnya (masih dimuat di memori, tanpa loading ulang)."""
+    try:
+        handle = await index_manager.rollback()
+        return {"status": "success", "message": f"Rolled back to index version '{handle.version}'."}
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/admin/index-versions")
+async def index_versions_endpoint():
+    """Versi index aktif, versi rollback, dan versi yang tersimpan di disk."""
+    return await run_blocking("admin", index_manager.stats)
+
+@app.get("/admin/cache-stats")
+async def cache_stats_endpoint():
+    """Statistik hit/miss semua cache (jawaban, embedding, dokumen terkait, isi PDF)."""
+    return {
+        "answer_cache": answer_cache.stats() if answer_cache is not None else {"enabled": False},
+        "embedding_cache": embedding_cache.stats(),
+        "related_cache": related_cache.stats(),
+        "pdf_content_cache": pdf_content_cache.stats(),
+    }
+
+@app.get("/admin/traces")
+async def traces_endpoint(limit: int = 50, min_duration_ms: float = 0, path: str = None):
+    """Ringkasan trace terbaru (paling baru dulu); filter durasi minimum / path."""
+    return {"traces": TRACE_STORE.list(limit=limit, min_duration_ms=min_duration_ms, path=path)}
+
+@app.get("/admin/traces/{trace_id}")
+async def trace_detail_endpoint(trace_id: str):
+    """Timeline span lengkap (dan profil CPU jika diminta dengan X-Trace: profile)."""
+    trace = TRACE_STORE.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found (not recorded or already evicted).")
+    return trace.to_dict()
+
+@app.post("/admin/traces/clear")
+async def clear_traces_endpoint():
+    TRACE_STORE.clear()
+    return {"status": "cleared"}
+
+@app.get("/admin/pdf-sessions")
+async def pdf_sessions_endpoint():
+    """Pemakaian memori sesi PDF aktif dan ukuran folder file sementara."""
+    return await run_blocking("admin", PDF_SESSIONS.stats, TEMP_DIR)
+
 @app.post("/upload-pdf/")
 async def upload_pdf(file: UploadFile = File(...)):
-    if llm is None or retriever is None or embeddings is None:
+    if llm is None or index_manager.current is None or embeddings is None:
         raise HTTPException(status_code=503, detail="Server components not initialized.")
 
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="File must be a PDF.")
 
-    temp_dir = "../temp_files"
-    os.makedirs(temp_dir, exist_ok=True)
+    os.makedirs(TEMP_DIR, exist_ok=True)
     file_id = str(uuid.uuid4())
-    file_path = os.path.join(temp_dir, file_id + ".pdf")
+    file_path = os.path.join(TEMP_DIR, file_id + ".pdf")
 
     try:
 
@@ -168,31 +359,57 @@ async def upload_pdf(file: UploadFile = File(...)):
             buffer.write(content)    
             
         await file.seek(0) 
-        
-        pdf_retriever = await process_pdf_for_chat(file_path, embeddings)
-        
-        global PDF_SESSIONS
-        if 'PDF_SESSIONS' not in globals():
-            PDF_SESSIONS = {}
-            
-        PDF_SESSIONS[file_id] = pdf_retriever
-
-        return {"session_id": file_id, "message": "PDF processed successfully"}
     except Exception as e:
-        print(f"Error processing PDF: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to process PDF: {str(e)}")
+        print(f"Error saving PDF: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to save PDF: {str(e)}")
+
+    # Proses PDF di background; klien memantau progres lewat endpoint status
+    session = PDF_SESSIONS.create(file_id, file_path)
+    task = asyncio.create_task(run_pdf_job(session))
+    pdf_jobs.add(task)
+    task.add_done_callback(pdf_jobs.discard)
+
+    return JSONResponse(
+        status_code=202,
+        content={
+            "session_id": file_id,
+            "status": session.status,
+            "status_url": f"/upload-pdf/{file_id}/status",
+            "message": "PDF accepted for processing"
+        }
+    )
+
+
+@app.get("/upload-pdf/{session_id}/status")
+async def upload_pdf_status(session_id: str):
+    """Status pemrosesan PDF: queued, extracting, chunking, embedding (x/y), ready, failed."""
+    session = PDF_SESSIONS.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="PDF session not found.")
+    return session.status_dict()
 
 
 @app.post("/chat-with-pdf/")
 async def api_chat_with_pdf(chat_query: ChatQuery):
-    if llm is None or retriever is None:
+    if llm is None or index_manager.current is None:
         raise HTTPException(status_code=503, detail="Server components not initialized.")
 
     file_id = chat_query.session_id
-    if file_id not in PDF_SESSIONS:
+    session = PDF_SESSIONS.get(file_id)
+    if session is None:
         raise HTTPException(status_code=400, detail="No active PDF session found.")
-        
-    pdf_retriever = PDF_SESSIONS[file_id]
+
+    # PDF masih diproses: tunggu sebentar, lalu jawab dari index parsial jika ada
+    if session.is_processing:
+        await wait_until_ready(session, PDF_CHAT_WAIT_SECONDS)
+    if session.status == "failed":
+        raise HTTPException(status_code=400, detail=f"PDF processing failed: {session.error}")
+    if not session.is_ready:
+        if session.chunks_done == 0:
+            raise HTTPException(status_code=503, detail="PDF is still being processed.", headers={"Retry-After": "2"})
+        print(f"Answering from partial PDF index ({session.chunks_done}/{session.chunks_total} chunks)")
+
+    pdf_retriever = session.retriever
 
     try:
         result = await chat_with_pdf_context(chat_query, llm, pdf_retriever)
@@ -207,15 +424,17 @@ async def api_general_chat(chat_query: ChatQuery):
     """
     Endpoint untuk mode Chat Umum. Menjalankan RAG penuh menggunakan retriever utama (Database Skripsi IPB).
     """
-    if llm is None or retriever is None:
-        raise HTTPException(status_code=503, detail="Server components not initialized.")
-        
-    try:
-        result = await chat_general_query(chat_query, llm, retriever) 
-        return result
-    except Exception as e:
-        print(f"Error in /combined-query-chat/: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    async with index_manager.use() as index:
+        if llm is None or index is None or index.retriever is None:
+            raise HTTPException(status_code=503, detail="Server components not initialized.")
+
+        try:
+            return await chat_general_query(chat_query, llm, index.retriever, answer_cache, index.lexical_index)
+        except HTTPException:
+            raise
+        except Exception as e:
+            print(f"Error in /combined-query-chat/: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/chat/")
@@ -223,7 +442,7 @@ async def api_chat_with_document(chat_query: ChatQuery):
     """
     Endpoint untuk chat dengan dokumen yang dipilih (Database).
     """
-    if llm is None or retriever is None:
+    if llm is None or index_manager.current is None:
         raise HTTPException(status_code=503, detail="Server components not initialized.")
         
     try:
@@ -238,12 +457,32 @@ async def api_get_related_documents(thesis: ThesisTitle):
     """
     Endpoint untuk mencari dokumen terkait berdasarkan judul tesis.
     """
-    if vector_store is None: 
+    async with index_manager.use() as index:
+        if index is None:
+            raise HTTPException(status_code=503, detail="Server components not initialized.")
+
+        try:
+            return await get_related_documents(thesis, index.vector_store, related_cache, index.lexical_index)
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            print(f"Error in /related_documents/: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/related_documents/batch")
+async def api_get_related_documents_batch(batch: RelatedBatchRequest):
+    """
+    Dokumen terkait untuk banyak judul sekaligus (k per judul), hasil sesuai urutan input.
+    stream=true mengirim NDJSON bertahap untuk batch besar.
+    """
+    index = index_manager.current
+    if index is None:
         raise HTTPException(status_code=503, detail="Server components not initialized.")
-        
-    try:
-        return await get_related_documents(thesis, vector_store)
-    
-    except Exception as e:
-        print(f"Error in /related_documents/: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+
+    if batch.stream:
+        mode = validate_related_batch(batch, index.lexical_index)
+        return stream_related_documents_batch(batch, index_manager, mode, related_cache)
+
+    async with index_manager.use() as index:
+        return await get_related_documents_batch(batch, index.vector_store, related_cache, index.lexical_index)
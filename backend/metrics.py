@@ -0,0 +1,226 @@
+import contextvars
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from tracing import record_span, span
+
+# --- KONFIGURASI METRICS ---
+# Metrics disajikan di GET /metrics dalam format teks Prometheus (tanpa dependency tambahan).
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_PREFIX = "ipbgpt"
+# Endpoint yang diberi label sendiri; path lain (status, admin) tidak diukur agar label tidak meledak
+METRICS_ENDPOINTS = (
+    "/combined-query-chat/", "/chat-with-pdf/", "/chat/", "/related_documents/", "/related_documents/batch", "/upload-pdf/"
+)
+# Perkiraan kasar jumlah token prompt (tokenizer Llama tidak ikut di-install)
+CHARS_PER_TOKEN = 4
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+# Endpoint milik request yang sedang berjalan; di-set oleh middleware, dibaca oleh track_stage
+current_endpoint = contextvars.ContextVar("current_endpoint", default="other")
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = f"{METRICS_PREFIX}_{name}"
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}     # tuple(label values) -> nilai
+
+    def _key(self, labels) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # [hitungan per bucket (non-kumulatif), sum, count]
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def _render_series(self, key, series):
+        counts, total, count = series
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames + ("le",), key + (_format_value(bound),))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+# --- DEFINISI METRICS ---
+REQUEST_DURATION = Histogram("request_duration_seconds", "Total request time including streamed body.", ("endpoint",))
+REQUESTS_TOTAL = Counter("requests_total", "Finished requests by HTTP status.", ("endpoint", "status"))
+REQUESTS_IN_FLIGHT = Gauge("requests_in_flight", "Requests currently being served.", ("endpoint",))
+STAGE_DURATION = Histogram("stage_duration_seconds", "Time spent per serving stage.", ("endpoint", "stage"))
+STAGE_ERRORS = Counter("stage_errors_total", "Exceptions raised inside a serving stage.", ("endpoint", "stage"))
+PROMPT_TOKENS = Histogram("prompt_tokens", "Estimated prompt size sent to the LLM.", ("endpoint",), buckets=TOKEN_BUCKETS)
+
+REGISTRY = [REQUEST_DURATION, REQUESTS_TOTAL, REQUESTS_IN_FLIGHT, STAGE_DURATION, STAGE_ERRORS, PROMPT_TOKENS]
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+
+
+def _observe_duration(stage: str, seconds: float, endpoint: str = None):
+    if METRICS_ENABLED:
+        STAGE_DURATION.observe(seconds, endpoint=endpoint or current_endpoint.get(), stage=stage)
+
+
+def observe_stage(stage: str, seconds: float, endpoint: str = None):
+    """Durasi yang diukur sendiri oleh pemanggil (mis. streaming): histogram + span trace."""
+    _observe_duration(stage, seconds, endpoint)
+    record_span(stage, seconds)
+
+
+def record_stage_error(stage: str, endpoint: str = None):
+    if METRICS_ENABLED:
+        STAGE_ERRORS.inc(endpoint=endpoint or current_endpoint.get(), stage=stage)
+
+
+def observe_prompt(prompt: str, endpoint: str = None):
+    if METRICS_ENABLED:
+        PROMPT_TOKENS.observe(estimate_tokens(prompt), endpoint=endpoint or current_endpoint.get())
+
+
+@contextmanager
+def track_stage(stage: str, endpoint: str = None):
+    """
+    Mengukur durasi satu tahap (metrics + span trace). Endpoint diambil dari request
+    yang sedang berjalan; run_blocking meneruskan contextvar ke thread pool, kode di
+    thread lain (mis. pool PDF) harus mengirimnya sendiri.
+    """
+    start = time.perf_counter()
+    with span(stage):
+        try:
+            yield
+        except BaseException:
+            record_stage_error(stage, endpoint)
+            raise
+        finally:
+            _observe_duration(stage, time.perf_counter() - start, endpoint)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _endpoint_label(path: str):
+    for endpoint in METRICS_ENDPOINTS:
+        # /upload-pdf/{id}/status tidak dihitung sebagai /upload-pdf/
+        if path == endpoint or path == endpoint.rstrip("/"):
+            return endpoint
+    return None
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI murni (bukan BaseHTTPMiddleware) agar durasi mencakup body
+    streaming sampai selesai dan contextvar endpoint terlihat di seluruh request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        endpoint = _endpoint_label(scope.get("path", "")) if scope["type"] == "http" else None
+        if not METRICS_ENABLED or endpoint is None:
+            await self.app(scope, receive, send)
+            return
+
+        token = current_endpoint.set(endpoint)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc(endpoint=endpoint)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_DURATION.observe(time.perf_counter() - start, endpoint=endpoint)
+            REQUESTS_TOTAL.inc(endpoint=endpoint, status=status["code"])
+            REQUESTS_IN_FLIGHT.dec(endpoint=endpoint)
+            current_endpoint.reset(token)
@@ -1,9 +1,37 @@
 from pydantic import BaseModel
 from typing import List, Optional
 
+class SearchFilters(BaseModel):
+    # Semua filter harus terpenuhi (AND); dijalankan di Chroma lewat klausa 'where'
+    authors: List[str] = []
+    keywords: List[str] = []
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+    faculty: Optional[str] = None
+
 class ThesisTitle(BaseModel):
     title: str
     number: int
+    # Paging: gunakan offset biasa atau cursor 'next_cursor' dari respons sebelumnya
+    offset: int = 0
+    cursor: Optional[str] = None
+    # 'dense', 'lexical' (BM25 lokal) atau 'hybrid'; kosong = RETRIEVAL_MODE di .env
+    retrieval_mode: Optional[str] = None
+    filters: Optional[SearchFilters] = None
+
+class RelatedTitleItem(BaseModel):
+    title: str
+    number: int = 5
+    # ID bebas dari client (mis. NIM/ID proposal), dikembalikan apa adanya di hasil
+    id: Optional[str] = None
+
+class RelatedBatchRequest(BaseModel):
+    items: List[RelatedTitleItem]
+    retrieval_mode: Optional[str] = None
+    # Filter yang sama untuk semua judul di batch
+    filters: Optional[SearchFilters] = None
+    # True = NDJSON (satu baris JSON per judul, dikirim bertahap sesuai urutan input)
+    stream: bool = False
 
 class ChatMessage(BaseModel):
     role: str
@@ -13,4 +41,8 @@ class ChatQuery(BaseModel):
     query: str
     context: Optional[str] = None 
     chat_history: List[ChatMessage]
-    session_id: Optional[str] = None
\ No newline at end of file
+    session_id: Optional[str] = None
+    stream: bool = False
+    use_cache: bool = True
+    retrieval_mode: Optional[str] = None
+    filters: Optional[SearchFilters] = None
\ No newline at end of file
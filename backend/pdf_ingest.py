@@ -0,0 +1,77 @@
+import hashlib
+import multiprocessing
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from pypdf import PdfReader
+
+# --- KONFIGURASI EKSTRAKSI PDF ---
+# PDF dengan halaman sebanyak ini atau lebih diekstrak paralel di process pool
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40"))
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Jumlah PDF (berdasarkan hash isi) yang teks & embedding-nya disimpan untuk dipakai ulang
+PDF_CONTENT_CACHE_MAX_ENTRIES = int(os.getenv("PDF_CONTENT_CACHE_MAX_ENTRIES", "32"))
+PDF_CONTENT_CACHE_TTL_SECONDS = float(os.getenv("PDF_CONTENT_CACHE_TTL_SECONDS", "86400"))
+
+_pool = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    # Pakai 'spawn' karena proses server memiliki banyak thread (client gRPC, thread pool)
+    # yang tidak aman untuk di-fork.
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=PDF_EXTRACT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _extract_page_range(file_path: str, start: int, end: int):
+    """Dijalankan di worker process: ekstrak teks halaman [start, end)."""
+    reader = PdfReader(file_path)
+    return [(i, reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+
+def extract_pages(file_path: str):
+    """
+    Mengekstrak teks per halaman sebagai list (nomor_halaman, teks).
+    PDF kecil diproses serial; PDF besar dibagi per rentang halaman ke process pool.
+    """
+    page_count = len(PdfReader(file_path).pages)
+
+    if page_count < PDF_PARALLEL_MIN_PAGES or PDF_EXTRACT_WORKERS <= 1:
+        return _extract_page_range(file_path, 0, page_count)
+
+    step = -(-page_count // PDF_EXTRACT_WORKERS)
+    pool = _get_pool()
+    futures = [
+        pool.submit(_extract_page_range, file_path, start, min(start + step, page_count))
+        for start in range(0, page_count, step)
+    ]
+
+    pages = []
+    for future in futures:
+        pages.extend(future.result())
+    return pages
+
+
+def pack_vectors(vectors):
+    """Simpan vektor sebagai float32 agar cache isi PDF hemat memori."""
+    return [array("f", vector) for vector in vectors]
@@ -0,0 +1,213 @@
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+import pandas as pd
+from datasource import read_json, write_json
+from lexical import BM25Index
+from index_versions import REFRESH_CHECKPOINT_FILENAME, REFRESH_COMPLETE_STATUS
+from export_db import QUERY, open_connection, open_cursor, iter_row_chunks
+from indexer import (
+    VECTOR_STORE_PATH, build_embeddings, open_collection, load_existing_hashes,
+    iter_chunks, iter_changed_batches, write_batches, finish_indexing
+)
+
+# --- KONFIGURASI PIPELINE REFRESH ---
+# Satu proses: DB -> chunker -> embedder -> writer Chroma, semua tahap berjalan bersamaan.
+# Ukuran queue antar tahap (dalam item) membatasi memori sekaligus memberi backpressure.
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))
+CHECKPOINT_INTERVAL_SECONDS = 5
+
+_DONE = object()
+
+
+class PipelineStage:
+    """
+    Satu tahap pipeline yang berjalan di thread sendiri. Hasilnya dialirkan ke tahap
+    berikutnya lewat queue terbatas; error di thread diteruskan ke konsumen.
+    """
+
+    def __init__(self, name: str, iterator, maxsize: int = PIPELINE_QUEUE_SIZE):
+        self.name = name
+        self.iterator = iterator
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.items = 0
+        self.busy_seconds = 0.0       # waktu di next() (termasuk menunggu tahap sebelumnya)
+        self.blocked_seconds = 0.0    # waktu menunggu tahap berikutnya mengambil hasil
+        self.consumer_wait_seconds = 0.0
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name=f"pipeline-{name}", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _run(self):
+        try:
+            while True:
+                start = time.perf_counter()
+                item = next(self.iterator, _DONE)
+                self.busy_seconds += time.perf_counter() - start
+                if item is _DONE:
+                    break
+                self.items += 1
+                start = time.perf_counter()
+                self.queue.put(item)
+                self.blocked_seconds += time.perf_counter() - start
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.queue.put(_DONE)
+
+    def __iter__(self):
+        while True:
+            start = time.perf_counter()
+            item = self.queue.get()
+            self.consumer_wait_seconds += time.perf_counter() - start
+            if item is _DONE:
+                if self.error is not None:
+                    raise self.error
+                return
+            yield item
+
+
+def iter_db_frames(conn):
+    """Tahap ekstraksi: baris dari cursor server-side dijadikan DataFrame string per chunk."""
+    cursor = open_cursor(conn, name="pipeline_cursor")
+    cursor.execute(QUERY)
+    try:
+        for rows in iter_row_chunks(cursor):
+            columns = [d[0] for d in cursor.description]
+            values = [["" if value is None else str(value) for value in row] for row in rows]
+            yield pd.DataFrame(values, columns=columns, dtype=str)
+    finally:
+        cursor.close()
+
+
+class Checkpoint:
+    """
+    Progres run disimpan di folder index. Melanjutkan run yang terputus tidak perlu
+    membaca posisi: chunk yang sudah tertulis punya content_hash yang sama sehingga
+    dilewati oleh diff, dan vektornya ada di embedding store.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.previous = read_json(path, {})
+        self.data = {
+            "run_id": datetime.now().strftime("%Y%m%dT%H%M%S"),
+            "status": "running",
+            "chunks_written": 0,
+            "last_chunk_id": None,
+        }
+        self._last_save = 0.0
+
+    def resumed_from(self):
+        if self.previous.get("status") == "running":
+            return self.previous
+        return None
+
+    def batch_written(self, batch_ids):
+        self.data["chunks_written"] += len(batch_ids)
+        self.data["last_chunk_id"] = batch_ids[-1]
+        if time.time() - self._last_save >= CHECKPOINT_INTERVAL_SECONDS:
+            self.save()
+
+    def save(self, **fields):
+        self.data.update(fields)
+        self.data["updated_at"] = datetime.now().isoformat(timespec="seconds")
+        write_json(self.path, self.data)
+        self._last_save = time.time()
+
+
+def print_stage_report(extract, chunk, timings, total_seconds):
+    """
+    Waktu kerja murni per tahap. Jika pipeline seimbang, total mendekati tahap
+    paling lambat, bukan jumlah semua tahap.
+    """
+    stages = {
+        "extract": extract.busy_seconds,
+        "chunk": chunk.busy_seconds - extract.consumer_wait_seconds,
+        "embed (wait)": timings["embed_wait_seconds"],
+        "write": timings["write_seconds"],
+    }
+    print("\n--- Stage timing ---")
+    for name, seconds in stages.items():
+        print(f"{name:>14}: {seconds:8.1f}s")
+    print(f"{'total':>14}: {total_seconds:8.1f}s")
+    return {name: round(seconds, 2) for name, seconds in stages.items()}
+
+
+def run_pipeline(full_rebuild=False, sqlite_path=None, use_tunnel=True):
+    print("--- Starting Streaming Refresh Pipeline ---")
+    print(f"Writing index to: {VECTOR_STORE_PATH}")
+    start_time = time.time()
+
+    try:
+        embeddings, limiter = build_embeddings()
+        collection = open_collection(embeddings, full_rebuild)
+
+        checkpoint = Checkpoint(os.path.join(VECTOR_STORE_PATH, REFRESH_CHECKPOINT_FILENAME))
+        previous = checkpoint.resumed_from()
+        if previous:
+            print(f"Resuming interrupted run {previous.get('run_id')} "
+                  f"({previous.get('chunks_written', 0)} chunks already written will be skipped).")
+        checkpoint.save()
+
+        existing = load_existing_hashes(collection)
+        print(f"Existing chunks: {len(existing)}")
+
+        stats = {'papers': 0, 'chunks': 0, 'duplicates': 0}
+        lexical_index = BM25Index()
+        seen_ids = set()
+        timings = {}
+
+        with open_connection(sqlite_path, use_tunnel) as (conn, _):
+            # DB -> [queue] -> chunker + diff -> [queue] -> embed paralel -> writer berurutan
+            extract = PipelineStage("extract", iter_db_frames(conn)).start()
+            chunk = PipelineStage(
+                "chunk", iter_changed_batches(iter_chunks(extract, lexical_index, stats), existing, seen_ids)
+            ).start()
+
+            upserted = write_batches(
+                collection, embeddings, chunk, limiter,
+                timings=timings, on_batch_written=checkpoint.batch_written
+            )
+            if upserted is None:
+                # Dihentikan atau ada batch gagal: status tetap "running" sehingga versi ini
+                # tidak bisa diaktifkan dan run berikutnya melanjutkannya
+                checkpoint.save()
+                print("Refresh incomplete; run the pipeline again to resume.")
+                return False
+
+        finish_indexing(collection, embeddings, existing, seen_ids, lexical_index, stats)
+
+        total_seconds = time.time() - start_time
+        stage_seconds = print_stage_report(extract, chunk, timings, total_seconds)
+        checkpoint.save(status=REFRESH_COMPLETE_STATUS, papers=stats['papers'], chunks=stats['chunks'],
+                        stage_seconds=stage_seconds, total_seconds=round(total_seconds, 2))
+
+        print("\nRefresh Pipeline Complete.")
+        return True
+
+    except KeyboardInterrupt:
+        print("\nSTOPPED BY USER.")
+        return False
+    except Exception as e:
+        print(f"FATAL ERROR: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh index langsung dari DB (export + index dalam satu proses)")
+    parser.add_argument("--full", action="store_true", help="Hapus collection dan bangun ulang dari nol")
+    parser.add_argument("--sqlite", metavar="PATH", help="Gunakan file SQLite lokal sebagai pengganti DB kampus")
+    parser.add_argument("--no-tunnel", action="store_true", help="Terhubung langsung ke DB_HOST tanpa SSH tunnel")
+    args = parser.parse_args()
+
+    success = run_pipeline(full_rebuild=args.full, sqlite_path=args.sqlite, use_tunnel=not args.no_tunnel)
+    if not success:
+        sys.exit(1)
@@ -0,0 +1,272 @@
+import os
+from langchain_core.documents import Document
+from concurrency import run_blocking
+from lexical import reciprocal_rank_fusion
+from metrics import track_stage
+from context_builder import RELEVANCE_SCORE_KEY, merge_adjacent_chunks
+from search_filters import matches, to_chroma_where
+
+# --- KONFIGURASI RETRIEVAL ---
+# dense   : embedding Google + Chroma (default lama)
+# lexical : BM25 lokal, tanpa panggilan jaringan
+# hybrid  : gabungan keduanya dengan Reciprocal Rank Fusion
+RETRIEVAL_MODES = ("dense", "lexical", "hybrid")
+DEFAULT_RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense").lower()
+# Kandidat per ranking pada mode hybrid = k * faktor ini
+HYBRID_CANDIDATE_FACTOR = int(os.getenv("HYBRID_CANDIDATE_FACTOR", "2"))
+
+# --- PENGELOMPOKAN PER PAPER ---
+# Abstrak panjang dipecah indexer menjadi beberapa chunk, sehingga top-k chunk bisa memuat
+# paper yang sama berkali-kali. Jika aktif, hasil dense adalah k paper berbeda (satu dokumen
+# per paper dengan satu skor); kandidat chunk digandakan bertahap sampai k paper terkumpul.
+GROUP_BY_PAPER = os.getenv("GROUP_BY_PAPER", "true").lower() == "true"
+# Kandidat chunk awal = k * faktor ini; batas atas kandidat per query
+GROUP_OVERFETCH_FACTOR = int(os.getenv("GROUP_OVERFETCH_FACTOR", "2"))
+GROUP_MAX_CANDIDATES = int(os.getenv("GROUP_MAX_CANDIDATES", "200"))
+
+
+def resolve_retrieval_mode(mode, lexical_index) -> str:
+    """Memvalidasi mode; tanpa index leksikal semua mode jatuh ke 'dense'."""
+    mode = (mode or DEFAULT_RETRIEVAL_MODE).lower()
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode '{mode}'. Use one of: {', '.join(RETRIEVAL_MODES)}.")
+    if mode != "dense" and lexical_index is None:
+        return "dense"
+    return mode
+
+
+def paper_key(metadata: dict) -> str:
+    """Kunci unik sebuah paper (untuk menggabungkan hasil dense dan leksikal)."""
+    return str(metadata.get("paper_id") or metadata.get("uri") or metadata.get("title") or "").strip()
+
+
+def _lexical_document(paper: dict, score: float) -> Document:
+    page_content = f"Judul: {paper.get('title', '')}\nAbstrak: {paper.get('abstract', '')}"
+    return Document(page_content=page_content, metadata={**paper, "lexical_score": score})
+
+
+async def lexical_search(query: str, k: int, lexical_index, conditions=None):
+    """conditions (dari search_filters.filter_conditions) disaring di dalam index BM25."""
+    accept = (lambda paper: matches(paper, conditions)) if conditions else None
+    with track_stage("lexical_search"):
+        results = await run_blocking("retriever", lexical_index.search, query, k, accept)
+    return [_lexical_document(paper, score) for paper, score in results]
+
+
+def distance_to_similarity(distance: float, space: str) -> float:
+    """
+    Jarak Chroma -> cosine similarity. Default Chroma adalah L2 kuadrat; untuk vektor
+    ternormalisasi (embedding Google) berlaku d = 2 - 2*cos.
+    """
+    if space in ("cosine", "ip"):
+        return 1.0 - distance
+    return 1.0 - distance / 2.0
+
+
+def _distance_space(vector_store) -> str:
+    metadata = getattr(vector_store._collection, "metadata", None) or {}
+    return metadata.get("hnsw:space", "l2")
+
+
+def _with_scores(results, space: str):
+    documents = []
+    for doc, distance in results:
+        doc.metadata = {**doc.metadata, RELEVANCE_SCORE_KEY: round(distance_to_similarity(distance, space), 4)}
+        documents.append(doc)
+    return documents
+
+
+async def dense_search(query: str, k: int, vector_store, query_vector=None, conditions=None):
+    """
+    Pencarian vektor; skor relevansi (cosine) disimpan di metadata 'relevance_score'.
+    conditions dijalankan Chroma sebagai klausa 'where' (k hasil teratas yang lolos filter).
+    """
+    # Embedding dan pencarian vektor dipisah agar durasinya terukur sendiri-sendiri
+    if query_vector is None:
+        with track_stage("embedding"):
+            query_vector = await run_blocking("embedding", vector_store.embeddings.embed_query, query)
+    with track_stage("vector_search"):
+        results = await run_blocking(
+            "retriever", vector_store.similarity_search_by_vector_with_relevance_scores, query_vector,
+            k=k, filter=to_chroma_where(conditions)
+        )
+    return _with_scores(results, _distance_space(vector_store))
+
+
+def group_by_paper(documents):
+    """
+    Satu dokumen per paper, urut dari chunk terbaik masing-masing paper. Teks chunk yang
+    cocok digabung sesuai urutan di abstrak (overlap dibuang); skor paper = skor chunk
+    tertinggi dan jumlah chunk disimpan di 'merged_chunks'.
+    """
+    groups = {}
+    for doc in documents:
+        # Dokumen tanpa identitas paper tidak digabung dengan dokumen lain
+        key = paper_key(doc.metadata) or id(doc)
+        groups.setdefault(key, []).append(doc)
+
+    papers = []
+    for docs in groups.values():
+        if len(docs) == 1:
+            papers.append(docs[0])
+            continue
+        runs = sorted(merge_adjacent_chunks(docs), key=lambda doc: doc.metadata.get("chunk_index", 0))
+        scores = [doc.metadata[RELEVANCE_SCORE_KEY] for doc in docs if doc.metadata.get(RELEVANCE_SCORE_KEY) is not None]
+        metadata = {**docs[0].metadata, "merged_chunks": len(docs)}
+        if scores:
+            metadata[RELEVANCE_SCORE_KEY] = max(scores)
+        papers.append(Document(page_content="\n...\n".join(run.page_content for run in runs), metadata=metadata))
+    return papers
+
+
+def _needs_more_candidates(papers, chunks, k: int, fetch_k: int) -> bool:
+    """Paper berbeda belum cukup, koleksi belum habis, dan batas kandidat belum tercapai."""
+    return len(papers) < k and len(chunks) >= fetch_k and fetch_k < GROUP_MAX_CANDIDATES
+
+
+def _initial_fetch_k(k: int) -> int:
+    return max(k, min(k * GROUP_OVERFETCH_FACTOR, GROUP_MAX_CANDIDATES))
+
+
+async def dense_search_papers(query: str, k: int, vector_store, query_vector=None, conditions=None):
+    """dense_search dengan hasil k paper berbeda (embedding query dihitung sekali)."""
+    if query_vector is None:
+        with track_stage("embedding"):
+            query_vector = await run_blocking("embedding", vector_store.embeddings.embed_query, query)
+    fetch_k = _initial_fetch_k(k)
+    while True:
+        chunks = await dense_search(query, fetch_k, vector_store, query_vector, conditions)
+        papers = group_by_paper(chunks)
+        if not _needs_more_candidates(papers, chunks, k, fetch_k):
+            return papers[:k]
+        fetch_k = min(fetch_k * 2, GROUP_MAX_CANDIDATES)
+
+
+async def retrieve_documents(query: str, k: int, vector_store, lexical_index=None, mode=None, query_vector=None,
+                             conditions=None):
+    """
+    Mengambil k dokumen teratas sesuai mode retrieval (dan filter metadata, jika ada).
+    Jika pencarian dense gagal (mis. API embedding lambat/down) dan index leksikal
+    tersedia, hasil leksikal dipakai sebagai cadangan.
+    Mengembalikan (documents, mode_yang_dipakai).
+    """
+    mode = resolve_retrieval_mode(mode, lexical_index)
+
+    if mode == "lexical":
+        return await lexical_search(query, k, lexical_index, conditions), mode
+
+    candidates = k if mode == "dense" else k * HYBRID_CANDIDATE_FACTOR
+    search = dense_search_papers if GROUP_BY_PAPER else dense_search
+    try:
+        dense_docs = await search(query, candidates, vector_store, query_vector, conditions)
+    except Exception as e:
+        if lexical_index is None:
+            raise
+        print(f"Dense retrieval failed ({e}); falling back to lexical search.")
+        return await lexical_search(query, k, lexical_index, conditions), "lexical"
+
+    if mode == "dense":
+        return dense_docs, mode
+
+    lexical_docs = await lexical_search(query, candidates, lexical_index, conditions)
+    return fuse_results(dense_docs, lexical_docs, k), mode
+
+
+def fuse_results(dense_docs, lexical_docs, k: int):
+    """Gabungan ranking dense & leksikal dengan RRF (mode hybrid)."""
+    # Dokumen dense (chunk) diutamakan sebagai representasi jika paper muncul di keduanya
+    by_key = {}
+    for doc in lexical_docs + dense_docs:
+        by_key[paper_key(doc.metadata)] = doc
+
+    fused = reciprocal_rank_fusion([
+        [paper_key(doc.metadata) for doc in dense_docs],
+        [paper_key(doc.metadata) for doc in lexical_docs],
+    ])
+    return [by_key[key] for key, _ in fused[:k]]
+
+
+# --- RETRIEVAL BATCH ---
+
+def _embed_queries(embeddings, queries):
+    """Satu panggilan batch untuk banyak query (fallback: embed_query satu per satu)."""
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(queries)
+    return [embeddings.embed_query(query) for query in queries]
+
+
+async def _search_vectors(vectors, k: int, vector_store, conditions=None):
+    """Satu query Chroma untuk banyak vektor; daftar dokumen per vektor."""
+    with track_stage("vector_search"):
+        results = await run_blocking(
+            "retriever", vector_store._collection.query,
+            query_embeddings=vectors, n_results=k, where=to_chroma_where(conditions),
+            include=["documents", "metadatas", "distances"]
+        )
+    space = _distance_space(vector_store)
+    per_query = []
+    for texts, metadatas, distances in zip(results["documents"], results["metadatas"], results["distances"]):
+        per_query.append(_with_scores(
+            [(Document(page_content=text, metadata=metadata or {}), distance)
+             for text, metadata, distance in zip(texts, metadatas, distances)],
+            space
+        ))
+    return per_query
+
+
+async def dense_search_many(queries, k: int, vector_store, conditions=None):
+    """
+    Banyak query sekaligus: satu panggilan embedding batch lalu satu query Chroma
+    dengan banyak vektor (filter yang sama untuk semua vektor).
+    Mengembalikan daftar dokumen per query (urutan input).
+    Dengan GROUP_BY_PAPER, hasilnya k paper berbeda per query; hanya query yang
+    paper-nya belum cukup yang dicari ulang dengan kandidat lebih banyak.
+    """
+    with track_stage("embedding"):
+        vectors = await run_blocking("embedding", _embed_queries, vector_store.embeddings, list(queries))
+    if not GROUP_BY_PAPER:
+        return await _search_vectors(vectors, k, vector_store, conditions)
+
+    results = [None] * len(vectors)
+    pending = list(range(len(vectors)))
+    fetch_k = _initial_fetch_k(k)
+    while pending:
+        chunk_results = await _search_vectors([vectors[i] for i in pending], fetch_k, vector_store, conditions)
+        retry = []
+        for i, chunks in zip(pending, chunk_results):
+            papers = group_by_paper(chunks)
+            results[i] = papers[:k]
+            if _needs_more_candidates(papers, chunks, k, fetch_k):
+                retry.append(i)
+        pending = retry
+        fetch_k = min(fetch_k * 2, GROUP_MAX_CANDIDATES)
+    return results
+
+
+async def retrieve_documents_many(queries, k: int, vector_store, lexical_index=None, mode=None, conditions=None):
+    """
+    Versi batch dari retrieve_documents (k sama untuk semua query; potong per item di pemanggil).
+    Mengembalikan (daftar dokumen per query, mode_yang_dipakai).
+    """
+    mode = resolve_retrieval_mode(mode, lexical_index)
+
+    if mode == "lexical":
+        return [await lexical_search(query, k, lexical_index, conditions) for query in queries], mode
+
+    candidates = k if mode == "dense" else k * HYBRID_CANDIDATE_FACTOR
+    try:
+        dense_results = await dense_search_many(queries, candidates, vector_store, conditions)
+    except Exception as e:
+        if lexical_index is None:
+            raise
+        print(f"Batch dense retrieval failed ({e}); falling back to lexical search.")
+        return [await lexical_search(query, k, lexical_index, conditions) for query in queries], "lexical"
+
+    if mode == "dense":
+        return dense_results, mode
+
+    fused = []
+    for query, dense_docs in zip(queries, dense_results):
+        lexical_docs = await lexical_search(query, candidates, lexical_index, conditions)
+        fused.append(fuse_results(dense_docs, lexical_docs, k))
+    return fused, mode
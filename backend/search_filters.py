@@ -0,0 +1,126 @@
+import json
+import operator
+import re
+import unicodedata
+
+# --- FIELD FILTER TERNORMALISASI ---
+# Indexer menambahkan field berikut ke metadata setiap chunk (dan ke index leksikal)
+# sehingga filter dijalankan langsung oleh Chroma lewat klausa 'where', bukan dengan
+# mengambil kandidat berlebih lalu menyaringnya di Python:
+#   year            : int, tahun terbit (jika sumber data punya kolom tahun)
+#   faculty         : slug fakultas (jika sumber data punya kolom fakultas)
+#   author:<slug>   : True untuk setiap penulis paper
+#   kw:<slug>       : True untuk setiap keyword paper
+# Filter metadata Chroma tidak mendukung "mengandung" pada string, karena itu
+# penulis dan keyword disimpan sebagai flag boolean per nilai.
+YEAR_FIELD = "year"
+FACULTY_FIELD = "faculty"
+AUTHOR_PREFIX = "author:"
+KEYWORD_PREFIX = "kw:"
+
+# Penulis dipisah ';' atau '|' (koma dipakai pada format "Nama Belakang, Nama Depan")
+AUTHOR_SEPARATORS = re.compile(r"[;|\n]")
+KEYWORD_SEPARATORS = re.compile(r"[;,|\n]")
+_YEAR_RE = re.compile(r"\b(19\d{2}|20\d{2})\b")
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+_OPERATORS = {"$eq": operator.eq, "$gte": operator.ge, "$lte": operator.le}
+
+
+def _words(text: str):
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return _WORD_RE.findall(text)
+
+
+def slugify(text: str) -> str:
+    return "-".join(_words(text))
+
+
+def author_slug(name: str) -> str:
+    """Urutan kata diabaikan sehingga 'Santoso, Budi' dan 'Budi Santoso' menjadi slug yang sama."""
+    return "-".join(sorted(_words(name)))
+
+
+def parse_year(value):
+    match = _YEAR_RE.search(str(value or ""))
+    return int(match.group(1)) if match else None
+
+
+def filter_metadata(authors: str, keywords: str, year: str = "", faculty: str = "") -> dict:
+    """Field filter ternormalisasi untuk satu paper (dipakai indexer)."""
+    fields = {}
+    parsed_year = parse_year(year)
+    if parsed_year is not None:
+        fields[YEAR_FIELD] = parsed_year
+    faculty_slug = slugify(faculty)
+    if faculty_slug:
+        fields[FACULTY_FIELD] = faculty_slug
+    for name in AUTHOR_SEPARATORS.split(authors or ""):
+        slug = author_slug(name)
+        if slug:
+            fields[AUTHOR_PREFIX + slug] = True
+    for keyword in KEYWORD_SEPARATORS.split(keywords or ""):
+        slug = slugify(keyword)
+        if slug:
+            fields[KEYWORD_PREFIX + slug] = True
+    return fields
+
+
+def is_filter_field(name: str) -> bool:
+    return name in (YEAR_FIELD, FACULTY_FIELD) or name.startswith((AUTHOR_PREFIX, KEYWORD_PREFIX))
+
+
+# --- FILTER DARI REQUEST ---
+
+def filter_conditions(filters) -> list:
+    """
+    SearchFilters -> daftar kondisi (field, operator, nilai) dengan urutan tetap
+    (dipakai juga sebagai kunci cache). Semua kondisi harus terpenuhi (AND).
+    ValueError jika filter tidak valid.
+    """
+    if filters is None:
+        return []
+    if filters.year_from is not None and filters.year_to is not None and filters.year_from > filters.year_to:
+        raise ValueError("filters.year_from must not be greater than filters.year_to.")
+
+    conditions = []
+    for name in sorted({author_slug(name) for name in filters.authors}):
+        if not name:
+            raise ValueError("filters.authors must not contain empty names.")
+        conditions.append((AUTHOR_PREFIX + name, "$eq", True))
+    for keyword in sorted({slugify(keyword) for keyword in filters.keywords}):
+        if not keyword:
+            raise ValueError("filters.keywords must not contain empty keywords.")
+        conditions.append((KEYWORD_PREFIX + keyword, "$eq", True))
+    if filters.year_from is not None:
+        conditions.append((YEAR_FIELD, "$gte", filters.year_from))
+    if filters.year_to is not None:
+        conditions.append((YEAR_FIELD, "$lte", filters.year_to))
+    if filters.faculty:
+        conditions.append((FACULTY_FIELD, "$eq", slugify(filters.faculty)))
+    return conditions
+
+
+def conditions_key(conditions) -> str:
+    """Representasi string yang stabil (kunci cache & cursor); '' jika tanpa filter."""
+    return json.dumps(conditions, separators=(",", ":")) if conditions else ""
+
+
+def to_chroma_where(conditions):
+    """Klausa 'where' Chroma; None jika tanpa filter ($and Chroma butuh minimal 2 kondisi)."""
+    clauses = [{field: {op: value}} for field, op, value in conditions or ()]
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+
+def matches(metadata: dict, conditions) -> bool:
+    """Evaluasi kondisi yang sama untuk index leksikal (BM25 di memori)."""
+    for field, op, value in conditions:
+        actual = metadata.get(field)
+        if actual is None or not _OPERATORS[op](actual, value):
+            return False
+    return True
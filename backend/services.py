@@ -1,13 +1,22 @@
 from fastapi import HTTPException
-from fastapi.responses import JSONResponse
-from models import ChatQuery, ThesisTitle, ChatMessage
+from fastapi.responses import JSONResponse, StreamingResponse
+from models import ChatQuery, ThesisTitle, ChatMessage, RelatedBatchRequest
 from typing import List
+import base64
+import hashlib
+import json
 import shutil
 import time
 import os
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from concurrency import ainvoke_llm, astream_llm, run_blocking
+from cache import ANSWER_CACHE_BYPASS_FOLLOW_UPS, normalize_text
+from sessions import TEMP_DIR
+from pdf_ingest import extract_pages, file_sha256, pack_vectors
+from retrieval import resolve_retrieval_mode, retrieve_documents, retrieve_documents_many, dense_search
+from metrics import track_stage, observe_stage, observe_prompt, record_stage_error
+from context_builder import build_prompt, CONTEXT_CANDIDATES, RELEVANCE_SCORE_KEY
+from search_filters import filter_conditions, conditions_key
 
 # --- FUNGSI PROMPT ---
 
@@ -91,11 +100,119 @@ def clean_response(raw_response: str) -> str:
     # 4. Pembersihan Akhir: Hapus spasi dan quote yang tersisa di awal/akhir
     return clean_text.strip().strip("'").strip('"').strip()
 
+# --- FUNGSI STREAMING (SSE) ---
+
+class StreamingResponseCleaner:
+    """
+    Versi inkremental dari clean_response untuk token yang datang bertahap.
+    Token selesai yang terpotong di antara dua chunk ditahan dulu, begitu juga spasi
+    di akhir. Hasil akhir yang otoritatif tetap diambil dari clean_response() di finish().
+    """
+    FINISH_TOKEN = '<|reserved_special_token_0|>'
+
+    def __init__(self):
+        self._raw = []
+        self._pending = ""
+        self._trailing = ""
+        self._started = False
+
+    def feed(self, chunk: str) -> str:
+        self._raw.append(chunk)
+        text = (self._pending + chunk).replace(self.FINISH_TOKEN, '')
+
+        # Tahan ekor teks yang mungkin merupakan awal dari token selesai
+        hold = 0
+        for n in range(min(len(self.FINISH_TOKEN) - 1, len(text)), 0, -1):
+            if self.FINISH_TOKEN.startswith(text[-n:]):
+                hold = n
+                break
+        self._pending = text[len(text) - hold:] if hold else ""
+        text = text[:len(text) - hold]
+
+        text = text.encode('ascii', 'ignore').decode('ascii')
+
+        # Awal jawaban: buang spasi dan quote seperti strip() pada clean_response
+        if not self._started:
+            text = text.lstrip().lstrip("'").lstrip('"').lstrip()
+            if not text:
+                return ""
+            self._started = True
+
+        stripped = text.rstrip()
+        if not stripped:
+            self._trailing += text
+            return ""
+        out = self._trailing + stripped
+        self._trailing = text[len(stripped):]
+        return out
+
+    def finish(self) -> str:
+        return clean_response("".join(self._raw))
+
+
+def _sse_event(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def stream_llm_response(llm, prompt: str, label: str, on_complete=None, headers=None) -> StreamingResponse:
+    """
+    Mengirim jawaban LLM sebagai Server-Sent Events:
+    - event 'token' berisi potongan teks yang sudah dibersihkan,
+    - event 'done' berisi jawaban final (hasil clean_response atas teks lengkap),
+    - event 'error' jika LLM gagal di tengah jalan.
+    on_complete(final_response) dipanggil setelah stream selesai tanpa error.
+    Durasi dicatat sebagai stage 'llm' (seluruh stream), 'llm_first_token' dan 'cleaning'.
+    """
+    async def event_generator():
+        cleaner = StreamingResponseCleaner()
+        start = time.perf_counter()
+        first_token_seen = False
+        cleaning_seconds = 0.0
+        try:
+            async for chunk in astream_llm(llm, prompt):
+                clean_start = time.perf_counter()
+                piece = cleaner.feed(str(chunk.content))
+                cleaning_seconds += time.perf_counter() - clean_start
+                if piece:
+                    if not first_token_seen:
+                        first_token_seen = True
+                        observe_stage("llm_first_token", time.perf_counter() - start)
+                    yield _sse_event("token", {"text": piece})
+            clean_start = time.perf_counter()
+            final_response = cleaner.finish()
+            cleaning_seconds += time.perf_counter() - clean_start
+            observe_stage("llm", time.perf_counter() - start - cleaning_seconds)
+            observe_stage("cleaning", cleaning_seconds)
+            yield _sse_event("done", {"response": final_response})
+            if on_complete is not None:
+                on_complete(final_response)
+        except Exception as e:
+            record_stage_error("llm")
+            print(f"Error while streaming {label}: {e}")
+            yield _sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream", headers={**SSE_HEADERS, **(headers or {})})
+
+
+def text_response(chat_query: ChatQuery, response_text: str, headers=None):
+    """Jawaban statis (fallback/cache) dalam format yang sesuai mode request (JSON atau SSE)."""
+    if not chat_query.stream:
+        return JSONResponse(content={"response": response_text}, headers=headers)
+
+    async def event_generator():
+        yield _sse_event("token", {"text": response_text})
+        yield _sse_event("done", {"response": response_text})
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream", headers={**SSE_HEADERS, **(headers or {})})
+
 # --- DEFINISI FUNGSI PEMBERSIH TEMP FOLDER ---
 
 def clear_temp_folder():
     """Fungsi sinkronus untuk menghapus folder."""
-    temp_dir = "../temp_files"
+    temp_dir = TEMP_DIR
     if os.path.exists(temp_dir):
         try:
             shutil.rmtree(temp_dir)
@@ -108,83 +225,222 @@ def clear_temp_folder():
 
 # --- FUNGSI PDF UPLOAD ---
 
-async def process_pdf_for_chat(file_path: str, embeddings):
-    """Memproses PDF, membagi teks, dan membuat Chroma vector store sementara."""
-    try:
-        # 1. Muat Dokumen
-        loader = PyPDFLoader(file_path)
-        documents = loader.load()
-
-        if not documents:
-            raise ValueError("No text extracted from PDF.")
-
-        # 2. Split Dokumen
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000, 
-            chunk_overlap=200, 
-            length_function=len,
-            is_separator_regex=False
-        )
-        texts = text_splitter.split_documents(documents)
+# Jumlah chunk yang di-embed per batch; chunk yang sudah di-embed langsung bisa dipakai chat
+PDF_EMBED_BATCH_SIZE = int(os.getenv("PDF_EMBED_BATCH_SIZE", "64"))
 
-        # 3. Buat Chroma Vector Store Sementara (in-memory, tanpa client persistent)
-        vectorstore = Chroma.from_documents(
-            documents=texts,
-            embedding=embeddings
-        )
 
-        # 4. Kembalikan Retriever LangChain
-        return vectorstore.as_retriever(search_kwargs={"k": 10}) 
+def _add_pdf_chunks(vectorstore, start: int, documents, metadatas, vectors):
+    vectorstore._collection.add(
+        ids=[f"chunk-{start + i}" for i in range(len(documents))],
+        embeddings=[list(vector) for vector in vectors],
+        documents=documents,
+        metadatas=metadatas
+    )
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"PDF Processing Error: {str(e)}")
+
+# Job PDF bisa berjalan lama setelah request upload selesai, jadi label endpoint dikirim eksplisit
+UPLOAD_ENDPOINT = "/upload-pdf/"
+
+
+def _process_pdf_session(session, embeddings, content_cache=None):
+    """
+    Bagian sinkron pemrosesan PDF (load, split, embed). Dijalankan di thread pool.
+    Progres ditulis ke session agar bisa dipantau lewat endpoint status, dan chunk
+    dimasukkan ke index per batch sehingga chat bisa dimulai sebelum semua selesai.
+    """
+    # Import berat ditunda sampai ada PDF yang diproses (mempercepat startup server)
+    from langchain_chroma import Chroma
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    file_path = session.file_path
+    session.set_stage("extracting")
+
+    # Client in-memory Chroma berbagi state dalam satu proses, jadi tiap sesi perlu
+    # nama collection sendiri agar dokumen antar sesi tidak tercampur.
+    vectorstore = Chroma(
+        collection_name=f"pdf-{session.session_id}",
+        embedding_function=embeddings
+    )
+    session.retriever = vectorstore.as_retriever(search_kwargs={"k": 10})
+
+    # Upload dengan isi identik memakai ulang teks & embedding yang sudah dihitung
+    content_hash = file_sha256(file_path)
+    content = content_cache.get(content_hash) if content_cache is not None else None
+    if content is not None:
+        print(f"PDF {content_hash[:12]} reused from content cache.")
+        session.set_stage("embedding", chunks_total=len(content["documents"]))
+        _add_pdf_chunks(vectorstore, 0, content["documents"], content["metadatas"], content["vectors"])
+        session.chunks_done = session.chunks_total
+        return
+
+    # 1. Muat Dokumen (halaman diekstrak paralel untuk PDF besar)
+    with track_stage("extraction", UPLOAD_ENDPOINT):
+        documents = [
+            Document(page_content=text, metadata={"source": os.path.basename(file_path), "page": page})
+            for page, text in extract_pages(file_path)
+            if text.strip()
+        ]
+
+    if not documents:
+        raise ValueError("No text extracted from PDF.")
+
+    # 2. Split Dokumen
+    session.set_stage("chunking")
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000, 
+        chunk_overlap=200, 
+        length_function=len,
+        is_separator_regex=False,
+        # Posisi chunk di halaman dipakai context builder untuk menggabungkan chunk yang overlap
+        add_start_index=True
+    )
+    with track_stage("chunking", UPLOAD_ENDPOINT):
+        texts = text_splitter.split_documents(documents)
+
+    # 3. Embedding per batch, langsung masuk ke Chroma Vector Store sementara
+    session.set_stage("embedding", chunks_total=len(texts))
+    contents = [doc.page_content for doc in texts]
+    metadatas = [doc.metadata for doc in texts]
+    vectors = []
+    for start in range(0, len(texts), PDF_EMBED_BATCH_SIZE):
+        batch = contents[start:start + PDF_EMBED_BATCH_SIZE]
+        with track_stage("embedding", UPLOAD_ENDPOINT):
+            batch_vectors = embeddings.embed_documents(batch)
+        _add_pdf_chunks(vectorstore, start, batch, metadatas[start:start + PDF_EMBED_BATCH_SIZE], batch_vectors)
+        vectors.extend(pack_vectors(batch_vectors))
+        session.chunks_done = start + len(batch)
+
+    if content_cache is not None:
+        content_cache.set(content_hash, {
+            "documents": contents,
+            "metadatas": metadatas,
+            "vectors": vectors,
+        })
+
+
+async def process_pdf_for_chat(session, embeddings, content_cache=None):
+    """Memproses PDF milik sebuah sesi dan membuat Chroma vector store sementara."""
+    with track_stage("pdf_processing", UPLOAD_ENDPOINT):
+        await run_blocking("pdf", _process_pdf_session, session, embeddings, content_cache)
 
 
 # --- FUNGSI CHAT UMUM ---
-async def chat_general_query(chat_query: ChatQuery, llm, general_retriever):
+
+def _doc_id(doc) -> str:
+    """ID stabil untuk sebuah chunk hasil retrieval (dipakai sebagai kunci cache)."""
+    doc_id = getattr(doc, "id", None)
+    if doc_id:
+        return str(doc_id)
+    digest = hashlib.md5(doc.page_content.encode("utf-8")).hexdigest()
+    return f"{doc.metadata.get('uri', '')}#{digest}"
+
+
+def _format_context_document(doc) -> str:
+    # Ambil metadata yang sudah di-index di indexer.py; format ulang agar LLM tahu mana URL-nya
+    judul = doc.metadata.get("title", "Tanpa Judul")
+    url = doc.metadata.get("uri", "URL Tidak Tersedia")
+    return f"JUDUL: {judul}\nURL: {url}\nISI: {doc.page_content}"
+
+
+def _is_follow_up(chat_query: ChatQuery) -> bool:
+    """True jika riwayat chat memuat pertanyaan user sebelum pertanyaan saat ini."""
+    return any(
+        msg.role == "user" and msg.content != chat_query.query
+        for msg in chat_query.chat_history
+    )
+
+
+async def chat_general_query(chat_query: ChatQuery, llm, general_retriever, answer_cache=None, lexical_index=None):
     """
     Menangani permintaan chat umum (Chat Mode) dengan mengintegrasikan RAG
     menggunakan retriever utama (database skripsi).
+    Jika answer_cache diberikan, jawaban untuk pertanyaan yang mirip dengan dokumen
+    konteks yang sama diambil dari cache tanpa memanggil LLM.
     """
-    start_time = time.time()
     try:
-        # 1. Retrieval (Ambil konteks dari database utama)
-        relevant_docs = general_retriever.invoke(chat_query.query) 
-        context_list = []
-        for doc in relevant_docs:
-            # Ambil metadata yang sudah di-index di indexer.py
-            judul = doc.metadata.get("title", "Tanpa Judul")
-            url = doc.metadata.get("uri", "URL Tidak Tersedia")
-            isi = doc.page_content
-            
-            # Format ulang agar LLM tahu mana URL-nya
-            formatted_doc = f"JUDUL: {judul}\nURL: {url}\nISI: {isi}"
-            context_list.append(formatted_doc)
-
-        context = "\n\n---\n\n".join(context_list)
+        vector_store = general_retriever.vectorstore
+        # Kandidat lebih banyak dari k lama; yang masuk prompt ditentukan skor & budget token
+        k = max(general_retriever.search_kwargs.get("k", 7), CONTEXT_CANDIDATES)
+        try:
+            mode = resolve_retrieval_mode(chat_query.retrieval_mode, lexical_index)
+            conditions = filter_conditions(chat_query.filters)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # 1. Embedding query (sekali, dipakai untuk retrieval sekaligus kunci cache)
+        #    Mode leksikal tidak butuh embedding sama sekali.
+        query_vector = None
+        if mode != "lexical":
+            try:
+                with track_stage("embedding"):
+                    query_vector = await run_blocking(
+                        "embedding", vector_store.embeddings.embed_query, chat_query.query
+                    )
+            except Exception as e:
+                if lexical_index is None:
+                    raise
+                print(f"Query embedding failed ({e}); falling back to lexical search.")
+                mode = "lexical"
+
+        # 2. Retrieval (Ambil konteks dari database utama); filter metadata dijalankan di Chroma
+        relevant_docs, mode = await retrieve_documents(
+            chat_query.query, k, vector_store, lexical_index, mode, query_vector, conditions
+        )
+        # 3. Konteks + riwayat dalam batas budget token (chunk tidak relevan dibuang)
+        with track_stage("context_build"):
+            built = build_prompt(
+                chat_query.query, chat_query.chat_history, generate_academic_answer_prompt,
+                documents=relevant_docs, format_document=_format_context_document, separator="\n\n---\n\n"
+            )
         
         # --- PERBAIKAN: HANYA CEK KONTEKS ---
-        if not context:
+        if not built.documents:
              # Jawaban fallback yang formal, dipicu jika retrieval gagal
              response_text = "Saya adalah asisten riset IPB. Saat ini saya belum menemukan dokumen yang relevan di database penelitian kami untuk menjawab pertanyaan Anda."
-             return JSONResponse(content={"response": response_text})
-
-        # 3. Formatting Chat History
-        limited_chat_history = chat_query.chat_history[-3:]
-        chat_history = "\n".join(f"{msg.role}: {msg.content}" for msg in limited_chat_history)
-        
-        # 4. Generation (Buat prompt RAG dan panggil LLM)
-        prompt = generate_academic_answer_prompt(chat_history, context, chat_query.query)
-        response = llm.invoke(prompt)
+             return text_response(chat_query, response_text)
+
+        built.log("General chat (RAG)")
+        prompt = built.prompt
+        observe_prompt(prompt)
+
+        # 4. Cek Cache Jawaban
+        use_cache = answer_cache is not None and chat_query.use_cache and query_vector is not None
+        if use_cache and ANSWER_CACHE_BYPASS_FOLLOW_UPS and _is_follow_up(chat_query):
+            use_cache = False
+            answer_cache.record_bypass()
+
+        doc_ids = [_doc_id(doc) for doc in built.documents]
+        cache_status = "bypass"
+        if use_cache:
+            cache_generation = answer_cache.generation
+            with track_stage("answer_cache"):
+                cached_answer = answer_cache.lookup(query_vector, doc_ids)
+            if cached_answer is not None:
+                return text_response(chat_query, cached_answer, headers={"X-Answer-Cache": "hit"})
+            cache_status = "miss"
+
+        # 5. Generation (panggil LLM)
+        def remember(final_response):
+            if use_cache and final_response:
+                answer_cache.store(query_vector, doc_ids, final_response, generation=cache_generation)
+
+        cache_headers = {"X-Answer-Cache": cache_status}
+        if chat_query.stream:
+            return stream_llm_response(llm, prompt, "General chat (RAG)",
+                                       on_complete=remember, headers=cache_headers)
+
+        with track_stage("llm"):
+            response = await ainvoke_llm(llm, prompt)
         
         # --- PEMBERSIHAN RESPONS ---
-        final_response = clean_response(str(response.content))
-
-        process_time = time.time() - start_time
-        print(f"General chat (RAG) request took {process_time:.4f} seconds")
+        with track_stage("cleaning"):
+            final_response = clean_response(str(response.content))
+        remember(final_response)
         
-        return JSONResponse(content={"response": final_response})
+        return JSONResponse(content={"response": final_response}, headers=cache_headers)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -193,31 +449,35 @@ async def chat_general_query(chat_query: ChatQuery, llm, general_retriever):
 
 async def chat_with_pdf_context(chat_query, llm, pdf_retriever):
     """Menangani chat dengan dokumen PDF yang diunggah menggunakan retriever LangChain."""
-    start_time = time.time()
-    
     try:
-        # 1. Retrieval (Ambil konteks dari PDF)
-        relevant_docs = pdf_retriever.invoke(chat_query.query) 
-        context = "\n\n".join([doc.page_content for doc in relevant_docs])
-
-        if not context:
+        # 1. Retrieval (Ambil konteks dari PDF); embedding & pencarian diukur terpisah
+        k = max(pdf_retriever.search_kwargs.get("k", 10), CONTEXT_CANDIDATES)
+        relevant_docs = await dense_search(chat_query.query, k, pdf_retriever.vectorstore)
+
+        # 2. Konteks + riwayat dalam batas budget token; chunk overlap di halaman yang sama digabung
+        with track_stage("context_build"):
+            built = build_prompt(
+                chat_query.query, chat_query.chat_history, generate_academic_answer_prompt,
+                documents=relevant_docs, format_document=lambda doc: doc.page_content
+            )
+
+        if not built.documents:
             response_text = "Saya telah memproses PDF Anda, tetapi tidak menemukan informasi yang relevan untuk pertanyaan ini dalam dokumen tersebut."
-            return JSONResponse(content={"response": response_text})
-        
-        # 2. Formatting Chat History
-        limited_chat_history = chat_query.chat_history[-3:]
-        chat_history = "\n".join(f"{msg.role}: {msg.content}" for msg in limited_chat_history)
+            return text_response(chat_query, response_text)
         
-        # 3. Generation (Buat prompt dan panggil LLM)
-        prompt = generate_academic_answer_prompt(chat_history, context, chat_query.query)
-        response = llm.invoke(prompt)
+        # 3. Generation (panggil LLM)
+        built.log("Chat with PDF")
+        prompt = built.prompt
+        observe_prompt(prompt)
+        if chat_query.stream:
+            return stream_llm_response(llm, prompt, "Chat with PDF")
+
+        with track_stage("llm"):
+            response = await ainvoke_llm(llm, prompt)
         
         # --- PEMBERSIHAN RESPONS ---
-        final_response = clean_response(str(response.content))
-
-
-        process_time = time.time() - start_time
-        print(f"Chat with PDF request took {process_time:.4f} seconds")
+        with track_stage("cleaning"):
+            final_response = clean_response(str(response.content))
         
         return JSONResponse(content={"response": final_response})
         
@@ -257,54 +517,250 @@ async def chat_with_pdf_context(chat_query, llm, pdf_retriever):
 #         print(f"Error in get_related_documents: {e}")
 #         raise HTTPException(status_code=500, detail=str(e))
 
-async def get_related_documents(thesis: ThesisTitle, vector_store):
-    """Mengambil dokumen terkait dengan jumlah (k) yang dinamis."""
+# Jumlah maksimum dokumen yang diambil sekali per judul (sesuai batas input di sidebar)
+RELATED_MAX_K = int(os.getenv("RELATED_MAX_K", "20"))
+
+
+def _encode_cursor(title_key: str, offset: int, filter_key: str = "") -> str:
+    payload = {"t": title_key, "o": offset}
+    if filter_key:
+        payload["f"] = filter_key
+    raw = json.dumps(payload).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor: str, title_key: str, filter_key: str = "") -> int:
     try:
-        # --- PERUBAHAN LOGIKA ---
-        # Gunakan similarity_search langsung dari vector_store
-        # Ini memungkinkan kita memasukkan parameter 'k' dari input user (thesis.number)
-        related_documents = vector_store.similarity_search(
-            thesis.title, 
-            k=thesis.number
-        )
-        # ------------------------
-        
-        results = []
-        for doc in related_documents:
-            judul = doc.metadata.get("title", "Judul Tidak Ditemukan")
-            url = doc.metadata.get("uri", "No URL")
-            abstrak = doc.metadata.get("abstract", doc.page_content) 
-
-            results.append({
-                "judul": judul.strip(), 
-                "abstrak": abstrak.strip(),
-                "url": url.strip()
-            })
-
-        return {"related_documents": results}
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        offset = int(data["o"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    if data.get("t") != title_key or offset < 0:
+        raise HTTPException(status_code=400, detail="Cursor does not belong to this title.")
+    if data.get("f", "") != filter_key:
+        raise HTTPException(status_code=400, detail="Cursor was issued for different filters.")
+    return offset
+
+
+def _format_related_document(doc) -> dict:
+    judul = doc.metadata.get("title", "Judul Tidak Ditemukan")
+    url = doc.metadata.get("uri", "No URL")
+    abstrak = doc.metadata.get("abstract", doc.page_content) 
+
+    return {
+        "judul": judul.strip(), 
+        "abstrak": abstrak.strip(),
+        "url": url.strip(),
+        # Skor relevansi paper (chunk terbaiknya); None untuk hasil leksikal
+        "skor": doc.metadata.get(RELEVANCE_SCORE_KEY)
+    }
+
+
+async def get_related_documents(thesis: ThesisTitle, vector_store, results_cache=None, lexical_index=None):
+    """
+    Mengambil dokumen terkait dengan jumlah (k) yang dinamis.
+    Hasil diambil sekaligus sampai RELATED_MAX_K per judul lalu disimpan di results_cache,
+    sehingga mengganti 'number' atau membuka halaman berikutnya (offset/cursor)
+    tidak memicu pencarian ulang. Filter metadata ikut menjadi bagian kunci cache.
+    """
+    if not 1 <= thesis.number <= RELATED_MAX_K:
+        raise HTTPException(status_code=400, detail=f"number must be between 1 and {RELATED_MAX_K}.")
+    if thesis.offset < 0:
+        raise HTTPException(status_code=400, detail="offset must not be negative.")
+    try:
+        try:
+            mode = resolve_retrieval_mode(thesis.retrieval_mode, lexical_index)
+            conditions = filter_conditions(thesis.filters)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        title_key = normalize_text(thesis.title)
+        filter_key = conditions_key(conditions)
+        offset = _decode_cursor(thesis.cursor, title_key, filter_key) if thesis.cursor else thesis.offset
+        needed = offset + thesis.number
+        cache_key = (mode, title_key, filter_key)
+
+        ranked = results_cache.get(cache_key) if results_cache is not None else None
+
+        # Cache hanya cukup jika daftar yang tersimpan tidak terpotong sebelum 'needed'
+        if ranked is None or (len(ranked["documents"]) < needed and ranked["fetched_k"] < needed):
+            fetch_k = max(RELATED_MAX_K, needed)
+            generation = results_cache.generation if results_cache is not None else None
+            related_documents, used_mode = await retrieve_documents(
+                thesis.title, fetch_k, vector_store, lexical_index, mode, conditions=conditions
+            )
+            ranked = {
+                "fetched_k": fetch_k,
+                "mode": used_mode,
+                "documents": [_format_related_document(doc) for doc in related_documents],
+            }
+            # Hasil cadangan (leksikal karena dense gagal) tidak disimpan di cache mode dense
+            if results_cache is not None and used_mode == mode:
+                results_cache.set(cache_key, ranked, generation=generation)
+
+        documents = ranked["documents"]
+        page = documents[offset:needed]
+        has_more = needed < len(documents) or len(documents) >= ranked["fetched_k"]
+
+        return {
+            "related_documents": page,
+            "retrieval_mode": ranked["mode"],
+            "offset": offset,
+            # Jumlah hasil yang sudah diambil untuk judul ini (bukan total seluruh korpus)
+            "fetched": len(documents),
+            "next_cursor": _encode_cursor(title_key, needed, filter_key) if has_more and page else None,
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in get_related_documents: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# --- FUNGSI get_related_documents_batch ---
+
+# Batas jumlah judul per request batch dan jumlah judul per panggilan embedding + query Chroma
+RELATED_BATCH_MAX_ITEMS = int(os.getenv("RELATED_BATCH_MAX_ITEMS", "500"))
+RELATED_BATCH_CHUNK_SIZE = int(os.getenv("RELATED_BATCH_CHUNK_SIZE", "100"))
+
+
+def validate_related_batch(batch: RelatedBatchRequest, lexical_index=None) -> str:
+    """Memeriksa batas batch, k per item & filter; mengembalikan mode retrieval yang dipakai."""
+    if not batch.items:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one title.")
+    if len(batch.items) > RELATED_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch too large: {len(batch.items)} titles (max {RELATED_BATCH_MAX_ITEMS}).")
+    for index, item in enumerate(batch.items):
+        if not 1 <= item.number <= RELATED_MAX_K:
+            raise HTTPException(status_code=400, detail=f"items[{index}].number must be between 1 and {RELATED_MAX_K}.")
+    try:
+        filter_conditions(batch.filters)
+        return resolve_retrieval_mode(batch.retrieval_mode, lexical_index)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _batch_item_result(index: int, item, ranked: dict) -> dict:
+    return {
+        "index": index,
+        "id": item.id,
+        "title": item.title,
+        "retrieval_mode": ranked["mode"],
+        "related_documents": ranked["documents"][:item.number],
+    }
+
+
+async def iter_related_documents_batch(batch: RelatedBatchRequest, vector_store, mode: str,
+                                       results_cache=None, lexical_index=None):
+    """
+    Hasil per judul sesuai urutan input. Judul yang sudah ada di results_cache (dipakai
+    bersama /related_documents/) dilewati; sisanya diproses per RELATED_BATCH_CHUNK_SIZE
+    dengan satu panggilan embedding batch dan satu query Chroma multi-vektor.
+    """
+    conditions = filter_conditions(batch.filters)
+    filter_key = conditions_key(conditions)
+    for start in range(0, len(batch.items), RELATED_BATCH_CHUNK_SIZE):
+        items = batch.items[start:start + RELATED_BATCH_CHUNK_SIZE]
+        ranked_items = {}
+        pending = {}   # title_key -> posisi item di chunk ini (judul duplikat dicari sekali)
+
+        for position, item in enumerate(items):
+            title_key = normalize_text(item.title)
+            cached = results_cache.get((mode, title_key, filter_key)) if results_cache is not None else None
+            if cached is not None and (len(cached["documents"]) >= item.number or cached["fetched_k"] >= item.number):
+                ranked_items[position] = cached
+            else:
+                pending.setdefault(title_key, []).append(position)
+
+        if pending:
+            fetch_k = RELATED_MAX_K
+            generation = results_cache.generation if results_cache is not None else None
+            queries = [items[positions[0]].title for positions in pending.values()]
+            results, used_mode = await retrieve_documents_many(
+                queries, fetch_k, vector_store, lexical_index, mode, conditions
+            )
+            for (title_key, positions), documents in zip(pending.items(), results):
+                ranked = {
+                    "fetched_k": fetch_k,
+                    "mode": used_mode,
+                    "documents": [_format_related_document(doc) for doc in documents],
+                }
+                if results_cache is not None and used_mode == mode:
+                    results_cache.set((mode, title_key, filter_key), ranked, generation=generation)
+                for position in positions:
+                    ranked_items[position] = ranked
+
+        for position, item in enumerate(items):
+            yield _batch_item_result(start + position, item, ranked_items[position])
+
+
+async def get_related_documents_batch(batch: RelatedBatchRequest, vector_store, results_cache=None, lexical_index=None):
+    """Versi non-streaming: semua hasil dalam satu respons JSON."""
+    mode = validate_related_batch(batch, lexical_index)
+    try:
+        results = [
+            result async for result in
+            iter_related_documents_batch(batch, vector_store, mode, results_cache, lexical_index)
+        ]
+        return {"results": results, "count": len(results)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in get_related_documents_batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def stream_related_documents_batch(batch: RelatedBatchRequest, index_manager, mode: str,
+                                   results_cache=None) -> StreamingResponse:
+    """
+    NDJSON: satu baris per judul, dikirim per chunk segera setelah selesai dicari.
+    Versi index dikunci di dalam generator karena stream berjalan setelah handler selesai.
+    Jika sebuah chunk gagal, stream diakhiri dengan baris {"error": ...}.
+    """
+    async def line_generator():
+        async with index_manager.use() as index:
+            if index is None:
+                yield json.dumps({"error": "Server components not initialized."}) + "\n"
+                return
+            try:
+                async for result in iter_related_documents_batch(
+                    batch, index.vector_store, mode, results_cache, index.lexical_index
+                ):
+                    yield json.dumps(result) + "\n"
+            except Exception as e:
+                print(f"Error while streaming related documents batch: {e}")
+                yield json.dumps({"error": str(e)}) + "\n"
+
+    return StreamingResponse(line_generator(), media_type="application/x-ndjson", headers=SSE_HEADERS)
+
 # --- FUNGSI chat_with_document ---
 
 async def chat_with_document(chat_query: ChatQuery, llm):
     """Menangani chat dengan dokumen yang dipilih (Database) menggunakan LLM LangChain."""
-    start_time = time.time()
     try:
-        limited_chat_history = chat_query.chat_history[-3:]
-        chat_history = "\n".join(f"{msg.role}: {msg.content}" for msg in limited_chat_history)
-        prompt = generate_academic_answer_prompt(chat_history, chat_query.context, chat_query.query)
+        # Konteks dipilih frontend; riwayat & konteks tetap dibatasi budget token
+        with track_stage("context_build"):
+            built = build_prompt(
+                chat_query.query, chat_query.chat_history, generate_academic_answer_prompt,
+                fixed_context=chat_query.context or ""
+            )
+        built.log("Chat with document")
+        prompt = built.prompt
+        observe_prompt(prompt)
+        # Konteks pilihan user yang tidak muat budget dipotong; client diberi tahu
+        truncated = built.stats["context_truncated"]
+        headers = {"X-Context-Truncated": "true"} if truncated else None
         
-        # Menggunakan llm.invoke() LangChain
-        response = llm.invoke(prompt)
+        # Menggunakan llm.ainvoke() LangChain (non-blocking)
+        if chat_query.stream:
+            return stream_llm_response(llm, prompt, "Chat with document", headers=headers)
 
-        # --- PEMBERSIHAN RESPONS ---
-        final_response = clean_response(str(response.content))
+        with track_stage("llm"):
+            response = await ainvoke_llm(llm, prompt)
 
-        process_time = time.time() - start_time
-        print(f"Chat with document request took {process_time:.4f} seconds")
+        # --- PEMBERSIHAN RESPONS ---
+        with track_stage("cleaning"):
+            final_response = clean_response(str(response.content))
         
-        return JSONResponse(content={"response": final_response})
+        return JSONResponse(content={"response": final_response, "context_truncated": truncated}, headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
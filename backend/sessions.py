@@ -0,0 +1,285 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# --- KONFIGURASI SESI PDF ---
+TEMP_DIR = "../temp_files"
+PDF_SESSION_TTL_SECONDS = float(os.getenv("PDF_SESSION_TTL_SECONDS", "3600"))
+PDF_SESSION_MAX_SESSIONS = int(os.getenv("PDF_SESSION_MAX_SESSIONS", "50"))
+PDF_SESSION_MAX_MB = float(os.getenv("PDF_SESSION_MAX_MB", "512"))
+PDF_JANITOR_INTERVAL_SECONDS = float(os.getenv("PDF_JANITOR_INTERVAL_SECONDS", "300"))
+# File di temp folder yang lebih muda dari ini dianggap upload yang masih diproses
+PDF_TEMP_GRACE_SECONDS = float(os.getenv("PDF_TEMP_GRACE_SECONDS", "600"))
+
+# Berapa lama /chat-with-pdf/ menunggu PDF yang masih diproses sebelum menjawab dari index parsial
+PDF_CHAT_WAIT_SECONDS = float(os.getenv("PDF_CHAT_WAIT_SECONDS", "10"))
+
+# Perkiraan overhead per record di Chroma (id, metadata, entri index HNSW)
+_RECORD_OVERHEAD_BYTES = 512
+
+
+def estimate_retriever_bytes(retriever) -> int:
+    """Perkiraan memori yang dipakai vector store in-memory milik sebuah retriever."""
+    collection = retriever.vectorstore._collection
+    count = collection.count()
+    if count == 0:
+        return 0
+
+    sample = collection.get(limit=1, include=["embeddings"])
+    embeddings = sample.get("embeddings")
+    dimension = len(embeddings[0]) if embeddings is not None and len(embeddings) > 0 else 0
+
+    documents = collection.get(include=["documents"]).get("documents") or []
+    text_bytes = sum(len(doc.encode("utf-8")) for doc in documents if doc)
+
+    return count * (dimension * 4 + _RECORD_OVERHEAD_BYTES) + text_bytes
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    if not os.path.isdir(path):
+        return 0
+    for entry in os.scandir(path):
+        try:
+            if entry.is_file():
+                total += entry.stat().st_size
+        except OSError:
+            pass
+    return total
+
+
+class PDFSession:
+    """
+    Satu sesi Chat PDF. Sesi dibuat saat upload diterima lalu diisi bertahap oleh
+    worker: queued -> extracting -> chunking -> embedding (x/y) -> ready / failed.
+    """
+    def __init__(self, session_id: str, file_path: str = None):
+        self.session_id = session_id
+        self.retriever = None
+        self.file_path = file_path
+        self.size_bytes = 0
+        self.status = "queued"
+        self.chunks_done = 0
+        self.chunks_total = 0
+        self.error = None
+        self.created_at = time.time()
+        self.last_access = self.created_at
+
+    @property
+    def is_ready(self) -> bool:
+        return self.status == "ready"
+
+    @property
+    def is_processing(self) -> bool:
+        return self.status not in ("ready", "failed")
+
+    def set_stage(self, status: str, chunks_total: int = None):
+        self.status = status
+        if chunks_total is not None:
+            self.chunks_total = chunks_total
+            self.chunks_done = 0
+
+    def status_dict(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "status": self.status,
+            "chunks_done": self.chunks_done,
+            "chunks_total": self.chunks_total,
+            "error": self.error,
+        }
+
+    def release(self):
+        """Membebaskan collection Chroma in-memory dan file PDF sementara."""
+        if self.retriever is not None:
+            try:
+                self.retriever.vectorstore.delete_collection()
+            except Exception as e:
+                print(f"Error deleting PDF collection {self.session_id}: {e}")
+        if self.file_path and os.path.exists(self.file_path):
+            try:
+                os.remove(self.file_path)
+            except OSError as e:
+                print(f"Error deleting temp PDF {self.file_path}: {e}")
+
+
+async def wait_until_ready(session: PDFSession, timeout: float, poll_interval: float = 0.25):
+    """Menunggu sesi selesai diproses (ready/failed) paling lama 'timeout' detik."""
+    deadline = time.time() + timeout
+    while session.is_processing and time.time() < deadline:
+        await asyncio.sleep(poll_interval)
+    return session
+
+
+class PDFSessionStore:
+    """
+    Penyimpanan sesi Chat PDF dengan batas jumlah sesi dan memori.
+    Sesi yang idle lebih lama dari TTL dihapus oleh janitor, dan jika batas terlampaui
+    sesi yang paling lama tidak dipakai (LRU) dikeluarkan lebih dulu.
+    """
+
+    def __init__(self, ttl_seconds=PDF_SESSION_TTL_SECONDS, max_sessions=PDF_SESSION_MAX_SESSIONS,
+                 max_bytes=int(PDF_SESSION_MAX_MB * 1024 * 1024)):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self.total_bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __contains__(self, session_id) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def _pop(self, session_id):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self.total_bytes -= session.size_bytes
+        return session
+
+    def _evict_over_limit(self, keep: str = None):
+        """Mengeluarkan sesi LRU yang sudah selesai diproses sampai batas terpenuhi."""
+        evicted = []
+        candidates = [
+            s for s in self._sessions.values()
+            if not s.is_processing and s.session_id != keep
+        ]
+        for session in candidates:
+            if len(self._sessions) <= self.max_sessions and self.total_bytes <= self.max_bytes:
+                break
+            if len(self._sessions) <= 1:
+                break
+            evicted.append(self._pop(session.session_id))
+            self.evictions += 1
+        return evicted
+
+    def _release_all(self, sessions):
+        # Pembersihan dilakukan di luar lock
+        for session in sessions:
+            print(f"Evicting PDF session {session.session_id[:8]} (LRU)")
+            session.release()
+
+    def create(self, session_id: str, file_path: str = None) -> PDFSession:
+        """Mendaftarkan sesi baru yang masih menunggu diproses worker."""
+        session = PDFSession(session_id, file_path)
+        with self._lock:
+            old = self._pop(session_id)
+            self._sessions[session_id] = session
+            evicted = self._evict_over_limit(keep=session_id)
+        if old is not None:
+            evicted.append(old)
+        self._release_all(evicted)
+        return session
+
+    def mark_ready(self, session_id: str):
+        """Menandai sesi siap, menghitung ukurannya, lalu menegakkan batas memori."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None or session.retriever is None:
+            return
+        size_bytes = estimate_retriever_bytes(session.retriever)
+        with self._lock:
+            if self._sessions.get(session_id) is not session:
+                return
+            self.total_bytes += size_bytes - session.size_bytes
+            session.size_bytes = size_bytes
+            session.status = "ready"
+            self._sessions.move_to_end(session_id)
+            evicted = self._evict_over_limit(keep=session_id)
+        self._release_all(evicted)
+
+    def get(self, session_id: str):
+        """Mengembalikan sesi (dan memperbarui waktu akses), atau None."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            session.last_access = time.time()
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def remove(self, session_id: str) -> bool:
+        with self._lock:
+            session = self._pop(session_id)
+        if session is None:
+            return False
+        session.release()
+        return True
+
+    def evict_expired(self) -> int:
+        """Menghapus sesi yang idle lebih lama dari TTL (kecuali yang masih diproses)."""
+        now = time.time()
+        with self._lock:
+            expired = [
+                self._pop(session_id)
+                for session_id, session in list(self._sessions.items())
+                if not session.is_processing and now - session.last_access > self.ttl_seconds
+            ]
+            self.expirations += len(expired)
+        for session in expired:
+            session.release()
+        return len(expired)
+
+    def cleanup_orphan_files(self, temp_dir: str = TEMP_DIR, grace_seconds: float = PDF_TEMP_GRACE_SECONDS) -> int:
+        """Menghapus file PDF sementara yang tidak dimiliki sesi aktif mana pun."""
+        if not os.path.isdir(temp_dir):
+            return 0
+        with self._lock:
+            owned = {
+                os.path.abspath(session.file_path)
+                for session in self._sessions.values() if session.file_path
+            }
+        now = time.time()
+        removed = 0
+        for entry in os.scandir(temp_dir):
+            try:
+                if not entry.is_file() or os.path.abspath(entry.path) in owned:
+                    continue
+                if now - entry.stat().st_mtime < grace_seconds:
+                    continue
+                os.remove(entry.path)
+                removed += 1
+            except OSError as e:
+                print(f"Error deleting orphaned temp file {entry.path}: {e}")
+        return removed
+
+    def clear(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+            self.total_bytes = 0
+        for session in sessions:
+            session.release()
+
+    def stats(self, temp_dir: str = TEMP_DIR) -> dict:
+        now = time.time()
+        with self._lock:
+            sessions = [
+                {
+                    "session_id": session.session_id[:8],
+                    "status": session.status,
+                    "size_mb": round(session.size_bytes / (1024 * 1024), 2),
+                    "age_seconds": round(now - session.created_at),
+                    "idle_seconds": round(now - session.last_access),
+                }
+                for session in self._sessions.values()
+            ]
+            total_bytes = self.total_bytes
+        return {
+            "sessions": len(sessions),
+            "max_sessions": self.max_sessions,
+            "memory_mb": round(total_bytes / (1024 * 1024), 2),
+            "max_memory_mb": round(self.max_bytes / (1024 * 1024), 2),
+            "ttl_seconds": self.ttl_seconds,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "temp_disk_mb": round(directory_size(temp_dir) / (1024 * 1024), 2),
+            "details": sessions,
+        }
@@ -0,0 +1,46 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache
+from cache import SemanticAnswerCache
+
+
+class _Clock:
+    def __init__(self):
+        self.current = 1000.0
+
+    def time(self):
+        return self.current
+
+
+def test_hit_requires_same_documents_in_any_order_and_similar_query():
+    answers = SemanticAnswerCache(threshold=0.95, max_entries=8, ttl_seconds=60)
+    answers.store([1.0, 0.0], ["paper-1", "paper-2"], "jawaban")
+
+    assert answers.lookup([0.99, 0.05], ["paper-2", "paper-1"]) == "jawaban"
+    assert answers.lookup([0.0, 1.0], ["paper-1", "paper-2"]) is None
+    assert answers.lookup([1.0, 0.0], ["paper-1", "paper-3"]) is None
+    assert (answers.hits, answers.misses) == (1, 2)
+
+
+def test_expired_entry_is_a_miss_and_evicted(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cache, "time", clock)
+    answers = SemanticAnswerCache(threshold=0.95, max_entries=8, ttl_seconds=60)
+    answers.store([1.0, 0.0], ["paper-1"], "jawaban")
+
+    clock.current += 61
+    assert answers.lookup([1.0, 0.0], ["paper-1"]) is None
+    assert answers.stats()["entries"] == 0
+    assert answers.evictions == 1
+
+
+def test_store_is_ignored_after_invalidate():
+    answers = SemanticAnswerCache(threshold=0.95, max_entries=8, ttl_seconds=60)
+    generation = answers.generation
+    answers.invalidate()
+    answers.store([1.0, 0.0], ["paper-1"], "jawaban", generation=generation)
+
+    assert answers.lookup([1.0, 0.0], ["paper-1"]) is None
@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from concurrency import AdaptiveRateLimiter, is_rate_limit_error
+
+
+def test_rate_limit_halves_limit_and_success_grows_it_back():
+    limiter = AdaptiveRateLimiter(8, cooldown_seconds=0)
+
+    limiter.acquire()
+    limiter.release(throttled=True)
+    assert limiter.stats()["limit"] == 4
+
+    # Additive increase: +1/limit per sukses, sekitar +1 per "putaran" penuh
+    for _ in range(5):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.stats()["limit"] == 5
+    assert limiter.stats()["throttled"] == 1
+
+
+def test_limit_stays_within_bounds():
+    limiter = AdaptiveRateLimiter(4, min_concurrency=2, cooldown_seconds=0)
+
+    for _ in range(5):
+        limiter.acquire()
+        limiter.release(throttled=True)
+    assert limiter.stats()["limit"] == 2
+
+    for _ in range(50):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.stats()["limit"] == 4
+
+
+def test_call_retries_rate_limit_errors_only(monkeypatch):
+    monkeypatch.setattr("concurrency.time.sleep", lambda seconds: None)
+    limiter = AdaptiveRateLimiter(4, cooldown_seconds=0)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RuntimeError("429 RESOURCE_EXHAUSTED")
+        return "ok"
+
+    assert limiter.call(flaky) == "ok"
+    assert len(attempts) == 3
+    assert limiter.stats()["in_flight"] == 0
+
+    with pytest.raises(ValueError):
+        limiter.call(lambda: (_ for _ in ()).throw(ValueError("bad input")))
+    assert not is_rate_limit_error(ValueError("bad input"))
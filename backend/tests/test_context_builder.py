@@ -0,0 +1,68 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from context_builder import RELEVANCE_SCORE_KEY, build_prompt, format_history
+from metrics import estimate_tokens
+
+
+def _render(history, context, query):
+    return f"Riwayat:\n{history}\nKonteks:\n{context}\nPertanyaan: {query}"
+
+
+def _doc(paper_id, words, score):
+    return Document(page_content=" ".join([paper_id] * words), metadata={"paper_id": paper_id, RELEVANCE_SCORE_KEY: score})
+
+
+def test_documents_fill_budget_in_relevance_order():
+    documents = [_doc("p1", 100, 0.9), _doc("p2", 100, 0.8), _doc("p3", 100, 0.7)]
+
+    built = build_prompt("padi", [], _render, documents=documents, format_document=lambda doc: doc.page_content,
+                         budget=200, min_score=0)
+
+    assert [doc.metadata["paper_id"] for doc in built.documents] == ["p1", "p2"]
+    assert built.stats["over_budget"] == 1
+    assert built.stats["prompt_tokens"] <= 200
+    assert not built.stats["context_truncated"]
+
+
+def test_most_relevant_document_is_truncated_when_alone_over_budget():
+    built = build_prompt("padi", [], _render, documents=[_doc("p1", 1000, 0.9)],
+                         format_document=lambda doc: doc.page_content, budget=200, min_score=0)
+
+    assert len(built.documents) == 1
+    assert built.stats["context_truncated"]
+    assert built.stats["prompt_tokens"] <= 200
+
+
+def test_chunks_below_min_score_are_dropped():
+    built = build_prompt("padi", [], _render, documents=[_doc("p1", 10, 0.9), _doc("p2", 10, 0.1)],
+                         format_document=lambda doc: doc.page_content, budget=500, min_score=0.3)
+
+    assert [doc.metadata["paper_id"] for doc in built.documents] == ["p1"]
+    assert built.stats["below_threshold"] == 1
+
+
+def test_fixed_context_is_truncated_and_flagged():
+    built = build_prompt("padi", [], _render, fixed_context="kata " * 2000, budget=200)
+
+    assert built.stats["context_truncated"]
+    assert built.stats["prompt_tokens"] <= 200
+
+
+class _Message:
+    def __init__(self, role, content):
+        self.role = role
+        self.content = content
+
+
+def test_history_keeps_most_recent_messages_within_budget():
+    messages = [_Message("user", "lama " * 100), _Message("assistant", "baru")]
+
+    history, used = format_history(messages, budget=20)
+
+    assert used == 1
+    assert history == "assistant: baru"
+    assert estimate_tokens(history) <= 20
@@ -0,0 +1,129 @@
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import export_db
+from datasource import DELETED_FILENAME, iter_partition_frames, list_runs, read_keys
+
+
+class _Clock:
+    """Nama run memakai timestamp per detik; setiap run di test diberi detik yang berbeda."""
+
+    def __init__(self):
+        self.current = datetime(2024, 1, 1, 2, 0, 0)
+
+    def now(self):
+        self.current += timedelta(seconds=1)
+        return self.current
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "campus.sqlite")
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        f"CREATE TABLE {export_db.TABLE_NAME} "
+        "(id INTEGER PRIMARY KEY, title TEXT, authors TEXT, year INTEGER, updated_at TEXT)"
+    )
+    conn.executemany(
+        f"INSERT INTO {export_db.TABLE_NAME} VALUES (?, ?, ?, ?, ?)",
+        [
+            (1, "Irigasi tetes", "Budi", None, "2024-01-01"),
+            (2, "Padi sawah", "Sari", None, "2024-01-02"),
+            (3, "Kopi arabika", "Andi", 2021, "2024-01-03"),
+        ],
+    )
+    conn.commit()
+
+    partition_dir = str(tmp_path / "paper_metadata")
+    monkeypatch.setattr(export_db, "PARTITION_DIR", partition_dir)
+    monkeypatch.setattr(export_db, "EXPORT_KEY_COLUMN", "id")
+    monkeypatch.setattr(export_db, "EXPORT_WATERMARK_COLUMN", "updated_at")
+    # Chunk kecil agar kolom 'year' seluruhnya NULL di chunk pertama
+    monkeypatch.setattr(export_db, "EXPORT_CHUNK_ROWS", 2)
+    monkeypatch.setattr(export_db, "datetime", _Clock())
+    yield db_path, conn, partition_dir
+    conn.close()
+
+
+def _export(db_path, full=False):
+    return export_db.extract_and_save_locally(full=full, sqlite_path=db_path, export_format="parquet")
+
+
+def _part(run_path):
+    return pq.read_table(os.path.join(run_path, "part-00000.parquet"))
+
+
+def test_sparse_column_uses_declared_type(source):
+    db_path, _, partition_dir = source
+
+    assert _export(db_path, full=True)
+
+    (run_path, manifest), = list_runs(partition_dir)
+    table = _part(run_path)
+    assert manifest["rows"] == 3
+    assert table.schema.field("year").type == pa.int64()
+    assert table.column("year").to_pylist() == [None, None, 2021]
+
+
+def test_incremental_run_exports_changes_and_deletions(source):
+    db_path, conn, partition_dir = source
+    assert _export(db_path, full=True)
+
+    conn.execute(f"INSERT INTO {export_db.TABLE_NAME} VALUES (4, 'Sapi perah', 'Rina', NULL, '2024-01-04')")
+    conn.execute(f"UPDATE {export_db.TABLE_NAME} SET year = 2020, updated_at = '2024-01-05' WHERE id = 2")
+    conn.execute(f"DELETE FROM {export_db.TABLE_NAME} WHERE id = 1")
+    conn.commit()
+
+    assert _export(db_path)
+
+    (full_path, _), (run_path, manifest) = list_runs(partition_dir)
+    assert manifest["mode"] == "incremental"
+    assert manifest["watermark"] == "2024-01-05"
+    table = _part(run_path)
+    assert table.column("id").to_pylist() == [4, 2]
+    # Tipe kolom sama di setiap run, termasuk kolom yang kosong di chunk pertama
+    assert table.schema == _part(full_path).schema
+    assert read_keys(os.path.join(run_path, DELETED_FILENAME)) == {"1"}
+
+    rows = {
+        row["id"]: row["year"]
+        for frame in iter_partition_frames(partition_dir)
+        for row in frame.to_dict("records")
+    }
+    assert rows == {"2": "2020", "3": "2021", "4": ""}
+
+
+def test_incremental_run_without_changes_is_skipped(source):
+    db_path, _, partition_dir = source
+    assert _export(db_path, full=True)
+
+    assert _export(db_path)
+
+    assert len(list_runs(partition_dir)) == 1
+
+
+def test_row_committed_later_with_same_watermark_is_exported(source):
+    db_path, conn, partition_dir = source
+    assert _export(db_path, full=True)
+
+    # Baris baru dengan updated_at sama persis dengan watermark run sebelumnya
+    conn.execute(f"INSERT INTO {export_db.TABLE_NAME} VALUES (5, 'Jagung manis', 'Dewi', 2022, '2024-01-03')")
+    conn.commit()
+
+    assert _export(db_path)
+
+    (_, _), (run_path, manifest) = list_runs(partition_dir)
+    assert manifest["watermark"] == "2024-01-03"
+    assert _part(run_path).column("id").to_pylist() == [5]
+
+    # Baris di watermark yang sudah diekspor tidak diekspor ulang
+    assert _export(db_path)
+    assert len(list_runs(partition_dir)) == 2
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import index_versions
+from index_versions import IncompleteVersionError, IndexHandle, IndexManager, read_current, version_path
+
+
+class _Handle(IndexHandle):
+    def warm(self):
+        pass
+
+
+def _make_version(root, version, status=None):
+    path = version_path(version, root)
+    os.makedirs(path)
+    if status is not None:
+        with open(os.path.join(path, index_versions.REFRESH_CHECKPOINT_FILENAME), "w", encoding="utf-8") as f:
+            json.dump({"status": status}, f)
+
+
+@pytest.fixture
+def manager(tmp_path):
+    root = str(tmp_path)
+    _make_version(root, "20240101T000000", "complete")
+    _make_version(root, "20240102T000000", "running")
+    _make_version(root, "20240103T000000")
+    return IndexManager(lambda version, path: _Handle(version, path, None, None, None), root=root)
+
+
+def test_activate_refuses_running_refresh(manager):
+    asyncio.run(manager.activate("20240101T000000"))
+
+    with pytest.raises(IncompleteVersionError):
+        asyncio.run(manager.activate("20240102T000000"))
+
+    assert manager.current.version == "20240101T000000"
+    assert read_current(manager.root) == "20240101T000000"
+
+
+def test_activate_accepts_versions_without_checkpoint(manager):
+    handle = asyncio.run(manager.activate("20240103T000000"))
+
+    assert handle.version == "20240103T000000"
+    assert read_current(manager.root) == "20240103T000000"
+
+
+def _activate_all(manager, versions):
+    async def run():
+        for version in versions:
+            await manager.activate(version)
+            await asyncio.gather(*manager._tasks)
+    asyncio.run(run())
+
+
+def test_retired_version_closes_chroma_before_prune(tmp_path):
+    chromadb = pytest.importorskip("chromadb")
+    from chromadb.api.shared_system_client import SharedSystemClient
+
+    root = str(tmp_path)
+    versions = [f"2024010{day}T000000" for day in range(1, 5)]
+    for version in versions:
+        _make_version(root, version, "complete")
+
+    def loader(version, path):
+        client = chromadb.PersistentClient(path=path)
+        client.get_or_create_collection("LMITD")
+        return _Handle(version, path, None, None, None, client=client)
+
+    manager = IndexManager(loader, root=root)
+    _activate_all(manager, versions)
+
+    oldest = version_path(versions[0], root)
+    assert not os.path.exists(oldest)
+    assert not any(os.path.abspath(str(key)) == os.path.abspath(oldest) for key in SharedSystemClient._identifier_to_system)
+    assert manager.previous.client is not None and manager.current.client is not None
+
+
+def test_retire_waits_for_requests_past_drain_timeout(manager, monkeypatch):
+    monkeypatch.setattr(index_versions, "INDEX_DRAIN_TIMEOUT_SECONDS", 0)
+
+    async def run():
+        await manager.activate("20240101T000000")
+        async with manager.use() as old:
+            old.lexical_index = object()
+            await manager.activate("20240103T000000")
+            await manager.activate("20240103T000000")
+            await asyncio.sleep(0.6)
+            # Masih dipakai: tidak dilepas dan tetap dilindungi dari prune
+            assert old in manager._retiring
+            assert old.lexical_index is not None
+        await asyncio.gather(*manager._tasks)
+        return old
+
+    old = asyncio.run(run())
+    assert old not in manager._retiring
+    assert old.lexical_index is None
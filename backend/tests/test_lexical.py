@@ -0,0 +1,48 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from lexical import BM25Index, reciprocal_rank_fusion
+from retrieval import fuse_results
+
+
+def _index():
+    index = BM25Index()
+    index.add({"paper_id": "p1", "title": "Irigasi tetes padi sawah", "abstract": "Efisiensi air", "year": 2020})
+    index.add({"paper_id": "p2", "title": "Budidaya kopi arabika", "abstract": "Padi tidak dibahas", "year": 2022})
+    index.add({"paper_id": "p3", "title": "Pakan sapi perah", "abstract": "Nutrisi ternak", "year": 2021})
+    index.finalize()
+    return index
+
+
+def test_bm25_ranks_title_match_first():
+    results = _index().search("padi sawah", k=10)
+
+    assert [paper["paper_id"] for paper, _ in results] == ["p1", "p2"]
+    assert results[0][1] > results[1][1]
+
+
+def test_bm25_accept_filters_before_scoring():
+    results = _index().search("padi", k=10, accept=lambda paper: paper.get("year", 0) >= 2021)
+
+    assert [paper["paper_id"] for paper, _ in results] == ["p2"]
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b"], ["b", "c"]], k=60)
+
+    assert [key for key, _ in fused] == ["b", "a", "c"]
+    assert dict(fused)["b"] == 1 / 62 + 1 / 61
+
+
+def test_fuse_results_prefers_dense_document_for_shared_paper():
+    dense = [Document(page_content="chunk p1", metadata={"paper_id": "p1"}),
+             Document(page_content="chunk p2", metadata={"paper_id": "p2"})]
+    lexical = [Document(page_content="lexical p2", metadata={"paper_id": "p2"}),
+               Document(page_content="lexical p3", metadata={"paper_id": "p3"})]
+
+    fused = fuse_results(dense, lexical, k=2)
+
+    assert [doc.page_content for doc in fused] == ["chunk p2", "chunk p1"]
@@ -0,0 +1,47 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_filters import filter_conditions, filter_metadata, matches, to_chroma_where
+
+
+def _filters(authors=(), keywords=(), year_from=None, year_to=None, faculty=None):
+    return SimpleNamespace(authors=list(authors), keywords=list(keywords),
+                           year_from=year_from, year_to=year_to, faculty=faculty)
+
+
+def test_filters_translate_to_chroma_where():
+    conditions = filter_conditions(_filters(
+        authors=["Santoso, Budi"], keywords=["Padi Sawah"], year_from=2019, year_to=2022, faculty="Fakultas Pertanian"
+    ))
+
+    assert to_chroma_where(conditions) == {"$and": [
+        {"author:budi-santoso": {"$eq": True}},
+        {"kw:padi-sawah": {"$eq": True}},
+        {"year": {"$gte": 2019}},
+        {"year": {"$lte": 2022}},
+        {"faculty": {"$eq": "fakultas-pertanian"}},
+    ]}
+
+
+def test_single_condition_is_not_wrapped_and_empty_filter_is_none():
+    assert to_chroma_where(filter_conditions(_filters(year_from=2020))) == {"year": {"$gte": 2020}}
+    assert to_chroma_where(filter_conditions(_filters())) is None
+    assert to_chroma_where(filter_conditions(None)) is None
+
+
+def test_invalid_year_range_is_rejected():
+    with pytest.raises(ValueError):
+        filter_conditions(_filters(year_from=2023, year_to=2020))
+
+
+def test_indexed_metadata_matches_request_conditions():
+    metadata = filter_metadata("Budi Santoso; Sari Dewi", "padi sawah, irigasi", year="2021-05-01", faculty="Fakultas Pertanian")
+
+    assert matches(metadata, filter_conditions(_filters(authors=["Santoso, Budi"], year_from=2020)))
+    assert not matches(metadata, filter_conditions(_filters(keywords=["kopi"])))
+    assert not matches(metadata, filter_conditions(_filters(year_to=2020)))
@@ -0,0 +1,45 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sessions import PDFSessionStore
+
+
+def _ready(store, session_id):
+    session = store.create(session_id)
+    session.status = "ready"
+    return session
+
+
+def test_least_recently_used_ready_session_is_evicted():
+    store = PDFSessionStore(ttl_seconds=3600, max_sessions=2, max_bytes=10**9)
+    _ready(store, "a")
+    _ready(store, "b")
+    store.get("a")
+
+    _ready(store, "c")
+
+    assert "a" in store and "c" in store
+    assert "b" not in store
+    assert store.evictions == 1
+
+
+def test_sessions_still_processing_are_never_evicted():
+    store = PDFSessionStore(ttl_seconds=0, max_sessions=1, max_bytes=10**9)
+    store.create("a")
+    store.create("b")
+
+    assert store.evict_expired() == 0
+    assert len(store) == 2
+
+
+def test_idle_sessions_expire_after_ttl():
+    store = PDFSessionStore(ttl_seconds=60, max_sessions=10, max_bytes=10**9)
+    idle = _ready(store, "idle")
+    _ready(store, "active")
+    idle.last_access -= 61
+
+    assert store.evict_expired() == 1
+    assert "idle" not in store and "active" in store
+    assert store.expirations == 1
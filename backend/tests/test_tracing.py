@@ -0,0 +1,47 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tracing
+
+
+async def _idle_app(scope, receive, send):
+    # Request hanya menunggu I/O: semua sampel event loop seharusnya idle
+    await asyncio.sleep(0.2)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _profiled_request():
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "method": "POST", "path": "/chat/", "headers": [(b"x-trace", b"profile")]}
+    await tracing.TracingMiddleware(_idle_app)(scope, None, send)
+    return tracing.TRACE_STORE.get(tracing.TRACE_STORE.list(limit=1)[0]["trace_id"]).profile
+
+
+def _run(loop_factory):
+    loop = loop_factory()
+    try:
+        return loop.run_until_complete(_profiled_request())
+    finally:
+        loop.close()
+
+
+def _uvloop_factory():
+    uvloop = pytest.importorskip("uvloop")
+    return uvloop.new_event_loop()
+
+
+@pytest.mark.parametrize("loop_factory", [asyncio.new_event_loop, _uvloop_factory], ids=["asyncio", "uvloop"])
+def test_idle_event_loop_is_not_reported_as_work(loop_factory):
+    profile = _run(loop_factory)
+
+    assert profile["idle_event_loop_samples"] > 0
+    loop_stacks = [entry for entry in profile["stacks"] if entry["stack"].startswith("event_loop;")]
+    assert sum(entry["samples"] for entry in loop_stacks) < profile["idle_event_loop_samples"]
@@ -0,0 +1,308 @@
+import contextvars
+import inspect
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+# --- KONFIGURASI TRACING ---
+# Trace per request (timeline tahap + opsional profil CPU sampling), disimpan di ring buffer lokal.
+# Aktif jika request membawa header X-Trace ("1" = timeline, "profile" = timeline + profil)
+# atau terpilih oleh sampling acak TRACE_SAMPLE_RATE (0.0 - 1.0, hanya timeline).
+TRACE_HEADER = "x-trace"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+TRACE_PROFILE_INTERVAL_MS = float(os.getenv("TRACE_PROFILE_INTERVAL_MS", "5"))
+# Jumlah stack teratas yang disimpan per profil
+TRACE_PROFILE_MAX_STACKS = 50
+# Path yang tidak pernah di-trace (health check, scrape metrics, endpoint admin)
+TRACE_EXCLUDED_PREFIXES = ("/healthz", "/readyz", "/metrics", "/admin/")
+
+# Fungsi teratas stack event loop saat sedang menunggu I/O (bukan kerja CPU) pada loop asyncio bawaan
+_IDLE_FUNCTIONS = {"select", "poll", "epoll", "kqueue", "wait"}
+_COROUTINE_FLAGS = inspect.CO_COROUTINE | inspect.CO_ASYNC_GENERATOR | inspect.CO_ITERABLE_COROUTINE | inspect.CO_GENERATOR
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+_span_depth = contextvars.ContextVar("span_depth", default=0)
+
+
+class Trace:
+    """Timeline satu request. Span disimpan datar dengan offset dari awal request dan kedalaman."""
+
+    def __init__(self, method: str, path: str, profile: bool = False, sampled: bool = False):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        self.sampled = sampled
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration_ms = None
+        self.status = None
+        self.spans = []
+        self.profile = None
+        self.profile_enabled = profile
+        self._threads = Counter()     # ident thread -> jumlah pekerjaan request ini yang sedang berjalan
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, start: float, end: float, depth: int, error: bool = False, **attrs):
+        span = {
+            "name": name,
+            "start_ms": round((start - self.start) * 1000, 3),
+            "duration_ms": round((end - start) * 1000, 3),
+            "depth": depth,
+            "thread": threading.current_thread().name,
+        }
+        if error:
+            span["error"] = True
+        if attrs:
+            span["attrs"] = attrs
+        with self._lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def thread_active(self):
+        """Menandai thread saat ini sedang bekerja untuk request ini (target profiler)."""
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._threads[ident] -= 1
+                if self._threads[ident] <= 0:
+                    del self._threads[ident]
+
+    def active_threads(self):
+        with self._lock:
+            return list(self._threads)
+
+    def summary(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(timespec="milliseconds"),
+            "duration_ms": self.duration_ms,
+            "spans": len(self.spans),
+            "sampled": self.sampled,
+            "profiled": self.profile is not None,
+        }
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start_ms"])
+        return {**self.summary(), "timeline": spans, "profile": self.profile}
+
+
+def _collapse_stack(frame, prefix: str) -> str:
+    """Stack dalam format 'collapsed' (root;...;leaf), bisa langsung dipakai flamegraph.pl/speedscope."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    names.append(prefix)
+    return ";".join(reversed(names))
+
+
+def loop_entry_code(frame):
+    """
+    Code object frame non-coroutine pertama di bawah rantai coroutine yang sedang berjalan,
+    yaitu titik tempat event loop menjalankan task. Pada uvloop (loop ditulis dalam C) frame
+    ini (mis. runners.py:run) menjadi frame Python teratas selama loop menganggur,
+    bukan select/poll seperti pada loop asyncio bawaan.
+    """
+    while frame is not None and frame.f_code.co_flags & _COROUTINE_FLAGS:
+        frame = frame.f_back
+    return frame.f_code if frame is not None else None
+
+
+class SamplingProfiler:
+    """
+    Mengambil stack thread yang sedang bekerja untuk satu request setiap interval.
+    Thread event loop ikut di-sample selama request berjalan; karena dipakai bersama,
+    sampel di sana bisa berasal dari request lain yang berjalan bersamaan.
+    Sampel loop dianggap idle jika frame teratasnya fungsi menunggu I/O atau titik
+    masuk loop itu sendiri (tidak ada kode Python yang sedang dijalankan loop).
+    """
+
+    def __init__(self, trace: Trace, loop_thread: int, interval_ms: float = TRACE_PROFILE_INTERVAL_MS,
+                 loop_entry=None):
+        self.trace = trace
+        self.loop_thread = loop_thread
+        self.loop_entry = loop_entry
+        self.interval = max(0.001, interval_ms / 1000)
+        self.counts = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"trace-profiler-{trace.trace_id}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            targets = [(self.loop_thread, "event_loop")] + [(ident, "worker") for ident in self.trace.active_threads()]
+            for ident, role in targets:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                self.samples += 1
+                if role == "event_loop" and self._is_idle(frame):
+                    self.idle_samples += 1
+                    continue
+                self.counts[_collapse_stack(frame, role)] += 1
+
+    def _is_idle(self, frame) -> bool:
+        return frame.f_code.co_name in _IDLE_FUNCTIONS or frame.f_code is self.loop_entry
+
+    def stop(self) -> dict:
+        self._stop.set()
+        self._thread.join()
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "idle_event_loop_samples": self.idle_samples,
+            "stacks": [
+                {"stack": stack, "samples": count}
+                for stack, count in self.counts.most_common(TRACE_PROFILE_MAX_STACKS)
+            ],
+        }
+
+
+class TraceStore:
+    """Ring buffer trace terbaru (yang lama otomatis terbuang)."""
+
+    def __init__(self, max_entries: int = TRACE_BUFFER_SIZE):
+        self._traces = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+
+    def add(self, trace: Trace):
+        with self._lock:
+            self._traces.append(trace)
+
+    def get(self, trace_id: str):
+        with self._lock:
+            for trace in self._traces:
+                if trace.trace_id == trace_id:
+                    return trace
+        return None
+
+    def list(self, limit: int = 50, min_duration_ms: float = 0, path: str = None):
+        with self._lock:
+            traces = list(self._traces)
+        result = [
+            trace.summary() for trace in reversed(traces)
+            if (trace.duration_ms or 0) >= min_duration_ms and (path is None or trace.path == path)
+        ]
+        return result[:limit]
+
+    def clear(self):
+        with self._lock:
+            self._traces.clear()
+
+
+TRACE_STORE = TraceStore()
+
+
+# --- API UNTUK KODE SERVING ---
+
+def record_span(name: str, seconds: float, error: bool = False, **attrs):
+    """Menambahkan span yang baru selesai (durasi sudah diukur pemanggil) ke trace aktif."""
+    trace = current_trace.get()
+    if trace is None:
+        return
+    end = time.perf_counter()
+    trace.add_span(name, end - seconds, end, _span_depth.get(), error=error, **attrs)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Span bersarang; tanpa trace aktif biayanya hanya satu lookup contextvar."""
+    trace = current_trace.get()
+    if trace is None:
+        yield
+        return
+    depth = _span_depth.get()
+    token = _span_depth.set(depth + 1)
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        _span_depth.reset(token)
+        trace.add_span(name, start, time.perf_counter(), depth, error=error, **attrs)
+
+
+def traced_call(func):
+    """Dipakai thread pool: pekerjaan thread dihitung ke trace request (untuk profiler)."""
+    trace = current_trace.get()
+    if trace is None or not trace.profile_enabled:
+        return func()
+    with trace.thread_active():
+        return func()
+
+
+def _trace_mode(scope) -> str:
+    for name, value in scope.get("headers", ()):
+        if name == TRACE_HEADER.encode("latin-1"):
+            value = value.decode("latin-1").strip().lower()
+            if value == "profile":
+                return "profile"
+            if value in ("1", "true", "on"):
+                return "trace"
+    if TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE:
+        return "sampled"
+    return ""
+
+
+class TracingMiddleware:
+    """
+    Middleware ASGI: membuat Trace untuk request yang dipilih, menambahkan header
+    X-Trace-Id ke respons, dan menyimpan trace ke ring buffer setelah body selesai dikirim.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        mode = _trace_mode(scope) if scope["type"] == "http" and not path.startswith(TRACE_EXCLUDED_PREFIXES) else ""
+        if not mode:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(scope.get("method", ""), path, profile=mode == "profile", sampled=mode == "sampled")
+        token = current_trace.set(trace)
+        profiler = None
+        if trace.profile_enabled:
+            profiler = SamplingProfiler(trace, threading.get_ident(), loop_entry=loop_entry_code(sys._getframe())).start()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-trace-id", trace.trace_id.encode())]}
+            await send(message)
+
+        try:
+            with span("request"):
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            trace.duration_ms = round((time.perf_counter() - trace.start) * 1000, 3)
+            if profiler is not None:
+                trace.profile = profiler.stop()
+            current_trace.reset(token)
+            TRACE_STORE.add(trace)
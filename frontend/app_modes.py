@@ -1,6 +1,6 @@
 import streamlit as st
-import requests
 import os
+from chat_logic import stream_response
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -23,22 +23,19 @@ def display_just_chat_interface():
             for msg in st.session_state.messages
         ]
 
-        with st.spinner("Thinking..."):
-            response = requests.post(
+        # Token jawaban ditampilkan langsung saat tiba dari backend (SSE)
+        with st.chat_message("assistant"):
+            answer = stream_response(
                 QUERY_ENDPOINT,
-                json={
+                {
                     "query": prompt, 
                     "chat_history": chat_history,
                     "session_id": st.session_state['session_id']
                 }
             )
 
-        if response.status_code == 200:
-            answer = response.json()["response"]
-            
-            with st.chat_message("assistant"):
+            if answer.startswith("Failed to"):
+                st.error(answer)
+            else:
                 st.markdown(answer)
-                
-            st.session_state.messages.append({"role": "assistant", "content": answer})
-        else:
-            st.error(f"Error: {response.status_code} - {response.text}")
+                st.session_state.messages.append({"role": "assistant", "content": answer})
@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+import json
 import os
 from dotenv import load_dotenv
 
@@ -7,31 +8,64 @@ load_dotenv()
 
 URL_BASE = os.getenv("URL_BASE")
 
+def iter_chat_stream(url, data):
+    """Membaca Server-Sent Events dari backend dan menghasilkan pasangan (event, payload)."""
+    data = dict(data, stream=True)
+    try:
+        with requests.post(url, json=data, stream=True) as response:
+            if response.status_code != 200:
+                yield "error", f"Failed to process chat. Server responded with {response.status_code}: {response.text}"
+                return
+
+            event = "message"
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    event = "message"
+                elif line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    yield event, json.loads(line[len("data:"):].strip())
+    except requests.RequestException:
+        yield "error", "Failed to process chat. Server might be busy or unavailable."
+
+def stream_response(url, data):
+    """Menampilkan token jawaban saat tiba, lalu mengembalikan jawaban final."""
+    placeholder = st.empty()
+    placeholder.markdown("_Thinking..._")
+    streamed = ""
+
+    for event, payload in iter_chat_stream(url, data):
+        if event == "token":
+            streamed += payload.get("text", "")
+            placeholder.markdown(streamed + "▌")
+        elif event == "done":
+            streamed = payload.get("response", streamed)
+        elif event == "error":
+            placeholder.empty()
+            if isinstance(payload, dict):
+                return f"Failed to process chat. {payload.get('detail', 'An unknown error occurred.')}"
+            return payload
+
+    placeholder.empty()
+    return streamed or "An unknown error occurred."
+
 def process_pdf_chat(prompt, chat_history):
     session_id = st.session_state.get('session_id')
     if not session_id:
         return "Error: No active PDF session found. Please re-upload the PDF."
-        
+
     url = f"{URL_BASE}/chat-with-pdf/"
     data = {
         "query": prompt,
         "chat_history": chat_history,
-        "session_id": session_id 
+        "session_id": session_id
     }
-    try:
-        response = requests.post(url, json=data)
-        if response.status_code == 200:
-            result = response.json()
-            return result.get('response', 'An unknown error occurred.')
-        else:
-            return f"Failed to process chat. Server responded with {response.status_code}: {response.text}"
-    except requests.RequestException:
-        return "Failed to process chat. Server might be busy or unavailable."
+    return stream_response(url, data)
 
 def process_selected_documents_chat(prompt, chat_history):
     if not st.session_state['selected_document']:
         return "Error: No documents selected."
-    
+
     context = "\n\n".join(f"{doc['judul']} {doc['abstrak']} {doc['url']}" for doc in st.session_state['selected_document'])
 
     url = f"{URL_BASE}/chat/"
@@ -39,14 +73,6 @@ def process_selected_documents_chat(prompt, chat_history):
         "query": prompt,
         "context": context,
         "chat_history": chat_history,
-        "session_id": st.session_state['session_id'] 
+        "session_id": st.session_state['session_id']
     }
-    try:
-        response = requests.post(url, json=data)
-        if response.status_code == 200:
-            result = response.json()
-            return result.get('response', 'An unknown error occurred.')
-        else:
-            return f"Failed to process chat. Server responded with {response.status_code}: {response.text}"
-    except requests.RequestException:
-        return "Failed to process chat. Server might be busy or unavailable."
\ No newline at end of file
+    return stream_response(url, data)
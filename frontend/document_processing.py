@@ -6,6 +6,17 @@ load_dotenv()
 
 URL_BASE = os.getenv("URL_BASE")
 
+def get_backend_readiness():
+    try:
+        url = f"{URL_BASE}/readyz"
+        # 503 berarti backend hidup tetapi masih warmup; body tetap berisi status
+        response = requests.get(url, timeout=3)
+        return response.json()
+
+    except (requests.RequestException, ValueError):
+        return {"error": "Failed to connect to the backend server. Is the FastAPI server running?"}
+
+
 def upload_pdf(file):
     try:
         url = f"{URL_BASE}/upload-pdf/"
@@ -28,6 +39,21 @@ def upload_pdf(file):
         return {"error": "Failed to connect to the backend server. Is the FastAPI server running?"}
 
 
+def get_pdf_status(session_id):
+    try:
+        url = f"{URL_BASE}/upload-pdf/{session_id}/status"
+        response = requests.get(url)
+
+        response.raise_for_status()
+        return response.json()
+
+    except requests.exceptions.HTTPError as e:
+        return {"error": f"Server Error ({response.status_code}): {response.text}"}
+
+    except requests.RequestException:
+        return {"error": "Failed to get PDF status. Server might be busy or unavailable."}
+
+
 def get_related_documents(title, number):
     try:
         url = f"{URL_BASE}/related_documents/"
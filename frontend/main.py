@@ -1,6 +1,7 @@
 import streamlit as st
 from ui_components import initialize_session_state, display_sidebar, display_chat_interface, display_mode_toggle
 from app_modes import display_just_chat_interface
+from document_processing import get_backend_readiness
 
 def main():
 
@@ -21,6 +22,15 @@ def main():
     st.title("💬 IPB-GPT")
     st.caption("🚀 IPB Research Assistant: A Smart Chatbot to Help You Find Relevant Research for Your Undergraduate Thesis. Chat About Research at IPB Anytime!")
 
+    # Backend menerima request sebelum model & index selesai dimuat; beri tahu pengguna
+    readiness = get_backend_readiness()
+    if "error" in readiness:
+        st.warning(readiness["error"])
+    elif readiness.get("status") == "starting":
+        st.info("⏳ The assistant is warming up. Answers will be available in a few seconds.")
+    elif readiness.get("status") == "failed":
+        st.error(f"Backend failed to start: {readiness.get('error')}")
+
     initialize_session_state()
     display_mode_toggle()
 
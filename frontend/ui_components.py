@@ -1,13 +1,17 @@
-from document_processing import upload_pdf, get_related_documents
+from document_processing import upload_pdf, get_pdf_status, get_related_documents
 from chat_logic import process_pdf_chat, process_selected_documents_chat
 from dotenv import load_dotenv
 import streamlit as st
 import re
 import os
+import time
 
 load_dotenv()
 
 API_URL = os.getenv("URL_BASE")
+# Batas waktu menunggu PDF sampai chat bisa dimulai (chunk pertama ter-embed)
+PDF_PROCESSING_TIMEOUT_SECONDS = float(os.getenv("PDF_PROCESSING_TIMEOUT_SECONDS", "300"))
+
 def initialize_session_state():
     defaults = {
         'messages': [{"role": "assistant", "content": "Can I assist you today?"}],
@@ -20,7 +24,8 @@ def initialize_session_state():
         'current_file': None,
         'mode': 'Search and Chat',
         'previous_mode': 'Search and Chat',
-        'session_id': None
+        'session_id': None,
+        'pdf_status': None
     }
     for key, value in defaults.items():
         if key not in st.session_state:
@@ -146,6 +151,63 @@ def render_llm_response(response):
         else:
             st.markdown(segment)
 
+PDF_STAGE_LABELS = {
+    "queued": "Waiting in queue",
+    "extracting": "Extracting text",
+    "chunking": "Splitting text",
+    "embedding": "Embedding chunks",
+}
+
+def wait_for_pdf_processing(session_id, poll_interval=1.0, timeout=PDF_PROCESSING_TIMEOUT_SECONDS):
+    """
+    Memantau pemrosesan PDF sampai chat bisa dimulai: saat selesai, atau lebih awal
+    begitu chunk pertama sudah di-embed (backend menjawab dari index parsial).
+    """
+    progress = st.progress(0.0, text="Processing uploaded PDF. Please wait...")
+    deadline = time.time() + timeout
+
+    while True:
+        status = get_pdf_status(session_id)
+        if 'error' in status:
+            progress.empty()
+            return status
+
+        stage = status.get('status')
+        if stage == "ready":
+            progress.empty()
+            return status
+        if stage == "failed":
+            progress.empty()
+            return {"error": f"Failed to process PDF: {status.get('error')}"}
+
+        done, total = status.get('chunks_done', 0), status.get('chunks_total', 0)
+        if stage == "embedding" and done > 0:
+            progress.empty()
+            return status
+
+        label = PDF_STAGE_LABELS.get(stage, stage)
+        if time.time() >= deadline:
+            progress.empty()
+            return {"error": f"PDF processing timed out after {timeout:.0f}s (still at '{label}'). Please try again."}
+        if stage == "embedding" and total:
+            progress.progress(done / total, text=f"{label} ({done}/{total})...")
+        else:
+            progress.progress(0.0, text=f"{label}...")
+        time.sleep(poll_interval)
+
+def show_partial_pdf_progress(session_id):
+    """Satu kali cek status per rerun (tidak memblokir) selama PDF masih di-embed di background."""
+    status = get_pdf_status(session_id)
+    if 'error' in status:
+        return
+    stage = status.get('status')
+    st.session_state['pdf_status'] = stage
+    if stage == "failed":
+        st.error(f"Failed to process the rest of the PDF: {status.get('error')}")
+    elif stage != "ready":
+        done, total = status.get('chunks_done', 0), status.get('chunks_total', 0)
+        st.caption(f"Still embedding the PDF ({done}/{total} chunks). Answers use the parts processed so far.")
+
 def display_chat_interface():
 
     if not st.session_state['selected_document']:
@@ -154,23 +216,33 @@ def display_chat_interface():
     # Cek apakah file yang diunggah berubah atau baru
     if st.session_state.get('current_file') != st.session_state['uploaded_file']:
         if st.session_state['uploaded_file']:
-            with st.spinner("Processing uploaded PDF. Please wait..."):
-                # Kirim file untuk diunggah dan diproses
+            with st.spinner("Uploading PDF. Please wait..."):
+                # Kirim file; backend langsung membalas dengan session_id (202)
                 result = upload_pdf(st.session_state['uploaded_file'])
+
+            if 'error' not in result:
+                # Pantau progres pemrosesan di backend sampai siap
+                result = wait_for_pdf_processing(result.get('session_id'))
                 
-                if 'error' in result:
-                    st.error(result['error'])
-                    st.session_state['current_file'] = None
-                    st.session_state['session_id'] = None
-                else:
-                    st.session_state['current_file'] = st.session_state['uploaded_file']
-                    # Simpan session_id yang dikembalikan oleh backend
-                    st.session_state['session_id'] = result.get('session_id') 
+            if 'error' in result:
+                st.error(result['error'])
+                st.session_state['current_file'] = None
+                st.session_state['session_id'] = None
+                st.session_state['pdf_status'] = None
+            else:
+                st.session_state['current_file'] = st.session_state['uploaded_file']
+                # Simpan session_id yang dikembalikan oleh backend
+                st.session_state['session_id'] = result.get('session_id') 
+                st.session_state['pdf_status'] = result.get('status')
+                if result.get('status') == "ready":
                     st.success("PDF processed successfully!")
+                else:
+                    st.success("PDF partially processed. You can start chatting while the rest is embedded.")
         elif st.session_state.get('current_file') is not None:
              # File dihapus oleh user, reset state
             st.session_state['current_file'] = None
             st.session_state['session_id'] = None
+            st.session_state['pdf_status'] = None
             st.session_state.messages = [{"role": "assistant", "content": "PDF cleared. How can I assist you?"}]
 
     # Tentukan apakah chat harus diaktifkan dan apakah sudah siap (untuk PDF)
@@ -182,13 +254,24 @@ def display_chat_interface():
     # Nonaktifkan chat input jika chat diaktifkan tetapi PDF belum siap (session_id missing)
     chat_input_disabled = chat_enabled and not pdf_ready
 
+    for message in st.session_state.messages:
+        with st.chat_message(message["role"]):
+            if message["role"] == "assistant":
+                render_llm_response(message["content"])
+            else:
+                st.markdown(message["content"])
+
     if chat_enabled:
         if prompt := st.chat_input("Type your message here...", disabled=chat_input_disabled):
             st.session_state.messages.append({"role": "user", "content": prompt})
-            with st.spinner("Thinking..."):
-                chat_history = [{"role": msg["role"], "content": msg["content"]} for msg in st.session_state.messages]
+            with st.chat_message("user"):
+                st.markdown(prompt)
+
+            chat_history = [{"role": msg["role"], "content": msg["content"]} for msg in st.session_state.messages]
+
+            # Jawaban ditampilkan bertahap (streaming) di dalam bubble assistant
+            with st.chat_message("assistant"):
                 if st.session_state['uploaded_file']:
-                    # --- PERBAIKAN: Hapus argumen ketiga (pdf_text) ---
                     response = process_pdf_chat(prompt, chat_history) 
                 elif st.session_state['selected_document']:
                     response = process_selected_documents_chat(prompt, chat_history)
@@ -196,14 +279,8 @@ def display_chat_interface():
                 if response.startswith("Failed to") or response.startswith("Error: No active PDF session"):
                     st.error(response)
                 else:
+                    render_llm_response(response)
                     st.session_state.messages.append({"role": "assistant", "content": response})
-                    
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            if message["role"] == "assistant":
-                render_llm_response(message["content"])
-            else:
-                st.markdown(message["content"])
 
     if st.session_state['uploaded_file']:
         session_id_val = st.session_state.get('session_id')
@@ -213,6 +290,9 @@ def display_chat_interface():
         if not session_id_val and st.session_state['current_file']:
              st.warning("PDF processing in progress... Please wait until 'PDF processed successfully' appears.")
         
+        if session_id_val and st.session_state.get('pdf_status') != "ready":
+            show_partial_pdf_progress(session_id_val)
+
         st.info(f"You are currently chatting with the uploaded PDF.")
     elif st.session_state['selected_document']:
         st.info("You are currently chatting with the selected documents from the search results.")
@@ -3,70 +3,50 @@
 # --- KONFIGURASI ---
 BASE_DIR="$(cd "$(dirname "$0")" && pwd)"
 BACKEND_CONTAINER="ipb_backend"
-LIVE_STORE_DIR="${BASE_DIR}/vector_store"
-TEMP_STORE_DIR="${BASE_DIR}/vector_store_temp"
-BACKUP_STORE_DIR="${BASE_DIR}/vector_store_backup"
+BACKEND_URL="http://localhost:8000"
 
 echo "[$(date)] --- STARTING ZERO-DOWNTIME UPDATE (DOCKER MODE) ---"
 
-# 1. PERSIAPAN FOLDER STAGING (Di Host)
-echo "-> 1. Preparing Staging Environment..."
-if [ -d "$TEMP_STORE_DIR" ]; then
-    rm -rf "$TEMP_STORE_DIR"
-fi
-# Buat folder kosong di host
-mkdir -p "$TEMP_STORE_DIR"
-
-# 2. EKSTRAKSI DATABASE (Jalankan DI DALAM Docker)
-echo "-> 2. Extracting Database (inside container)..."
-docker exec "$BACKEND_CONTAINER" python export_db.py
+# 1. SIAPKAN VERSI INDEX BARU (vector_store/versions/<timestamp>)
+# Versi aktif disalin sebagai titik awal agar hanya chunk baru/berubah yang di-embed.
+# Jika refresh sebelumnya terputus, folder versinya dipakai lagi dan dilanjutkan.
+echo "-> 1. Preparing new index version..."
+NEW_VERSION_DIR=$(docker exec "$BACKEND_CONTAINER" python index_versions.py prepare)
 
-if [ $? -ne 0 ]; then
-    echo "Database extraction failed inside container. Aborting."
+if [ $? -ne 0 ] || [ -z "$NEW_VERSION_DIR" ]; then
+    echo "Failed to prepare index version. Aborting."
     exit 1
 fi
+NEW_VERSION=$(basename "$NEW_VERSION_DIR")
+echo "Target version: $NEW_VERSION"
+
+# 2. REFRESH PIPELINE (DB -> chunk -> embed -> Chroma dalam satu proses, di dalam Docker)
+# Gunakan FULL_REINDEX=1 untuk membangun ulang dari nol.
+echo "-> 2. Running streaming refresh pipeline (inside container)..."
+PIPELINE_ARGS=""
+if [ "${FULL_REINDEX:-0}" = "1" ]; then
+    PIPELINE_ARGS="--full"
+fi
 
-# 3. INDEXING KE FOLDER INTERNAL CONTAINER
-echo "-> 3. Running Indexer..."
-# Kita suruh indexer menulis ke folder sementara di dalam container (/app/vector_store_temp)
-docker exec -e VECTOR_STORE_TARGET="vector_store_temp" "$BACKEND_CONTAINER" python indexer.py
+# Index ditulis langsung ke folder versi baru di volume yang di-mount
+docker exec -e VECTOR_STORE_TARGET="$NEW_VERSION_DIR" "$BACKEND_CONTAINER" python pipeline.py $PIPELINE_ARGS
 
 if [ $? -ne 0 ]; then
-    echo "Indexing failed. Live data is UNTOUCHED. Aborting."
+    echo "Refresh pipeline failed. Live index is UNTOUCHED. Aborting."
     exit 1
 fi
 
-# 4. SALIN DATA DARI CONTAINER KE HOST
-echo "-> 4. Copying new index to Host..."
-# Salin folder hasil index dari dalam container ke folder host
-docker cp "${BACKEND_CONTAINER}:/app/vector_store_temp/." "$TEMP_STORE_DIR"
-
-# 5. FOLDER SWAP (Di Host)
-echo "-> 5. Swapping Live Vector Store..."
-
-# A. Backup Live
-if [ -d "$LIVE_STORE_DIR" ]; then
-    if [ -d "$BACKUP_STORE_DIR" ]; then
-        rm -rf "$BACKUP_STORE_DIR"
-    fi
-    mv "$LIVE_STORE_DIR" "$BACKUP_STORE_DIR"
-fi
-
-# B. Promosi Temp jadi Live
-mv "$TEMP_STORE_DIR" "$LIVE_STORE_DIR"
-
-echo "Folders swapped. New data is active on Host Volume."
-
-# 6. HOT RELOAD
-echo "-> 6. Triggering Reload..."
-# Kita tembak API reload
-HTTP_RESPONSE=$(curl -s -o /dev/null -w "%{http_code}" -X POST http://localhost:8000/admin/reload-index)
+# 3. AKTIFKAN VERSI BARU (HOT RELOAD)
+# Backend memuat & warm versi baru di background, lalu menukarnya secara atomik.
+# Versi sebelumnya tetap dimuat: POST /admin/rollback-index untuk kembali.
+echo "-> 3. Activating version $NEW_VERSION..."
+HTTP_RESPONSE=$(curl -s -o /dev/null -w "%{http_code}" -X POST "${BACKEND_URL}/admin/reload-index?version=${NEW_VERSION}")
 
 if [ "$HTTP_RESPONSE" -eq 200 ]; then
-    echo "SUCCESS: Hot Reload triggered via API."
+    echo "SUCCESS: Index version $NEW_VERSION is live."
 else
-    echo "Hot Reload API failed (Code: $HTTP_RESPONSE). Restarting Backend Container..."
-    docker restart "$BACKEND_CONTAINER"
+    echo "Activation failed (Code: $HTTP_RESPONSE). Live index is UNTOUCHED."
+    exit 1
 fi
 
-echo "[$(date)] --- UPDATE COMPLETE ---"
\ No newline at end of file
+echo "[$(date)] --- UPDATE COMPLETE ---"